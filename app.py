@@ -1,7 +1,13 @@
+import signal
+import sys
+
 from app import app
 
-from app.controllers import app_controller, api_controller
+from app.controllers import app_controller, api_controller, metrics_controller, profiling_controller
 from app.utils.config import get_port
 
 if __name__ == "__main__":
+    # docker stop envía SIGTERM: salir de forma normal para que se
+    # guarden las visitas pendientes (atexit)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     app.run(host="0.0.0.0", port=get_port())
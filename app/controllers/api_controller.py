@@ -1,200 +1,712 @@
 
 from app import app
-from flask import jsonify, request, make_response
-import requests
+from flask import jsonify, request, make_response, Response
+import calendar
+from concurrent.futures import ThreadPoolExecutor, wait
+import hashlib
+import json
+import os
+import threading
+import time
 from app.utils import config
-from oauthlib.oauth2 import BackendApplicationClient
-from requests_oauthlib import OAuth2Session
+from app.utils.arduino_auth import ArduinoTokenManager
+from app.utils.arduino_client import ArduinoClient
+from app.utils.arduino_discovery import ThingDiscovery
+from app.utils.arduino_devices import DEFAULT_DEVICES, DeviceRegistry, load_devices
+from app.utils.singleflight import SingleFlight
+from app.utils.upstream_scheduler import UpstreamScheduler
+from app.utils.poller import BackgroundPoller
+from app.utils.event_stream import EventBroadcaster
+from app.utils.flow_history import MAX_TIMESTAMP, FlowHistory, parse_updated_at
+from app.utils.flow_rollups import FlowRollups
+from app.utils.flow_reports import STATE_FILENAME, FlowReportAccumulator
+from app.utils.informes_index import InformesIndex
+from app.utils.http_cache import EncodedBodyCache, choose_encoding
+from app.utils.weathercloud_py import get_weathercloud_client
+from app.utils.visit_counter import VisitCounter
+from app.utils.shared_cache import get_shared_cache
+from app.utils.metrics import CACHE_REQUESTS, INFORMES_IO
 from datetime import datetime, timedelta
 
 settings = config.load_config()
 
+# Caché compartida entre workers (SHARED_CACHE_BACKEND=mmap); en memoria del proceso por defecto
+shared_cache = get_shared_cache()
+
+# Cuota y circuit breaker de todas las llamadas a Arduino IoT Cloud
+arduino_scheduler = UpstreamScheduler(
+    settings.get('ARDUINO_RATE_LIMIT'),
+    burst=settings.get('ARDUINO_RATE_BURST'),
+    failure_threshold=settings.get('ARDUINO_BREAKER_THRESHOLD'),
+    reset_timeout=settings.get('ARDUINO_BREAKER_RESET'),
+    shared_cache=shared_cache,
+    name="arduino"
+)
+
+# Token OAuth2 de Arduino compartido por todos los hilos del proceso (y entre workers si la caché es compartida)
+arduino_tokens = ArduinoTokenManager(
+    settings.get('CLIENT_ID'),
+    settings.get('CLIENT_SECRET'),
+    shared_cache=shared_cache if shared_cache.shared else None,
+    scheduler=arduino_scheduler
+)
+
+# Cliente HTTP de Arduino IoT Cloud: conexiones keep-alive, timeouts y cuota
+arduino_client = ArduinoClient(
+    arduino_tokens,
+    scheduler=arduino_scheduler,
+    timeout=(settings.get('ARDUINO_CONNECT_TIMEOUT'), settings.get('ARDUINO_READ_TIMEOUT')),
+    pool_size=settings.get('ARDUINO_POOL_SIZE'),
+    hedge=settings.get('ARDUINO_HEDGE_READS')
+)
+
+FLOWMETER_THING_NAME = 'Medidor de Flujo'
+
+# Dispositivos configurados (ARDUINO_DEVICES); el flujómetro es el de FLOWMETER_THING_NAME
+arduino_devices = load_devices(settings.get('ARDUINO_DEVICES'))
+FLOWMETER_DEVICE = next(
+    (device for device in arduino_devices if device['thing'] == FLOWMETER_THING_NAME),
+    DEFAULT_DEVICES[0]
+)
+
+# IDs del thing y sus propiedades, resueltos una sola vez
+flowmeter_discovery = ThingDiscovery(
+    FLOWMETER_THING_NAME,
+    FLOWMETER_DEVICE['properties'],
+    cache_path=settings.get('ARDUINO_DISCOVERY_CACHE')
+)
+
 # Cache para reducir llamadas a la API de Arduino
 flowmeter_cache = {
     'data': None,
     'timestamp': None,
-    'ttl': 8  # Time to live en segundos (8 segundos de caché)
+    'ttl': 8,  # Time to live en segundos (8 segundos de caché)
+    'stale_grace': settings.get('FLOWMETER_STALE_GRACE')  # Segundos extra en que se sirve el dato viejo mientras se refresca
 }
 
+# Agrupa las peticiones concurrentes que encuentran la caché expirada
+flowmeter_flight = SingleFlight()
+FLOWMETER_WAIT_TIMEOUT = 10  # Segundos que esperan los no líderes
+
+# Claves en la caché compartida: última lectura y lease del worker que consulta Arduino
+FLOWMETER_SHARED_KEY = 'flowmeter:data'
+FLOWMETER_LEASE_KEY = 'flowmeter:refresh'
+
+# Lectura de cada dispositivo de ARDUINO_DEVICES (el flujómetro usa flowmeter_cache)
+device_registry = DeviceRegistry(
+    arduino_devices,
+    ttl=flowmeter_cache['ttl'],
+    discovery_cache=settings.get('ARDUINO_DISCOVERY_CACHE'),
+    shared_cache=shared_cache,
+    discoveries={FLOWMETER_DEVICE['id']: flowmeter_discovery}
+)
+device_flight = SingleFlight()
+# Listado de things compartido por las peticiones que encuentran dispositivos sin resolver
+discovery_flight = SingleFlight()
+
+# Pool acotado para consultar varios dispositivos en paralelo (se crea con la primera petición)
+device_executor = None
+device_executor_lock = threading.Lock()
+
+# Clientes conectados a /api/arduino/flowmeter/stream
+# El heartbeat también acota cuánto tarda en darse de baja un cliente desconectado
+flowmeter_stream = EventBroadcaster(heartbeat=settings['FLOWMETER_STREAM_HEARTBEAT'])
+
+# Historial persistente de lecturas (instflow/constflow)
+flow_history = FlowHistory(settings['FLOW_HISTORY_DIR'])
+flow_rollups = FlowRollups(flow_history)
+
+# Totales mensuales para los informes, actualizados con cada muestra nueva
+flow_report_accumulator = FlowReportAccumulator(os.path.join(flow_history.base_dir, STATE_FILENAME))
+if not flow_report_accumulator.exists():
+    flow_report_accumulator.rebuild(flow_history)
+flow_history.add_listener(flow_report_accumulator.ingest)
+
+# Índice de informes: el listado no necesita abrir cada JSON
+INFORMES_DIR = os.path.normpath(
+    settings.get('INFORMES_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../informes')
+)
+INFORMES_PAGE_SIZE = 50
+INFORMES_MAX_PAGE_SIZE = 500
+informes_index = InformesIndex(INFORMES_DIR)
+
+# Cuerpos serializados/comprimidos de los informes (no cambian una vez escritos)
+informes_bodies = EncodedBodyCache(max_entries=128)
+
+# Tamaños de bucket para /history cuando no se especifica uno
+HISTORY_AUTO_BUCKETS = (10, 60, 300, 900, 3600, 21600, 86400)
+HISTORY_MAX_POINTS = 5000
+
+# Contador de visitas: se suma en memoria y se guarda en SQLite cada 2 segundos
+ROOT_DIR = config.ROOT_DIR
+visit_counter = VisitCounter(
+    settings.get('VISITAS_DB') or os.path.join(ROOT_DIR, 'visitas.sqlite3'),
+    flush_interval=2.0,
+    legacy_json=os.path.join(ROOT_DIR, 'visitas.json')
+)
+
+# Máximo de estaciones por petición a /api/weather/batch
+WEATHER_BATCH_MAX_IDS = 25
+
+def sync_shared_flowmeter_cache():
+    """Adopta la lectura publicada por otro worker si es más reciente que la local"""
+    if not shared_cache.shared:
+        return
+    entry = shared_cache.get(FLOWMETER_SHARED_KEY)
+    if not entry:
+        return
+    data, stored_at = entry
+    timestamp = flowmeter_cache['timestamp']
+    # Tolerancia por la resolución de datetime (microsegundos)
+    if timestamp is not None and stored_at <= timestamp.timestamp() + 0.001:
+        return
+    flowmeter_cache['data'] = data
+    flowmeter_cache['timestamp'] = datetime.fromtimestamp(stored_at)
+    # Los clientes SSE de este worker también reciben la lectura
+    flowmeter_stream.publish(data)
+
+def get_flowmeter_cache_age():
+    """Retorna la antigüedad en segundos de los datos en caché, None si no hay"""
+    sync_shared_flowmeter_cache()
+    if flowmeter_cache['data'] and flowmeter_cache['timestamp']:
+        return (datetime.now() - flowmeter_cache['timestamp']).total_seconds()
+    return None
+
 def get_cached_flowmeter_data():
     """Retorna datos en caché si son válidos, None si no"""
-    if flowmeter_cache['data'] and flowmeter_cache['timestamp']:
-        elapsed = (datetime.now() - flowmeter_cache['timestamp']).total_seconds()
-        if elapsed < flowmeter_cache['ttl']:
-            return flowmeter_cache['data']
+    age = get_flowmeter_cache_age()
+    if age is not None and age < flowmeter_cache['ttl']:
+        return flowmeter_cache['data']
+    return None
+
+def get_stale_flowmeter_data():
+    """Retorna datos expirados pero aún dentro de la ventana de gracia, None si no"""
+    age = get_flowmeter_cache_age()
+    if age is not None and age < flowmeter_cache['ttl'] + flowmeter_cache['stale_grace']:
+        return flowmeter_cache['data']
     return None
 
 def set_flowmeter_cache(data):
     """Guarda datos en caché"""
+    stored_at = None
+    if shared_cache.shared:
+        stored_at = shared_cache.set(
+            FLOWMETER_SHARED_KEY, data, flowmeter_cache['ttl'] + flowmeter_cache['stale_grace']
+        )
     flowmeter_cache['data'] = data
-    flowmeter_cache['timestamp'] = datetime.now()
-
-def get_arduino_token():
-    """Obtiene un token de acceso para la API de Arduino IoT Cloud"""
-    client_id = settings.get('CLIENT_ID')
-    client_secret = settings.get('CLIENT_SECRET')
-    
-    if not client_id or not client_secret:
-        return None, "CLIENT_ID o CLIENT_SECRET no configurados"
-    
-    token_url = "https://api2.arduino.cc/iot/v1/clients/token"
-    
+    flowmeter_cache['timestamp'] = datetime.fromtimestamp(stored_at) if stored_at else datetime.now()
+    # Notificar a los clientes SSE solo si el valor cambió
+    flowmeter_stream.publish(data)
+    # Guardar la lectura en el historial (las repetidas se descartan)
     try:
-        # Configurar el cliente OAuth2
-        oauth_client = BackendApplicationClient(client_id=client_id)
-        oauth = OAuth2Session(client=oauth_client)
-        
-        # Obtener el token
-        token = oauth.fetch_token(
-            token_url=token_url,
-            client_id=client_id,
-            client_secret=client_secret,
-            include_client_id=True,
-            audience="https://api2.arduino.cc/iot"
-        )
-        # Obtener el access token
-        access_token = token.get("access_token")
-        
-        if not access_token:
-            return None, "No se encontró access_token en la respuesta"
-        
-        return access_token, None
-        
+        flow_history.record(data)
     except Exception as e:
-        return None, f"Error de autenticación: {str(e)}"
+        print(f"Error al guardar historial del flujómetro: {e}")
 
-@app.route("/api/arduino/flowmeter", methods=['GET'])
-def get_flowmeter_data():
-    """Obtiene los datos del flujómetro desde Arduino IoT Cloud con caché"""
-    try:
-        # Verificar si hay datos en caché válidos
-        cached_data = get_cached_flowmeter_data()
-        if cached_data:
-            return jsonify({
-                "success": True,
-                "data": cached_data,
-                "cached": True
-            }), 200
-        access_token, error = get_arduino_token()
+def fetch_device_data(device, discovery):
+    """
+    Consulta Arduino IoT Cloud y retorna las propiedades actuales de un dispositivo
 
-        if error:
-            return jsonify({
-                "error": "Error de autenticación",
-                "details": error
-            }), 401
-
-        # Obtener todos los things
-        api_url = "https://api2.arduino.cc/iot/v2/things"
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
+    El thing y sus propiedades se resuelven una sola vez (ver ThingDiscovery);
+    después solo se consulta el endpoint de propiedades. Si el thing ya no
+    existe (404) o le faltan propiedades se vuelve a descubrir una vez.
 
-        response = requests.get(api_url, headers=headers)
-        
-        # Manejar rate limiting
-        if response.status_code == 429:
-            # Si hay datos en caché aunque sean viejos, usarlos
-            if flowmeter_cache['data']:
-                return jsonify({
-                    "success": True,
-                    "data": flowmeter_cache['data'],
-                    "cached": True,
-                    "warning": "Rate limit alcanzado, usando datos en caché"
-                }), 200
-            return jsonify({
-                "error": "Rate limit alcanzado",
-                "details": "Demasiadas peticiones. Intenta de nuevo en unos segundos."
-            }), 429
-        
-        if response.status_code != 200:
-            return jsonify({
-                "error": "Error al obtener things",
-                "status_code": response.status_code,
-                "details": response.text
-            }), response.status_code
+    Args:
+        device (dict): Dispositivo de ``ARDUINO_DEVICES``
+        discovery (ThingDiscovery): Resolución de IDs del dispositivo
 
-        things_data = response.json()
-        
-        # Buscar el thing llamado "Medidor de Flujo"
-        flowmeter_thing = None
-        for thing in things_data:
-            if thing.get('name') == 'Medidor de Flujo':
-                flowmeter_thing = thing
-                break
-        
-        if not flowmeter_thing:
-            return jsonify({
-                "error": "No se encontró el thing 'Medidor de Flujo'",
-                "available_things": [t.get('name') for t in things_data]
-            }), 404
+    Returns:
+        tuple: (datos o None, cuerpo de error o None, código de estado)
+    """
+    # Circuito abierto o Retry-After pendiente: no gastar un token ni una llamada
+    retry_in = arduino_client.blocked_for()
+    if retry_in:
+        return None, arduino_client.unavailable_error(retry_in), 503
+
+    headers, error = arduino_client.headers()
+
+    if error:
+        return None, error, 401
+
+    for attempt in range(2):
+        thing_id = discovery.get_thing_id()
+
+        if not thing_id:
+            # Obtener todos los things solo cuando no conocemos el ID
+            things_data, error, status_code = arduino_client.list_things(headers)
+            if error:
+                return None, error, status_code
+
+            thing = discovery.find_thing(things_data)
+
+            if not thing:
+                return None, {
+                    "error": f"No se encontró el thing '{device['thing']}'",
+                    "available_things": [t.get('name') for t in things_data]
+                }, 404
+
+            thing_id = thing.get('id')
 
         # Obtener las propiedades del thing
-        thing_id = flowmeter_thing.get('id')
-        properties_url = f"https://api2.arduino.cc/iot/v2/things/{thing_id}/properties"
-        
-        properties_response = requests.get(properties_url, headers=headers)
-        
+        properties_response, error, status_code = arduino_client.get_properties(thing_id, headers)
+        if error:
+            return None, error, status_code
+
+        if properties_response.status_code == 404 and attempt == 0:
+            # El thing pudo haber sido recreado: volver a descubrirlo
+            discovery.invalidate()
+            continue
+
+        if properties_response.status_code == 429:
+            return None, arduino_client.rate_limit_error(), 429
+
         if properties_response.status_code != 200:
-            return jsonify({
+            return None, {
                 "error": "Error al obtener propiedades",
                 "status_code": properties_response.status_code
-            }), properties_response.status_code
+            }, properties_response.status_code
 
         properties = properties_response.json()
-        
-        # Extraer instflow y constflow
-        flowmeter_data = {
-            "thing_name": flowmeter_thing.get('name'),
-            "thing_id": thing_id,
-            "instflow": None,
-            "constflow": None,
-            "last_update": None
+        mapped = discovery.map_properties(properties)
+
+        if mapped is None and attempt == 0:
+            # Faltan propiedades esperadas: el ID recordado ya no es el correcto
+            discovery.invalidate()
+            continue
+        break
+
+    device_data = {
+        "thing_name": device['thing'],
+        "thing_id": thing_id,
+        **{name: None for name in device['properties']},
+        "last_update": None
+    }
+
+    for name, prop in (mapped or {}).items():
+        device_data[name] = {
+            "value": prop.get('last_value'),
+            "updated_at": prop.get('value_updated_at')
         }
-        
-        for prop in properties:
-            prop_name = prop.get('name', '').lower()
-            if 'instflow' in prop_name:
-                flowmeter_data['instflow'] = {
-                    "value": prop.get('last_value'),
-                    "updated_at": prop.get('value_updated_at')
-                }
-            elif 'constflow' in prop_name:
-                flowmeter_data['constflow'] = {
-                    "value": prop.get('last_value'),
-                    "updated_at": prop.get('value_updated_at')
-                }
-        
-        # Guardar en caché
+
+    return device_data, None, 200
+
+def fetch_flowmeter_data():
+    """Consulta Arduino IoT Cloud y retorna los datos actuales del flujómetro"""
+    return fetch_device_data(FLOWMETER_DEVICE, flowmeter_discovery)
+
+def refresh_flowmeter_cache(force=False, min_age=None):
+    """
+    Obtiene datos frescos del flujómetro y actualiza la caché
+
+    Se ejecuta dentro de ``flowmeter_flight``: solo un hilo a la vez consulta
+    Arduino IoT Cloud y el resto reutiliza su resultado. Con una caché
+    compartida, además, solo un worker a la vez consulta (el que obtiene el
+    lease); los demás esperan la lectura que ese worker publique.
+
+    Args:
+        force (bool): Consultar aunque la caché siga vigente (usado por el poller)
+        min_age (float): No consultar si la lectura tiene menos de estos
+            segundos (otro worker acaba de refrescarla)
+
+    Returns:
+        tuple: (datos o None, cuerpo de error o None, código de estado)
+    """
+    # Otro líder pudo haber actualizado la caché justo antes
+    cached_data = None if force else get_cached_flowmeter_data()
+    if cached_data:
+        return cached_data, None, 200
+
+    age = get_flowmeter_cache_age()
+    if min_age is not None and age is not None and age < min_age:
+        return flowmeter_cache['data'], None, 200
+
+    if shared_cache.shared and not shared_cache.add(FLOWMETER_LEASE_KEY, os.getpid(), FLOWMETER_WAIT_TIMEOUT):
+        data = wait_shared_flowmeter_data(flowmeter_cache['timestamp'], FLOWMETER_WAIT_TIMEOUT / 2)
+        if data:
+            return data, None, 200
+
+    try:
+        flowmeter_data, error, status_code = fetch_flowmeter_data()
+    finally:
+        if shared_cache.shared:
+            shared_cache.delete(FLOWMETER_LEASE_KEY)
+    if not error:
         set_flowmeter_cache(flowmeter_data)
+    return flowmeter_data, error, status_code
+
+def wait_shared_flowmeter_data(previous_timestamp, timeout):
+    """Espera a que otro worker publique una lectura más nueva que ``previous_timestamp``"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        time.sleep(0.1)
+        sync_shared_flowmeter_cache()
+        if flowmeter_cache['timestamp'] != previous_timestamp and flowmeter_cache['data']:
+            return flowmeter_cache['data']
+    return None
+
+def poll_flowmeter(min_age=None):
+    """Refresco periódico del poller en segundo plano; retorna el código de estado"""
+    (_, _, status_code), _ = flowmeter_flight.do(
+        'flowmeter', lambda: refresh_flowmeter_cache(force=True, min_age=min_age), timeout=FLOWMETER_WAIT_TIMEOUT
+    )
+    return status_code
+
+# Poller opcional: mantiene la caché caliente para que las peticiones no esperen a Arduino
+flowmeter_poller = None
+if settings.get('FLOWMETER_POLL_INTERVAL'):
+    # Cada worker tiene su poller; si otro worker refrescó hace menos de
+    # medio intervalo (caché compartida) no se vuelve a consultar
+    flowmeter_poller = BackgroundPoller(
+        lambda: poll_flowmeter(min_age=settings.get('FLOWMETER_POLL_INTERVAL') / 2),
+        interval=settings.get('FLOWMETER_POLL_INTERVAL'),
+        name="flowmeter-poller"
+    )
+    flowmeter_poller.start()
+
+def poll_flowmeter_for_stream():
+    """Refresco para los clientes SSE; no consulta Arduino si no hay nadie conectado"""
+    if not flowmeter_stream.subscriber_count():
+        return 200
+    return poll_flowmeter(min_age=flowmeter_cache['ttl'] / 2)
+
+# Poller de los clientes SSE: se inicia con el primer cliente si no hay poller global
+stream_poller = None
+stream_poller_lock = threading.Lock()
+
+def ensure_stream_poller():
+    """Garantiza que alguien refresque la caché mientras haya clientes SSE"""
+    global stream_poller
+    if flowmeter_poller:
+        return
+    with stream_poller_lock:
+        if stream_poller is None:
+            stream_poller = BackgroundPoller(
+                poll_flowmeter_for_stream,
+                interval=flowmeter_cache['ttl'],
+                name="flowmeter-stream-poller"
+            )
+        stream_poller.start()
+
+def flowmeter_cached_response(**extra):
+    """Respuesta con los datos en caché y su antigüedad"""
+    age = get_flowmeter_cache_age()
+    return jsonify({
+        "success": True,
+        "data": flowmeter_cache['data'],
+        "cached": True,
+        "age": round(age, 1) if age is not None else None,
+        **extra
+    }), 200
+
+@app.route("/api/arduino/flowmeter", methods=['GET'])
+def get_flowmeter_data():
+    """Obtiene los datos del flujómetro desde Arduino IoT Cloud con caché"""
+    try:
+        # Verificar si hay datos en caché válidos
+        if get_cached_flowmeter_data():
+            CACHE_REQUESTS.inc('flowmeter', 'hit')
+            return flowmeter_cached_response()
+
+        # Circuito abierto o Retry-After pendiente: servir la caché sin intentar consultar
+        retry_in = arduino_scheduler.blocked_for()
+        if retry_in and flowmeter_cache['data']:
+            CACHE_REQUESTS.inc('flowmeter', 'stale')
+            return flowmeter_cached_response(
+                stale=True,
+                warning="Arduino IoT Cloud no disponible temporalmente, usando datos en caché",
+                retry_after=max(1, round(retry_in))
+            )
+
+        # Dato vencido pero dentro de la ventana de gracia: servirlo y refrescar en segundo plano
+        if get_stale_flowmeter_data():
+            CACHE_REQUESTS.inc('flowmeter', 'stale')
+            response = flowmeter_cached_response(stale=True)
+            flowmeter_flight.start('flowmeter', refresh_flowmeter_cache)
+            return response
+
+        CACHE_REQUESTS.inc('flowmeter', 'miss')
+        try:
+            (flowmeter_data, error, status_code), shared = flowmeter_flight.do(
+                'flowmeter', refresh_flowmeter_cache, timeout=FLOWMETER_WAIT_TIMEOUT
+            )
+        except TimeoutError:
+            if flowmeter_cache['data']:
+                return flowmeter_cached_response(
+                    warning="Arduino IoT Cloud tarda en responder, usando datos en caché"
+                )
+            return jsonify({
+                "error": "Tiempo de espera agotado",
+                "details": "Arduino IoT Cloud no respondió a tiempo. Intenta de nuevo en unos segundos."
+            }), 504
+
+        # Manejar rate limiting (del servicio o de arduino_scheduler)
+        if status_code in (429, 503) and flowmeter_cache['data']:
+            # Si hay datos en caché aunque sean viejos, usarlos
+            return flowmeter_cached_response(warning="Rate limit alcanzado, usando datos en caché")
+
+        if error:
+            response = jsonify(error)
+            if error.get('retry_after'):
+                response.headers['Retry-After'] = str(error['retry_after'])
+            return response, status_code
         
         return jsonify({
             "success": True,
             "data": flowmeter_data,
-            "cached": False
+            "cached": shared,
+            "age": 0
         }), 200
 
     except Exception as e:
         print(f"\nError inesperado: {e}")
         # En caso de error, intentar usar caché aunque sea viejo
         if flowmeter_cache['data']:
-            return jsonify({
-                "success": True,
-                "data": flowmeter_cache['data'],
-                "cached": True,
-                "warning": "Error en la API, usando datos en caché"
-            }), 200
+            return flowmeter_cached_response(warning="Error en la API, usando datos en caché")
         return jsonify({
             "error": "Error inesperado",
             "details": str(e)
         }), 500
 
 
+@app.route("/api/arduino/flowmeter/stream", methods=['GET'])
+def stream_flowmeter_data():
+    """Envía las lecturas del flujómetro por Server-Sent Events cuando cambian"""
+    ensure_stream_poller()
+
+    return Response(flowmeter_stream.stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Evitar que nginx acumule los eventos
+    })
+
+
+def parse_history_time(value, default):
+    """Interpreta un parámetro de tiempo: segundos epoch o fecha ISO 8601"""
+    if value in (None, ''):
+        return default
+    if value.isdigit():
+        return int(value)
+    timestamp = parse_updated_at(value)
+    if timestamp is None:
+        raise ValueError(f"Fecha inválida: {value}")
+    return timestamp
+
+
+@app.route("/api/arduino/flowmeter/history", methods=['GET'])
+def get_flowmeter_history():
+    """Historial agregado por buckets (min, max, avg, last, count) como arreglos paralelos"""
+    series = request.args.get('series', 'constflow')
+    if series not in flow_history.series:
+        return jsonify({
+            "error": "Serie inválida",
+            "available_series": list(flow_history.series)
+        }), 400
+
+    try:
+        now = int(datetime.now().timestamp())
+        end = parse_history_time(request.args.get('to'), now)
+        start = parse_history_time(request.args.get('from'), end - 3600)
+        bucket = request.args.get('bucket')
+        if bucket:
+            bucket = int(bucket)
+        else:
+            # Elegir el bucket más pequeño que no exceda ~1000 puntos
+            bucket = next((b for b in HISTORY_AUTO_BUCKETS if (end - start) / b <= 1000), HISTORY_AUTO_BUCKETS[-1])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not 0 <= start <= end <= MAX_TIMESTAMP or bucket <= 0:
+        return jsonify({"error": "Rango o bucket inválido"}), 400
+    if (end - start) / bucket > HISTORY_MAX_POINTS:
+        return jsonify({
+            "error": f"El rango pedido genera más de {HISTORY_MAX_POINTS} puntos, usa un bucket mayor"
+        }), 400
+
+    try:
+        result = flow_rollups.query(series, start, end, bucket)
+    except Exception as e:
+        print(f"Error al consultar historial: {e}")
+        return jsonify({
+            "error": "Error al consultar historial",
+            "details": str(e)
+        }), 500
+
+    return jsonify({
+        "success": True,
+        "series": series,
+        "from": start,
+        "to": end,
+        **result
+    })
+
+
+def is_flowmeter_device(device):
+    """El flujómetro mantiene su propia caché, SSE e historial"""
+    return device['thing'] == FLOWMETER_THING_NAME
+
+def get_device_executor():
+    """Retorna el pool de consultas a dispositivos, creándolo si no existe"""
+    global device_executor
+    if device_executor is None:
+        with device_executor_lock:
+            if device_executor is None:
+                device_executor = ThreadPoolExecutor(
+                    max_workers=settings.get('ARDUINO_DEVICE_WORKERS'),
+                    thread_name_prefix="arduino-devices"
+                )
+    return device_executor
+
+def get_cached_device_reading(device, max_age=None):
+    """
+    Lectura en caché de un dispositivo
+
+    Args:
+        device (dict): Dispositivo de ``ARDUINO_DEVICES``
+        max_age (float): Antigüedad máxima en segundos (por defecto el TTL)
+
+    Returns:
+        tuple: (datos, antigüedad en segundos) o None
+    """
+    if not is_flowmeter_device(device):
+        return device_registry.get_cached(device['id'], max_age)
+    age = get_flowmeter_cache_age()
+    max_age = flowmeter_cache['ttl'] if max_age is None else max_age
+    if age is not None and age < max_age:
+        return flowmeter_cache['data'], age
+    return None
+
+def refresh_device_cache(device):
+    """Consulta un dispositivo (que no sea el flujómetro) y guarda su lectura"""
+    cached = device_registry.get_cached(device['id'])
+    if cached:
+        return cached[0], None, 200
+    data, error, status_code = fetch_device_data(device, device_registry.discovery(device['id']))
+    if not error:
+        device_registry.set_cached(device['id'], data)
+    return data, error, status_code
+
+def load_device(device):
+    """Lectura actual de un dispositivo, agrupando las peticiones concurrentes"""
+    if is_flowmeter_device(device):
+        result, _ = flowmeter_flight.do('flowmeter', refresh_flowmeter_cache, timeout=FLOWMETER_WAIT_TIMEOUT)
+    else:
+        result, _ = device_flight.do(
+            device['id'], lambda: refresh_device_cache(device), timeout=FLOWMETER_WAIT_TIMEOUT
+        )
+    return result
+
+def discover_devices(devices):
+    """
+    Resuelve con un solo listado de things los dispositivos cuyo ID aún no se conoce
+
+    Las peticiones concurrentes comparten el mismo listado (``discovery_flight``).
+    """
+    if len(device_registry.unresolved(devices)) < 2:
+        return
+    try:
+        discovery_flight.do('things', list_and_resolve_devices, timeout=FLOWMETER_WAIT_TIMEOUT)
+    except TimeoutError:
+        # Cada dispositivo lo reintentará por separado
+        pass
+
+def list_and_resolve_devices():
+    """Lista los things una vez y resuelve todos los dispositivos pendientes"""
+    unresolved = device_registry.unresolved()
+    if not unresolved:
+        return
+    headers, error = arduino_client.headers()
+    if error:
+        return
+    things, error, _ = arduino_client.list_things(headers)
+    if error:
+        # Cada dispositivo lo reintentará (y reportará el error) por separado
+        return
+    for device in unresolved:
+        device_registry.discovery(device['id']).find_thing(things)
+
+def device_result(future, done):
+    """Convierte el futuro de ``load_device`` en (datos, error, código de estado)"""
+    if future not in done or isinstance(future.exception(), TimeoutError):
+        return None, {
+            "error": "Tiempo de espera agotado",
+            "details": "Arduino IoT Cloud no respondió a tiempo. Intenta de nuevo en unos segundos."
+        }, 504
+    if future.exception():
+        return None, {
+            "error": "Error al consultar el dispositivo",
+            "details": str(future.exception())
+        }, 500
+    return future.result()
+
+@app.route("/api/arduino/devices", methods=['GET'])
+def get_arduino_devices():
+    """Obtiene en una sola respuesta la lectura actual de todos los dispositivos configurados"""
+    start = time.time()
+    readings = {}
+    pending = []
+    for device in device_registry.devices:
+        cached = get_cached_device_reading(device)
+        cache_name = 'flowmeter' if is_flowmeter_device(device) else 'arduino_device'
+        if cached:
+            CACHE_REQUESTS.inc(cache_name, 'hit')
+            readings[device['id']] = {"data": cached[0], "cached": True, "age": round(cached[1], 1)}
+        else:
+            CACHE_REQUESTS.inc(cache_name, 'miss')
+            pending.append(device)
+
+    if pending:
+        discover_devices(pending)
+        futures = {get_device_executor().submit(load_device, device): device for device in pending}
+        done, _ = wait(futures, timeout=FLOWMETER_WAIT_TIMEOUT)
+        for future, device in futures.items():
+            data, error, status_code = device_result(future, done)
+            if not error:
+                readings[device['id']] = {"data": data, "cached": False, "age": 0}
+                continue
+            # Error: usar la última lectura conocida aunque esté vencida
+            stale = get_cached_device_reading(device, max_age=float('inf'))
+            readings[device['id']] = {
+                "data": stale[0] if stale else None,
+                "cached": stale is not None,
+                "age": round(stale[1], 1) if stale else None,
+                "error": error,
+                "status_code": status_code
+            }
+
+    return jsonify({
+        "success": True,
+        "devices": [
+            {"id": device['id'], "thing_name": device['thing'], **readings[device['id']]}
+            for device in device_registry.devices
+        ],
+        "elapsed_ms": round((time.time() - start) * 1000, 1)
+    })
+
+
+@app.route("/api/arduino/upstream", methods=['GET'])
+def get_arduino_upstream_status():
+    """Estado del circuit breaker, presupuesto restante de la cuota, latencias y renovaciones del token de Arduino IoT Cloud"""
+    return jsonify({
+        "success": True,
+        **arduino_scheduler.get_stats(),
+        "client": arduino_client.get_stats(),
+        "token": arduino_tokens.get_stats(),
+        "coalescing": get_flight_stats(),
+        "stream": flowmeter_stream.get_stats()
+    })
+
+
+def get_flight_stats():
+    """Contadores de las lecturas agrupadas (single-flight) por tipo de consulta"""
+    return {
+        "flowmeter": flowmeter_flight.get_stats(),
+        "devices": device_flight.get_stats(),
+        "discovery": discovery_flight.get_stats()
+    }
+
+
 @app.route("/api/weather")
 def get_weather_empty():
     """Obtiene datos meteorológicos usando la estación por defecto configurada en .env"""
-    from app.utils.weathercloud_py import WeathercloudAPI
-    
     # Obtener la ID de estación desde las variables de entorno
     default_station = settings.get('WEATHERCLOUD_DEVICEID')
     if not default_station:
@@ -203,7 +715,7 @@ def get_weather_empty():
         }), 400
         
     try:
-        weather_api = WeathercloudAPI()
+        weather_api = get_weathercloud_client()
     except ValueError as e:
         return jsonify({"error": str(e)}), 401
         
@@ -219,11 +731,51 @@ def get_weather_empty():
     return jsonify(data)
 
 
+@app.route("/api/weather/batch")
+def get_weather_batch():
+    """Obtiene datos meteorológicos de varias estaciones (?ids=a,b,c) en una sola petición"""
+    # Sin espacios ni repetidos (en orden) antes de aplicar el límite
+    ids = list(dict.fromkeys(i.strip() for i in request.args.get('ids', '').split(',') if i.strip()))
+    if not ids:
+        return jsonify({"error": "Parámetro 'ids' requerido (IDs separados por coma)"}), 400
+    if len(ids) > WEATHER_BATCH_MAX_IDS:
+        return jsonify({"error": f"Máximo {WEATHER_BATCH_MAX_IDS} estaciones por petición"}), 400
+
+    try:
+        weather_api = get_weathercloud_client()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 401
+
+    start = time.time()
+    results, errors = weather_api.get_weather_batch(ids, timeout=settings['WEATHERCLOUD_BATCH_TIMEOUT'])
+    return jsonify({
+        "results": results,
+        "errors": errors,
+        "elapsed_ms": round((time.time() - start) * 1000, 1)
+    })
+
+
+@app.route("/api/weather/stats")
+def get_weather_stats():
+    """Contadores de login y verificaciones de sesión evitadas del cliente de Weathercloud"""
+    try:
+        weather_api = get_weathercloud_client()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 401
+
+    return jsonify({
+        "success": True,
+        **weather_api.get_stats()
+    })
+
+
 @app.route("/api/weather/<station_id>")
 def get_weather_station(station_id):
     """Obtiene datos meteorológicos de una estación específica de Weathercloud"""
-    from app.utils.weathercloud_py import WeathercloudAPI
-    weather_api = WeathercloudAPI()
+    try:
+        weather_api = get_weathercloud_client()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 401
     
     data = weather_api.get_weather(station_id)
     return jsonify(data)
@@ -233,24 +785,46 @@ def get_weather_station(station_id):
 def get_nearest_stations():
     """Obtiene estaciones meteorológicas cercanas a las coordenadas especificadas"""
     try:
-        from app.utils.weathercloud_py import WeathercloudAPI
-        weather_api = WeathercloudAPI()
-        
         lat = float(request.args.get('lat', 0))
         lon = float(request.args.get('lon', 0))
         radius = int(request.args.get('radius', 10))
-        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        weather_api = get_weathercloud_client()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 401
+
+    try:
         stations = weather_api.get_nearest(lat, lon, radius)
-        return jsonify(stations)
+    except TimeoutError:
+        # Otra petición está descargando la misma celda y no terminó a tiempo
+        return jsonify({
+            "error": "Tiempo de espera agotado",
+            "details": "Weathercloud no respondió a tiempo. Intenta de nuevo en unos segundos."
+        }), 503
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        print(f"Error al obtener estaciones cercanas: {e}")
+        return jsonify({
+            "error": "Error al obtener estaciones cercanas",
+            "details": str(e)
+        }), 500
+
+    if isinstance(stations, dict) and "error" in stations:
+        if "autenticación" in stations["error"].lower():
+            return jsonify(stations), 401
+        return jsonify(stations), 500
+    return jsonify(stations)
 
 
 @app.route("/api/weather/profile/<station_id>")
 def get_station_profile(station_id):
     """Obtiene el perfil de una estación meteorológica"""
-    from app.utils.weathercloud_py import WeathercloudAPI
-    weather_api = WeathercloudAPI()
+    try:
+        weather_api = get_weathercloud_client()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 401
     
     data = weather_api.get_profile(station_id)
     return jsonify(data)
@@ -259,8 +833,10 @@ def get_station_profile(station_id):
 @app.route("/api/weather/statistics/<station_id>")
 def get_station_statistics(station_id):
     """Obtiene estadísticas de una estación meteorológica"""
-    from app.utils.weathercloud_py import WeathercloudAPI
-    weather_api = WeathercloudAPI()
+    try:
+        weather_api = get_weathercloud_client()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 401
     
     data = weather_api.get_statistics(station_id)
     return jsonify(data)
@@ -269,182 +845,82 @@ def get_station_statistics(station_id):
 @app.route("/api/visitas", methods=['POST'])
 def add_visitas():
     """Añade una visita"""
-    num_visitas = config.incrementar_visitas()
+    num_visitas = visit_counter.increment()
     return jsonify({"num_visitas": num_visitas})
 
 
+def cached_json_response(key, etag, build_body, last_modified=None):
+    """
+    Respuesta JSON con ETag, 304 condicional y cuerpo comprimido en caché
+
+    Args:
+        key (tuple): Clave del cuerpo en ``informes_bodies`` (debe incluir el ETag)
+        etag (str): Validador del contenido
+        build_body (callable): Genera el cuerpo JSON (bytes) si no está en caché
+        last_modified (int): Segundos epoch de la última modificación (opcional)
+    """
+    not_modified = request.if_none_match.contains_weak(etag) or (
+        not request.if_none_match and last_modified and request.if_modified_since
+        and last_modified <= request.if_modified_since.timestamp()
+    )
+    if not_modified:
+        response = Response(status=304)
+    else:
+        encoding = choose_encoding(request.accept_encodings)
+        response = Response(informes_bodies.get(key, build_body, encoding), mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    
+    # ETag débil: el mismo validador sirve para todas las codificaciones
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @app.route("/api/informes", methods=['GET'])
 def get_informes():
-    """Obtiene la lista de informes disponibles"""
-    import os
-    from datetime import datetime
-    
-    # Crear directorio de informes si no existe
-    informes_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../informes')
-    informes_dir = os.path.normpath(informes_dir)
+    """Obtiene la lista de informes disponibles (solo metadata, paginada)"""
+    try:
+        limit = min(max(int(request.args.get('limit', INFORMES_PAGE_SIZE)), 1), INFORMES_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "limit inválido"}), 400
+    cursor = request.args.get('cursor')
     
-    if not os.path.exists(informes_dir):
-        os.makedirs(informes_dir)
+    # El ETag cambia cuando se agrega o elimina un informe
+    version = informes_index.version()
+    etag = hashlib.sha1(f"{version}|{limit}|{cursor}".encode('utf-8')).hexdigest()[:20]
     
-    # Listar archivos de informes
-    informes = []
-    for filename in os.listdir(informes_dir):
-        if filename.endswith('.json'):
-            filepath = os.path.join(informes_dir, filename)
-            # Obtener información del archivo
-            file_stat = os.stat(filepath)
-            file_time = datetime.fromtimestamp(file_stat.st_mtime)
-            
-            # Leer el contenido del informe
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    import json
-                    informe_data = json.load(f)
-                    
-                informes.append({
-                    'id': filename.replace('.json', ''),
-                    'nombre': informe_data.get('nombre', filename),
-                    'fecha': file_time.strftime('%d/%m/%Y'),
-                    'fecha_completa': file_time.strftime('%d/%m/%Y %H:%M'),
-                    'periodo': informe_data.get('periodo', 'N/A'),
-                    'datos': informe_data
-                })
-            except:
-                continue
-    
-    # Ordenar por fecha (más reciente primero)
-    informes.sort(key=lambda x: x['fecha_completa'], reverse=True)
+    def build_body():
+        with INFORMES_IO.time('list'):
+            informes, next_cursor = informes_index.list(limit=limit, cursor=cursor)
+        return json.dumps({
+            "success": True,
+            "informes": informes,
+            "next_cursor": next_cursor
+        }, ensure_ascii=False).encode('utf-8')
     
-    return jsonify({
-        "success": True,
-        "informes": informes
-    })
+    try:
+        return cached_json_response(('listado', etag), etag, build_body)
+    except ValueError:
+        return jsonify({"error": "cursor inválido"}), 400
 
 
 @app.route("/api/informes/generar", methods=['POST'])
 def generar_informe():
     """Genera un nuevo informe de caudal - SOLO MENSUAL"""
-    import os
-    import json
-    from datetime import datetime, timedelta
-    import calendar
-    
     try:
         # Crear directorio de informes si no existe
-        informes_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../informes')
-        informes_dir = os.path.normpath(informes_dir)
+        informes_dir = INFORMES_DIR
         
         if not os.path.exists(informes_dir):
             os.makedirs(informes_dir)
         
-        # VALIDAR: Verificar si ya existe un informe del mes actual
-        fecha_actual = datetime.now()
-        mes_actual = fecha_actual.month
-        anio_actual = fecha_actual.year
-        
-        # Buscar informes existentes del mes actual
-        for filename in os.listdir(informes_dir):
-            if filename.endswith('.json'):
-                try:
-                    filepath = os.path.join(informes_dir, filename)
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        informe_existente = json.load(f)
-                    
-                    # Extraer fecha de generación del informe existente
-                    fecha_gen_str = informe_existente.get('fecha_generacion', '')
-                    if fecha_gen_str:
-                        # Parsear fecha: "03/11/2025 02:14:51"
-                        fecha_gen = datetime.strptime(fecha_gen_str, '%d/%m/%Y %H:%M:%S')
-                        
-                        # Verificar si es del mismo mes y año
-                        if fecha_gen.month == mes_actual and fecha_gen.year == anio_actual:
-                            # Calcular días transcurridos desde el informe
-                            dias_transcurridos = (fecha_actual - fecha_gen).days
-                            
-                            # Obtener días del mes actual
-                            dias_en_mes = calendar.monthrange(anio_actual, mes_actual)[1]
-                            
-                            # Si no han pasado los días del mes, no permitir generar
-                            if dias_transcurridos < dias_en_mes:
-                                return jsonify({
-                                    "success": False,
-                                    "error": f"Ya existe un informe del mes actual generado el {fecha_gen.strftime('%d/%m/%Y')}. Debe esperar {dias_en_mes - dias_transcurridos} días más para generar un nuevo informe mensual.",
-                                    "dias_restantes": dias_en_mes - dias_transcurridos,
-                                    "informe_existente": {
-                                        'id': filename.replace('.json', ''),
-                                        'fecha': fecha_gen.strftime('%d/%m/%Y'),
-                                        'nombre': informe_existente.get('nombre', '')
-                                    }
-                                }), 400
-                except Exception as e:
-                    print(f"Error al verificar informe {filename}: {e}")
-                    continue
-        
-        # Obtener datos del flujómetro
-        flowmeter_data = None
-        if flowmeter_cache['data']:
-            flowmeter_data = flowmeter_cache['data']
-        else:
-            # Intentar obtener datos frescos
-            access_token, error = get_arduino_token()
-            if not error:
-                # Simplificado: usar datos en caché o simulados
-                flowmeter_data = {
-                    'instflow': {'value': 0},
-                    'constflow': {'value': 0}
-                }
-        
-        # Solo permitir informes mensuales
-        periodo_nombre = "Último Mes"
-        fecha_fin = datetime.now()
-        # Calcular el primer día del mes anterior
-        if fecha_fin.month == 1:
-            fecha_inicio = datetime(fecha_fin.year - 1, 12, 1)
-        else:
-            fecha_inicio = datetime(fecha_fin.year, fecha_fin.month - 1, 1)
-        
-        # Calcular días del período para promedios
-        dias_periodo = (fecha_fin - fecha_inicio).days
-        
-        # Calcular días del período para promedios
-        dias_periodo = (fecha_fin - fecha_inicio).days
-        
-        # Crear estructura del informe
-        informe = {
-            'nombre': f'Informe de Caudal - {periodo_nombre}',
-            'fecha_generacion': fecha_fin.strftime('%d/%m/%Y %H:%M:%S'),
-            'periodo': periodo_nombre,
-            'fecha_inicio': fecha_inicio.strftime('%d/%m/%Y'),
-            'fecha_fin': fecha_fin.strftime('%d/%m/%Y'),
-            'mes_anio': f"{fecha_fin.month}/{fecha_fin.year}",  # Para validaciones futuras
-            'datos': {
-                'flujo_instantaneo': flowmeter_data.get('constflow', {}).get('value', 0) if flowmeter_data else 0,
-                'flujo_acumulado': flowmeter_data.get('instflow', {}).get('value', 0) if flowmeter_data else 0,
-                'promedio_diario': (flowmeter_data.get('instflow', {}).get('value', 0) / dias_periodo) if flowmeter_data and dias_periodo > 0 else 0,
-            },
-            'estadisticas': {
-                'total_litros': flowmeter_data.get('instflow', {}).get('value', 0) if flowmeter_data else 0,
-                'promedio_lmin': flowmeter_data.get('constflow', {}).get('value', 0) if flowmeter_data else 0,
-            }
-        }
-        
-        # Guardar informe
-        filename = f"informe_{fecha_fin.strftime('%Y%m%d_%H%M%S')}.json"
-        filepath = os.path.join(informes_dir, filename)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(informe, f, indent=2, ensure_ascii=False)
-        
-        return jsonify({
-            "success": True,
-            "message": "Informe generado exitosamente",
-            "informe": {
-                'id': filename.replace('.json', ''),
-                'nombre': informe['nombre'],
-                'fecha': fecha_fin.strftime('%d/%m/%Y'),
-                'periodo': periodo_nombre
-            }
-        })
+        # Un solo informe a la vez: evita que dos POST concurrentes creen el mismo mes
+        with informes_index.write_lock:
+            return _generar_informe_locked(informes_dir)
         
     except Exception as e:
         print(f"Error al generar informe: {e}")
@@ -454,30 +930,142 @@ def generar_informe():
         }), 500
 
 
+def _generar_informe_locked(informes_dir):
+    """Valida el mes y guarda el informe; se ejecuta con ``informes_index.write_lock`` tomado"""
+    # VALIDAR: Verificar si ya existe un informe del mes actual (búsqueda en el índice)
+    fecha_actual = datetime.now()
+    mes_actual = fecha_actual.month
+    anio_actual = fecha_actual.year
+
+    informe_existente = informes_index.find_by_month(f"{mes_actual}/{anio_actual}")
+    if informe_existente:
+        fecha_gen = datetime.fromtimestamp(informe_existente['generado'])
+
+        # Calcular días transcurridos desde el informe
+        dias_transcurridos = (fecha_actual - fecha_gen).days
+
+        # Obtener días del mes actual
+        dias_en_mes = calendar.monthrange(anio_actual, mes_actual)[1]
+
+        # Si no han pasado los días del mes, no permitir generar
+        if dias_transcurridos < dias_en_mes:
+            return jsonify({
+                "success": False,
+                "error": f"Ya existe un informe del mes actual generado el {fecha_gen.strftime('%d/%m/%Y')}. Debe esperar {dias_en_mes - dias_transcurridos} días más para generar un nuevo informe mensual.",
+                "dias_restantes": dias_en_mes - dias_transcurridos,
+                "informe_existente": {
+                    'id': informe_existente['id'],
+                    'fecha': fecha_gen.strftime('%d/%m/%Y'),
+                    'nombre': informe_existente['nombre'] or ''
+                }
+            }), 400
+
+    # Lectura actual del flujómetro (si hay datos en caché)
+    flowmeter_data = flowmeter_cache['data'] or {}
+
+    # Solo permitir informes mensuales
+    periodo_nombre = "Último Mes"
+    fecha_fin = datetime.now()
+    # Calcular el primer día del mes anterior
+    if fecha_fin.month == 1:
+        fecha_inicio = datetime(fecha_fin.year - 1, 12, 1)
+    else:
+        fecha_inicio = datetime(fecha_fin.year, fecha_fin.month - 1, 1)
+
+    # Calcular días del período para promedios
+    dias_periodo = (fecha_fin - fecha_inicio).days
+
+    # Totales del período desde los acumuladores mensuales (no recorre el historial)
+    resumen = flow_report_accumulator.summary(fecha_inicio, fecha_fin)
+    flujo_instantaneo = (flowmeter_data.get('constflow') or {}).get('value')
+    flujo_acumulado = (flowmeter_data.get('instflow') or {}).get('value')
+    if flujo_instantaneo is None:
+        flujo_instantaneo = resumen['ultimo_constflow'] or 0
+    if flujo_acumulado is None:
+        flujo_acumulado = resumen['ultimo_instflow'] or 0
+
+    # Crear estructura del informe
+    informe = {
+        'nombre': f'Informe de Caudal - {periodo_nombre}',
+        'fecha_generacion': fecha_fin.strftime('%d/%m/%Y %H:%M:%S'),
+        'periodo': periodo_nombre,
+        'fecha_inicio': fecha_inicio.strftime('%d/%m/%Y'),
+        'fecha_fin': fecha_fin.strftime('%d/%m/%Y'),
+        'mes_anio': f"{fecha_fin.month}/{fecha_fin.year}",  # Para validaciones futuras
+        'datos': {
+            'flujo_instantaneo': flujo_instantaneo,
+            'flujo_acumulado': flujo_acumulado,
+            'promedio_diario': round(resumen['total_litros'] / dias_periodo, 2) if dias_periodo > 0 else 0,
+        },
+        'estadisticas': {
+            'total_litros': resumen['total_litros'],
+            'promedio_lmin': resumen['promedio_lmin'],
+            'pico_lmin': resumen['pico_lmin'],
+            'fecha_pico': resumen['fecha_pico'],
+            'dia_mayor_consumo': resumen['dia_mayor_consumo'],
+            'litros_dia_mayor_consumo': resumen['litros_dia_mayor_consumo'],
+            'dias_con_datos': resumen['dias_con_datos'],
+            'muestras': resumen['muestras'],
+            'perfil_horario': resumen['perfil_horario'],
+            'meses': resumen['meses'],
+        }
+    }
+
+    # Guardar informe (escritura atómica) y registrarlo en el índice
+    filename = f"informe_{fecha_fin.strftime('%Y%m%d_%H%M%S')}.json"
+    filepath = os.path.join(informes_dir, filename)
+
+    tmp_path = os.path.join(informes_dir, f".{filename}.tmp")
+    with INFORMES_IO.time('write'):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, filepath)
+    with INFORMES_IO.time('index_add'):
+        informes_index.add(filename.replace('.json', ''), informe)
+
+    return jsonify({
+        "success": True,
+        "message": "Informe generado exitosamente",
+        "informe": {
+            'id': filename.replace('.json', ''),
+            'nombre': informe['nombre'],
+            'fecha': fecha_fin.strftime('%d/%m/%Y'),
+            'periodo': periodo_nombre
+        }
+    })
+
+
 @app.route("/api/informes/<informe_id>", methods=['GET'])
 def get_informe(informe_id):
     """Obtiene un informe específico"""
-    import os
-    import json
-    
     try:
-        informes_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../informes')
-        informes_dir = os.path.normpath(informes_dir)
-        
-        filepath = os.path.join(informes_dir, f"{informe_id}.json")
+        filepath = informes_index.path_for(informe_id)
         
         if not os.path.exists(filepath):
             return jsonify({
                 "error": "Informe no encontrado"
             }), 404
         
-        with open(filepath, 'r', encoding='utf-8') as f:
-            informe = json.load(f)
+        meta = informes_index.get(informe_id)
+        stat = os.stat(filepath)
+        if not meta or (meta['mtime_ns'], meta['size']) != (stat.st_mtime_ns, stat.st_size):
+            # El archivo se modificó fuera de la aplicación: reindexar
+            informes_index.sync(force=True)
+            meta = informes_index.get(informe_id)
+            if not meta:
+                return jsonify({
+                    "error": "Informe no encontrado"
+                }), 404
         
-        return jsonify({
-            "success": True,
-            "informe": informe
-        })
+        def build_body():
+            # El JSON guardado se inserta tal cual, sin parsearlo ni volver a serializarlo
+            with INFORMES_IO.time('read'), open(filepath, 'rb') as f:
+                return b'{"success": true, "informe": ' + f.read() + b'}'
+        
+        return cached_json_response(
+            ('informe', informe_id, meta['etag']), meta['etag'], build_body,
+            last_modified=meta['mtime_ns'] // 1_000_000_000
+        )
         
     except Exception as e:
         return jsonify({
@@ -489,11 +1077,8 @@ def get_informe(informe_id):
 @app.route("/api/informes/<informe_id>", methods=['DELETE'])
 def delete_informe(informe_id):
     """Elimina un informe"""
-    import os
-    
     try:
-        informes_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../informes')
-        informes_dir = os.path.normpath(informes_dir)
+        informes_dir = INFORMES_DIR
         
         filepath = os.path.join(informes_dir, f"{informe_id}.json")
         
@@ -502,7 +1087,9 @@ def delete_informe(informe_id):
                 "error": "Informe no encontrado"
             }), 404
         
-        os.remove(filepath)
+        with INFORMES_IO.time('delete'):
+            os.remove(filepath)
+            informes_index.remove(informe_id)
         
         return jsonify({
             "success": True,
@@ -0,0 +1,127 @@
+import time
+
+from flask import Response, g, request
+
+from app import app
+from app.controllers import api_controller
+from app.utils.metrics import HTTP_LATENCY, REGISTRY
+from app.utils.weathercloud_py import get_weathercloud_client
+
+# Estados del circuit breaker como valor numérico
+BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # La regla (no la URL) mantiene acotado el número de series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_LATENCY.observe(time.perf_counter() - start, route, request.method, str(response.status_code))
+    return response
+
+
+def collect_arduino_state():
+    """Estado del scheduler de Arduino y antigüedad de la lectura del flujómetro"""
+    stats = api_controller.arduino_scheduler.get_stats()
+    token = api_controller.arduino_tokens.get_stats()
+    flights = api_controller.get_flight_stats()
+    devices = api_controller.device_registry.get_stats()
+    age = api_controller.get_flowmeter_cache_age()
+    families = [
+        ('zaino_arduino_breaker_state', 'gauge',
+         'Circuit breaker de Arduino IoT Cloud (0 cerrado, 1 half-open, 2 abierto)',
+         [({}, BREAKER_STATES[stats['state']])]),
+        ('zaino_arduino_budget_remaining', 'gauge',
+         'Peticiones disponibles en el token bucket de Arduino IoT Cloud',
+         [({}, stats['budget']['remaining'])]),
+        ('zaino_arduino_scheduler_rejected_total', 'counter',
+         'Peticiones a Arduino IoT Cloud rechazadas por circuito abierto o Retry-After',
+         [({}, stats['rejected'])]),
+        ('zaino_arduino_scheduler_throttled_total', 'counter',
+         'Peticiones a Arduino IoT Cloud rechazadas por falta de presupuesto',
+         [({}, stats['throttled'])]),
+        ('zaino_arduino_token_refreshes_total', 'counter',
+         'Renovaciones del token OAuth2 de Arduino IoT Cloud por resultado',
+         [({'result': 'ok'}, token['refresh_count']), ({'result': 'error'}, token['refresh_errors'])]),
+        ('zaino_arduino_singleflight_total', 'counter',
+         'Lecturas de Arduino IoT Cloud agrupadas: líderes que consultan, peticiones que reutilizan su resultado y esperas agotadas',
+         [({'flight': name, 'result': result}, flight[key])
+          for name, flight in flights.items()
+          for result, key in (('leader', 'leaders'), ('coalesced', 'coalesced'), ('timeout', 'timeouts'))]),
+        ('zaino_arduino_singleflight_in_flight', 'gauge',
+         'Lecturas agrupadas de Arduino IoT Cloud en curso',
+         [({'flight': name}, flight['in_flight']) for name, flight in flights.items()]),
+        ('zaino_arduino_device_resolved', 'gauge',
+         'Dispositivos de ARDUINO_DEVICES con el ID de su thing ya descubierto (1) o pendiente (0)',
+         [({'device': device_id}, int(bool(device['discovery']['thing_id']))) for device_id, device in devices.items()]),
+        ('zaino_arduino_device_discoveries_total', 'counter',
+         'Descubrimientos del thing y sus propiedades por dispositivo',
+         [({'device': device_id}, device['discovery']['discoveries']) for device_id, device in devices.items()]),
+        ('zaino_arduino_device_reading_age_seconds', 'gauge',
+         'Antigüedad de la última lectura en caché de cada dispositivo',
+         [({'device': device_id}, device['age']) for device_id, device in devices.items() if device['age'] is not None]),
+    ]
+    if age is not None:
+        families.append(('zaino_flowmeter_cache_age_seconds', 'gauge',
+                         'Antigüedad de la lectura del flujómetro en caché', [({}, round(age, 3))]))
+    return families
+
+
+def collect_weathercloud_state():
+    """Contadores de la sesión de Weathercloud y de la caché por estación"""
+    try:
+        stats = get_weathercloud_client().get_stats()
+    except ValueError:
+        # Sin credenciales no hay cliente
+        return []
+    cache = stats['cache']
+    return [
+        ('zaino_weathercloud_authenticated', 'gauge',
+         'Sesión de Weathercloud vigente (1) o vencida (0)',
+         [({}, int(stats['authenticated']))]),
+        ('zaino_weathercloud_logins_total', 'counter',
+         'Logins exitosos en Weathercloud',
+         [({}, stats['logins'])]),
+        ('zaino_weathercloud_relogins_total', 'counter',
+         'Nuevos logins en Weathercloud por sesión vencida o rechazada',
+         [({}, stats['relogins'])]),
+        ('zaino_weathercloud_auth_failures_total', 'counter',
+         'Peticiones a Weathercloud rechazadas por sesión vencida',
+         [({}, stats['auth_failures'])]),
+        ('zaino_weathercloud_probes_avoided_total', 'counter',
+         'Verificaciones de sesión de Weathercloud evitadas por la vigencia de la cookie',
+         [({}, stats['probes_avoided'])]),
+        ('zaino_weathercloud_cache_requests_total', 'counter',
+         'Consultas a la caché por estación de Weathercloud por método y resultado (incluye las de otros workers)',
+         [({'method': method, 'result': result}, counts[key])
+          for method, counts in sorted(cache['methods'].items())
+          for result, key in (('hit', 'hits'), ('miss', 'misses'))]),
+        ('zaino_weathercloud_cache_shared_hits_total', 'counter',
+         'Respuestas de Weathercloud tomadas de la caché compartida entre workers',
+         [({}, cache['shared_hits'])]),
+        ('zaino_weathercloud_cache_invalid_hits_total', 'counter',
+         'Consultas respondidas por un ID de estación inválido recordado',
+         [({}, cache['negative_hits'])]),
+        ('zaino_weathercloud_cache_evictions_total', 'counter',
+         'Estaciones desalojadas de la caché de Weathercloud por falta de espacio',
+         [({}, cache['evictions'])]),
+        ('zaino_weathercloud_cache_stations', 'gauge',
+         'Estaciones con respuestas en la caché de Weathercloud',
+         [({}, cache['stations'])]),
+    ]
+
+
+REGISTRY.add_collector(collect_arduino_state)
+REGISTRY.add_collector(collect_weathercloud_state)
+
+
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    """Métricas del proceso en formato de texto de Prometheus"""
+    return Response(REGISTRY.render(), content_type=REGISTRY.CONTENT_TYPE)
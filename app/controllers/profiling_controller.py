@@ -0,0 +1,68 @@
+import hmac
+
+from flask import g, request
+
+from app import app
+from app.utils import config
+from app.utils.profiler import RequestProfile
+
+settings = config.load_config()
+
+# Cabecera o parámetro que pide perfilar la petición
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+
+
+def profiling_requested():
+    """Indica si la petición pidió ser perfilada con el token configurado"""
+    value = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_PARAM)
+    if not value:
+        return False
+    return hmac.compare_digest(value.encode('utf-8'), settings['PROFILING_TOKEN'].encode('utf-8'))
+
+
+def start_profile():
+    if profiling_requested():
+        g.profile = RequestProfile(
+            f"{request.method} {request.path}",
+            interval=settings['PROFILING_INTERVAL_MS'] / 1000,
+            max_duration=settings['PROFILING_MAX_SECONDS']
+        ).start()
+
+
+def finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.stop()
+        profile_id = save_profile(profile, response.status_code)
+        if profile_id:
+            response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def discard_profile(exc):
+    # La vista lanzó una excepción: after_request no se ejecuta
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.stop()
+        save_profile(profile, 500)
+
+
+def save_profile(profile, status):
+    try:
+        profile_id = profile.write(settings['PROFILING_DIR'], settings['PROFILING_MAX_PROFILES'], status)
+    except OSError as e:
+        print(f"Error al guardar el perfil de {profile.name}: {e}")
+        return None
+    print(f"Perfil de {profile.name} guardado como {profile_id}")
+    return profile_id
+
+
+# Sin PROFILING_ENABLED no se registra ningún hook: las peticiones no pagan nada.
+# Sin token cualquiera podría perfilar y escribir archivos, así que tampoco se activa
+if settings.get('PROFILING_ENABLED') and not settings.get('PROFILING_TOKEN'):
+    print("⚠️ WARNING: PROFILING_ENABLED requiere PROFILING_TOKEN en .env. El perfilado queda desactivado")
+elif settings.get('PROFILING_ENABLED'):
+    app.before_request(start_profile)
+    app.after_request(finish_profile)
+    app.teardown_request(discard_profile)
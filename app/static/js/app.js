@@ -66,7 +66,11 @@ const appState = {
     realtimeInterval: null,  // Para almacenar el intervalo de actualización
     flowHistory: [],  // Para almacenar el historial de datos
     lastFlowData: null,  // Cache del último dato recibido
-    requestInProgress: false  // Flag para evitar peticiones simultáneas
+    requestInProgress: false,  // Flag para evitar peticiones simultáneas
+    flowStream: null,  // Conexión SSE con el servidor
+    streamConnected: false,  // Si el stream SSE está entregando datos
+    informesCursor: null,  // Cursor de la siguiente página de informes (null si no hay más)
+    informesLoaded: 0  // Informes mostrados en la vista
 };
 
 // Función para verificar si todos los datos están cargados
@@ -181,11 +185,12 @@ async function initializeReportsView() {
     const informesList = document.getElementById('informes-list');
     
     try {
-        // Cargar informes desde la API
-        const response = await fetch('/api/informes');
-        const data = await response.json();
-        
-        const informes = data.success ? data.informes : [];
+        // Cargar solo la primera página; las siguientes se piden con "Cargar más"
+        const page = await fetchInformesPage(null);
+        const informes = page.informes;
+        appState.informesCursor = page.next_cursor;
+        appState.informesLoaded = informes.length;
+        renderLoadMoreInformes(null);  // Quitar el botón de una carga anterior
         
         // Detectar si es móvil
         const isMobile = window.innerWidth <= 768;
@@ -203,44 +208,21 @@ async function initializeReportsView() {
                     </div>
                 `;
             } else {
-                const informesHTML = informes.map((informe, index) => `
-                    <div class="informe-card" data-id="${informe.id}">
-                        <div class="informe-header">
-                            <div class="informe-icon">
-                                <i class="bi bi-file-earmark-text-fill"></i>
-                            </div>
-                            <div class="informe-info">
-                                <h4>${informe.nombre}</h4>
-                                <p><i class="bi bi-calendar3"></i> ${informe.fecha}</p>
-                                <small class="text-muted">${informe.periodo}</small>
-                            </div>
-                        </div>
-                        <div class="informe-actions">
-                            <button class="btn btn-sm btn-danger btn-block mb-2" onclick="exportReportToPDFDirect('${informe.id}')">
-                                <i class="bi bi-file-pdf"></i> Exportar PDF
-                            </button>
-                            <button class="btn btn-sm btn-primary btn-block" onclick="downloadReport('${informe.id}')">
-                                <i class="bi bi-download"></i> JSON
-                            </button>
-                            <button class="btn btn-sm btn-secondary btn-block" onclick="viewReport('${informe.id}')">
-                                <i class="bi bi-eye"></i> Ver
-                            </button>
-                        </div>
-                    </div>
-                `).join('');
+                const informesHTML = informes.map(renderInformeCard).join('');
                 
                 // Cambiar el contenedor a vista de cards
                 informesList.parentElement.parentElement.classList.remove('table-responsive');
                 informesList.parentElement.parentElement.classList.add('informes-grid');
                 informesList.parentElement.parentElement.innerHTML = `
                     <div class="d-flex justify-content-between align-items-center mb-3">
-                        <h5 class="mb-0">${informes.length} informe(s)</h5>
+                        <h5 class="mb-0" id="informes-count">${informesCountText()}</h5>
                         <button class="btn btn-sm btn-success" onclick="showGenerateReportModal()">
                             <i class="bi bi-plus-circle"></i> Generar
                         </button>
                     </div>
-                    ${informesHTML}
+                    <div id="informes-cards">${informesHTML}</div>
                 `;
+                renderLoadMoreInformes(document.getElementById('informes-cards'));
             }
         } else {
             // Vista de tabla para desktop
@@ -257,26 +239,7 @@ async function initializeReportsView() {
                     </tr>
                 `;
             } else {
-                const informesHTML = informes.map(informe => `
-                    <tr data-id="${informe.id}">
-                        <td>
-                            ${informe.nombre}
-                            <br><small class="text-muted">${informe.periodo}</small>
-                        </td>
-                        <td>${informe.fecha}</td>
-                        <td class="text-end">
-                            <button class="btn btn-sm btn-danger me-2" onclick="exportReportToPDFDirect('${informe.id}')">
-                                <i class="bi bi-file-pdf"></i> PDF
-                            </button>
-                            <button class="btn btn-sm btn-primary me-2" onclick="downloadReport('${informe.id}')">
-                                <i class="bi bi-download"></i> JSON
-                            </button>
-                            <button class="btn btn-sm btn-secondary" onclick="viewReport('${informe.id}')">
-                                <i class="bi bi-eye"></i> Ver
-                            </button>
-                        </td>
-                    </tr>
-                `).join('');
+                const informesHTML = informes.map(renderInformeRow).join('');
                 
                 // Agregar botón de generar en el header
                 const dashboardTitle = document.querySelector('#dashboard-informes .dashboard-title');
@@ -291,6 +254,7 @@ async function initializeReportsView() {
                 }
                 
                 informesList.innerHTML = informesHTML;
+                renderLoadMoreInformes(informesList.closest('table'));
             }
         }
     } catch (error) {
@@ -306,6 +270,126 @@ async function initializeReportsView() {
     }
 }
 
+// Pide una página del listado de informes
+async function fetchInformesPage(cursor) {
+    const url = cursor ? `/api/informes?cursor=${encodeURIComponent(cursor)}` : '/api/informes';
+    const response = await fetch(url);
+    const data = await response.json();
+    if (!data.success) {
+        throw new Error(data.error || 'Error al cargar informes');
+    }
+    return data;
+}
+
+// Card de un informe (vista móvil)
+function renderInformeCard(informe) {
+    return `
+        <div class="informe-card" data-id="${informe.id}">
+            <div class="informe-header">
+                <div class="informe-icon">
+                    <i class="bi bi-file-earmark-text-fill"></i>
+                </div>
+                <div class="informe-info">
+                    <h4>${informe.nombre}</h4>
+                    <p><i class="bi bi-calendar3"></i> ${informe.fecha}</p>
+                    <small class="text-muted">${informe.periodo}</small>
+                </div>
+            </div>
+            <div class="informe-actions">
+                <button class="btn btn-sm btn-danger btn-block mb-2" onclick="exportReportToPDFDirect('${informe.id}')">
+                    <i class="bi bi-file-pdf"></i> Exportar PDF
+                </button>
+                <button class="btn btn-sm btn-primary btn-block" onclick="downloadReport('${informe.id}')">
+                    <i class="bi bi-download"></i> JSON
+                </button>
+                <button class="btn btn-sm btn-secondary btn-block" onclick="viewReport('${informe.id}')">
+                    <i class="bi bi-eye"></i> Ver
+                </button>
+            </div>
+        </div>
+    `;
+}
+
+// Fila de un informe (vista de tabla)
+function renderInformeRow(informe) {
+    return `
+        <tr data-id="${informe.id}">
+            <td>
+                ${informe.nombre}
+                <br><small class="text-muted">${informe.periodo}</small>
+            </td>
+            <td>${informe.fecha}</td>
+            <td class="text-end">
+                <button class="btn btn-sm btn-danger me-2" onclick="exportReportToPDFDirect('${informe.id}')">
+                    <i class="bi bi-file-pdf"></i> PDF
+                </button>
+                <button class="btn btn-sm btn-primary me-2" onclick="downloadReport('${informe.id}')">
+                    <i class="bi bi-download"></i> JSON
+                </button>
+                <button class="btn btn-sm btn-secondary" onclick="viewReport('${informe.id}')">
+                    <i class="bi bi-eye"></i> Ver
+                </button>
+            </td>
+        </tr>
+    `;
+}
+
+function informesCountText() {
+    return `${appState.informesLoaded}${appState.informesCursor ? '+' : ''} informe(s)`;
+}
+
+// Muestra el botón "Cargar más" después de anchor si quedan páginas
+function renderLoadMoreInformes(anchor) {
+    const existing = document.getElementById('informes-load-more');
+    if (existing) {
+        existing.remove();
+    }
+    if (!appState.informesCursor || !anchor) {
+        return;
+    }
+    anchor.insertAdjacentHTML('afterend', `
+        <div id="informes-load-more" class="text-center my-3">
+            <button class="btn btn-outline-primary" onclick="loadMoreInformes()">
+                <i class="bi bi-arrow-down-circle"></i> Cargar más
+            </button>
+        </div>
+    `);
+}
+
+// Agrega la siguiente página de informes a la vista
+async function loadMoreInformes() {
+    const container = document.getElementById('informes-load-more');
+    const button = container ? container.querySelector('button') : null;
+    if (!appState.informesCursor || !button || button.disabled) {
+        return;
+    }
+    button.disabled = true;
+    button.innerHTML = '<span class="spinner-border spinner-border-sm"></span> Cargando...';
+
+    try {
+        const page = await fetchInformesPage(appState.informesCursor);
+        appState.informesCursor = page.next_cursor;
+        appState.informesLoaded += page.informes.length;
+
+        const cards = document.getElementById('informes-cards');
+        if (cards) {
+            cards.insertAdjacentHTML('beforeend', page.informes.map(renderInformeCard).join(''));
+        } else {
+            document.getElementById('informes-list').insertAdjacentHTML('beforeend', page.informes.map(renderInformeRow).join(''));
+        }
+        const count = document.getElementById('informes-count');
+        if (count) {
+            count.textContent = informesCountText();
+        }
+        renderLoadMoreInformes(cards || document.getElementById('informes-list').closest('table'));
+    } catch (error) {
+        console.error('Error al cargar más informes:', error);
+        showToast('Error al cargar más informes', 'error');
+        button.disabled = false;
+        button.innerHTML = '<i class="bi bi-arrow-down-circle"></i> Cargar más';
+    }
+}
+
 // Función para mostrar el modal de generación de informes
 function showGenerateReportModal() {
     // Crear el modal si no existe
@@ -629,6 +713,39 @@ async function viewReport(informeId) {
                             </div>
                         </div>
                     </div>
+                    ${informe.estadisticas.pico_lmin !== undefined ? `
+                    <div class="col-md-6 mb-3">
+                        <div class="card bg-light border-0 shadow-sm">
+                            <div class="card-body">
+                                <div class="d-flex align-items-center">
+                                    <div class="flex-shrink-0">
+                                        <i class="bi bi-graph-up-arrow" style="font-size: 2.5rem; color: #dc3545;"></i>
+                                    </div>
+                                    <div class="flex-grow-1 ms-3">
+                                        <h6 class="card-title text-muted mb-1">Caudal Máximo</h6>
+                                        <h4 class="text-danger mb-0">${informe.estadisticas.pico_lmin.toFixed(2)} L/min</h4>
+                                        ${informe.estadisticas.fecha_pico ? `<small class="text-muted">${informe.estadisticas.fecha_pico}</small>` : ''}
+                                    </div>
+                                </div>
+                            </div>
+                        </div>
+                    </div>
+                    <div class="col-md-6 mb-3">
+                        <div class="card bg-light border-0 shadow-sm">
+                            <div class="card-body">
+                                <div class="d-flex align-items-center">
+                                    <div class="flex-shrink-0">
+                                        <i class="bi bi-calendar-check" style="font-size: 2.5rem; color: #6f42c1;"></i>
+                                    </div>
+                                    <div class="flex-grow-1 ms-3">
+                                        <h6 class="card-title text-muted mb-1">Día de Mayor Consumo</h6>
+                                        <h4 class="mb-0" style="color: #6f42c1;">${informe.estadisticas.litros_dia_mayor_consumo.toFixed(2)} L</h4>
+                                        ${informe.estadisticas.dia_mayor_consumo ? `<small class="text-muted">${informe.estadisticas.dia_mayor_consumo}</small>` : ''}
+                                    </div>
+                                </div>
+                            </div>
+                        </div>
+                    </div>` : ''}
                 </div>
             `;
             
@@ -1219,6 +1336,49 @@ async function loadFlowmeterData() {
 }
 
 
+// Función para conectarse al stream SSE del flujómetro
+// Si el navegador no lo soporta o la conexión falla, el intervalo vuelve a consultar la API
+function connectFlowStream() {
+    if (!window.EventSource) {
+        return;
+    }
+    
+    closeFlowStream();
+    
+    const source = new EventSource('/api/arduino/flowmeter/stream');
+    
+    source.onopen = () => {
+        appState.streamConnected = true;
+    };
+    
+    source.onmessage = (event) => {
+        try {
+            const data = JSON.parse(event.data);
+            appState.lastFlowData = data;
+            updateRealtimeDisplay(data.constflow?.value || 0);
+        } catch (error) {
+            console.error('Error al leer evento del stream:', error);
+        }
+    };
+    
+    source.onerror = () => {
+        // EventSource reintenta solo; mientras tanto se usa polling
+        console.warn('⚠️ Stream de flujo desconectado, usando polling...');
+        appState.streamConnected = false;
+    };
+    
+    appState.flowStream = source;
+}
+
+// Función para cerrar el stream SSE
+function closeFlowStream() {
+    if (appState.flowStream) {
+        appState.flowStream.close();
+        appState.flowStream = null;
+    }
+    appState.streamConnected = false;
+}
+
 // Función para iniciar el monitoreo en tiempo real
 function startRealtimeFlowMonitor() {
     // Limpiar intervalo anterior si existe
@@ -1233,8 +1393,22 @@ function startRealtimeFlowMonitor() {
     const initialValue = appState.lastFlowData?.constflow?.value || 0;
     updateRealtimeDisplay(initialValue);
     
+    // Recibir lecturas por SSE en lugar de consultar la API
+    connectFlowStream();
+    
     // Actualizar cada 10 segundos (reducir la frecuencia para evitar 429)
     appState.realtimeInterval = setInterval(async () => {
+        // Con el stream activo solo se agrega el último valor recibido al historial
+        if (appState.streamConnected && appState.lastFlowData) {
+            const currentFlow = appState.lastFlowData.constflow?.value || 0;
+            appState.flowHistory.push(currentFlow);
+            if (appState.flowHistory.length > 30) {
+                appState.flowHistory.shift();
+            }
+            updateRealtimeDisplay(currentFlow);
+            return;
+        }
+        
         // Si ya hay una petición en curso, saltar esta iteración
         if (appState.requestInProgress) {
             console.log('Petición en curso, saltando...');
@@ -1298,6 +1472,7 @@ function stopRealtimeFlowMonitor() {
         clearInterval(appState.realtimeInterval);
         appState.realtimeInterval = null;
     }
+    closeFlowStream();
 }
 
 // Función para actualizar la visualización en tiempo real
@@ -0,0 +1,232 @@
+# arduino_auth.py
+import os
+import threading
+import time
+from collections import deque
+
+from oauthlib.oauth2 import BackendApplicationClient
+from requests_oauthlib import OAuth2Session
+
+from app.utils.metrics import observe_upstream
+
+
+class ArduinoTokenManager:
+    """
+    Mantiene en memoria el token OAuth2 de Arduino IoT Cloud.
+
+    El token se reutiliza mientras sea válido (según ``expires_in``) y se
+    renueva en segundo plano un poco antes de expirar, siempre que haya sido
+    usado desde la última renovación. Es seguro usarlo desde varios hilos.
+
+    Con ``shared_cache`` (ver ``shared_cache.py``) el token se publica para
+    los demás workers: un worker sin token válido adopta el publicado en
+    lugar de pedir uno nuevo, y la renovación en segundo plano la hace un
+    solo worker (el que obtiene el lease).
+
+    Con ``scheduler`` (ver ``upstream_scheduler.py``) la obtención del token
+    también consume presupuesto de la cuota y respeta el circuit breaker.
+    """
+
+    TOKEN_URL = "https://api2.arduino.cc/iot/v1/clients/token"
+    AUDIENCE = "https://api2.arduino.cc/iot"
+
+    SHARED_KEY = "arduino:token"
+    LEASE_KEY = "arduino:token:refresh"
+
+    def __init__(self, client_id, client_secret, refresh_margin=30, history_size=50, shared_cache=None,
+                 scheduler=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_margin = refresh_margin
+        self.shared_cache = shared_cache
+        self.scheduler = scheduler
+
+        self._lock = threading.Lock()
+        self._access_token = None
+        self._expires_at = 0.0
+        self._used_since_refresh = False
+        self._timer = None
+
+        # Estadísticas de renovación
+        self.refresh_count = 0
+        self.refresh_errors = 0
+        self.shared_adopted = 0
+        self.refresh_durations = deque(maxlen=history_size)
+
+    def get_token(self):
+        """
+        Retorna un access token válido, obteniéndolo solo si es necesario
+
+        Returns:
+            tuple: (access_token o None, error o None)
+        """
+        if not self.client_id or not self.client_secret:
+            return None, "CLIENT_ID o CLIENT_SECRET no configurados"
+
+        token = self._valid_token()
+        if token:
+            return token, None
+
+        with self._lock:
+            # Otro hilo pudo haber renovado el token mientras esperábamos
+            token = self._valid_token()
+            if token:
+                return token, None
+            # Token publicado por otro worker (o que otro worker está pidiendo)
+            if self._adopt_shared() or self._wait_shared():
+                self._used_since_refresh = True
+                return self._access_token, None
+            token, error = self._refresh_locked()
+            if token:
+                self._used_since_refresh = True
+            return token, error
+
+    def invalidate(self):
+        """Descarta el token actual (por ejemplo, tras un 401 de la API)"""
+        with self._lock:
+            rejected = self._access_token
+            self._access_token = None
+            self._expires_at = 0.0
+            # Retirar el token publicado solo si es el mismo que fue rechazado
+            if self.shared_cache and rejected:
+                entry = self.shared_cache.get(self.SHARED_KEY)
+                if entry and entry[0].get("access_token") == rejected:
+                    self.shared_cache.delete(self.SHARED_KEY)
+
+    def get_stats(self):
+        """Retorna el número de renovaciones y su duración en milisegundos"""
+        with self._lock:
+            durations = list(self.refresh_durations)
+            return {
+                "refresh_count": self.refresh_count,
+                "refresh_errors": self.refresh_errors,
+                "shared_adopted": self.shared_adopted,
+                "last_refresh_ms": durations[-1] if durations else None,
+                "avg_refresh_ms": round(sum(durations) / len(durations), 2) if durations else None,
+                "refresh_durations_ms": durations,
+                "expires_in": max(0, round(self._expires_at - time.time())) if self._access_token else 0
+            }
+
+    def _valid_token(self):
+        token = self._access_token
+        if token and time.time() < self._expires_at:
+            self._used_since_refresh = True
+            return token
+        return None
+
+    def _adopt_shared(self, min_expires_at=0.0):
+        """Toma el token publicado por otro worker si vence después de ``min_expires_at``. Requiere el lock."""
+        if not self.shared_cache:
+            return False
+        entry = self.shared_cache.get(self.SHARED_KEY)
+        if not entry:
+            return False
+        token = entry[0]
+        if token.get("expires_at", 0) <= max(time.time(), min_expires_at):
+            return False
+        self._access_token = token["access_token"]
+        self._expires_at = token["expires_at"]
+        self.shared_adopted += 1
+        self._schedule_refresh(self._expires_at - time.time())
+        return True
+
+    def _wait_shared(self, timeout=5.0):
+        """Si otro worker tiene el lease de renovación, espera a que publique el token"""
+        if not self.shared_cache or self.shared_cache.add(self.LEASE_KEY, os.getpid(), 30):
+            return False
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            time.sleep(0.1)
+            if self._adopt_shared():
+                return True
+        return False
+
+    def _refresh_locked(self):
+        """Solicita un token nuevo. Debe llamarse con el lock adquirido."""
+        try:
+            return self._fetch_locked()
+        finally:
+            if self.shared_cache:
+                self.shared_cache.delete(self.LEASE_KEY)
+
+    def _fetch_locked(self):
+        if self.scheduler:
+            allowed, retry_in = self.scheduler.acquire()
+            if not allowed:
+                return None, f"Arduino IoT Cloud no disponible temporalmente, reintenta en {retry_in:.0f}s"
+
+        start = time.perf_counter()
+        try:
+            oauth_client = BackendApplicationClient(client_id=self.client_id)
+            oauth = OAuth2Session(client=oauth_client)
+
+            token = oauth.fetch_token(
+                token_url=self.TOKEN_URL,
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+                include_client_id=True,
+                audience=self.AUDIENCE
+            )
+        except Exception as e:
+            observe_upstream("arduino", "token", "error", start)
+            self.refresh_errors += 1
+            if self.scheduler:
+                self.scheduler.record(None)
+            return None, f"Error de autenticación: {str(e)}"
+
+        observe_upstream("arduino", "token", "200", start)
+        if self.scheduler:
+            self.scheduler.record(200)
+
+        access_token = token.get("access_token")
+        if not access_token:
+            self.refresh_errors += 1
+            return None, "No se encontró access_token en la respuesta"
+
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        expires_in = float(token.get("expires_in") or 300)
+
+        self._access_token = access_token
+        self._expires_at = time.time() + expires_in
+        self._used_since_refresh = False
+        if self.shared_cache:
+            self.shared_cache.set(
+                self.SHARED_KEY,
+                {"access_token": access_token, "expires_at": self._expires_at},
+                expires_in
+            )
+        self.refresh_count += 1
+        self.refresh_durations.append(elapsed_ms)
+        print(f"Token de Arduino renovado en {elapsed_ms} ms (expira en {int(expires_in)}s)")
+
+        self._schedule_refresh(expires_in)
+        return access_token, None
+
+    def _schedule_refresh(self, expires_in):
+        if self._timer:
+            self._timer.cancel()
+        margin = min(self.refresh_margin, expires_in / 2)
+        self._timer = threading.Timer(expires_in - margin, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            # Si nadie usó el token desde la última renovación, dejarlo expirar
+            if not self._used_since_refresh:
+                self._timer = None
+                return
+            if self.shared_cache:
+                # Otro worker ya lo renovó
+                if self._adopt_shared(min_expires_at=self._expires_at):
+                    return
+                # Solo un worker renueva; los demás reintentan adoptar el suyo
+                if not self.shared_cache.add(self.LEASE_KEY, os.getpid(), 30):
+                    self._schedule_retry(5)
+                    return
+            self._refresh_locked()
+
+    def _schedule_retry(self, delay):
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
@@ -0,0 +1,274 @@
+# arduino_client.py
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.utils.metrics import observe_upstream
+
+
+class ArduinoClient:
+    """
+    Cliente HTTP de la API de Arduino IoT Cloud.
+
+    Todas las llamadas comparten una ``requests.Session`` con un pool de
+    conexiones keep-alive, tienen timeouts de conexión y lectura, y pasan
+    por el ``scheduler`` (cuota y circuit breaker, ver
+    ``upstream_scheduler.py``).
+
+    Con ``hedge=True`` las lecturas que superan el p95 de latencia reciente
+    envían una segunda petición idéntica y se usa la primera respuesta que
+    llegue; la segunda solo se envía si queda presupuesto en la cuota.
+    """
+
+    BASE_URL = "https://api2.arduino.cc/iot/v2"
+    # (conexión, lectura) en segundos
+    DEFAULT_TIMEOUT = (3.05, 10)
+    POOL_SIZE = 10
+    # Muestras de latencia necesarias antes de empezar a duplicar peticiones
+    HEDGE_MIN_SAMPLES = 20
+    # Espera mínima antes de la segunda petición, en segundos
+    HEDGE_MIN_DELAY = 0.05
+
+    def __init__(self, tokens, scheduler=None, timeout=None, pool_size=None, hedge=False,
+                 max_queue_wait=1.0, latency_window=200):
+        """
+        Args:
+            tokens (ArduinoTokenManager): Origen del access token
+            scheduler (UpstreamScheduler): Cuota y circuit breaker (opcional)
+            timeout (tuple): (conexión, lectura) en segundos
+            pool_size (int): Conexiones keep-alive máximas
+            hedge (bool): Duplicar las lecturas lentas
+            max_queue_wait (float): Segundos que se espera a que la cuota tenga presupuesto
+            latency_window (int): Latencias recientes usadas para el p95
+        """
+        self.tokens = tokens
+        self.scheduler = scheduler
+        self.timeout = timeout or self.DEFAULT_TIMEOUT
+        self.pool_size = pool_size or self.POOL_SIZE
+        self.hedge = hedge
+        self.max_queue_wait = max_queue_wait
+
+        self.session = requests.Session()
+        # Pool de conexiones keep-alive compartido por todos los hilos
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self._executor = None
+
+        # Estadísticas
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def headers(self):
+        """
+        Cabeceras autenticadas para la API
+
+        Returns:
+            tuple: (cabeceras o None, cuerpo de error o None)
+        """
+        access_token, error = self.tokens.get_token()
+
+        if error:
+            return None, {
+                "error": "Error de autenticación",
+                "details": error
+            }
+
+        return {'Authorization': f'Bearer {access_token}'}, None
+
+    def blocked_for(self):
+        """Segundos que faltan para poder consultar (0 si ya se puede)"""
+        return self.scheduler.blocked_for() if self.scheduler else 0.0
+
+    def get(self, path, headers, endpoint="other"):
+        """
+        GET a la API pasando por el scheduler
+
+        Args:
+            path (str): Ruta relativa a ``BASE_URL`` (por ejemplo ``/things``)
+            headers (dict): Cabeceras de ``headers()``
+            endpoint (str): Nombre del endpoint en las métricas
+
+        Returns:
+            tuple: (respuesta o None, cuerpo de error o None, código de estado)
+        """
+        if self.scheduler:
+            allowed, retry_in = self.scheduler.acquire(max_wait=self.max_queue_wait)
+            if not allowed:
+                return None, self.unavailable_error(retry_in), 503
+
+        url = f"{self.BASE_URL}{path}"
+        try:
+            hedge_after = self._hedge_delay()
+            if hedge_after is None:
+                response = self._send(url, headers, endpoint)
+            else:
+                response = self._send_hedged(url, headers, endpoint, hedge_after)
+        except requests.Timeout as e:
+            self.timeouts += 1
+            self._record(None)
+            return None, {
+                "error": "Tiempo de espera agotado",
+                "details": f"Arduino IoT Cloud no respondió a tiempo: {e}"
+            }, 504
+        except requests.RequestException as e:
+            self.errors += 1
+            self._record(None)
+            return None, {
+                "error": "Error de conexión con Arduino IoT Cloud",
+                "details": str(e)
+            }, 502
+        except Exception:
+            # Cualquier otro fallo también cuenta: si era la sonda del breaker
+            # (HALF_OPEN) hay que liberarla o quedaría rechazando para siempre
+            self.errors += 1
+            self._record(None)
+            raise
+
+        self._record(response.status_code, response.headers.get('Retry-After'))
+        # Token rechazado: descartarlo para que la próxima petición obtenga uno nuevo
+        if response.status_code == 401:
+            self.tokens.invalidate()
+        return response, None, response.status_code
+
+    def list_things(self, headers):
+        """
+        Lista los things de la cuenta
+
+        Returns:
+            tuple: (things o None, cuerpo de error o None, código de estado)
+        """
+        response, error, status_code = self.get("/things", headers, endpoint="things")
+        if error:
+            return None, error, status_code
+
+        if response.status_code == 429:
+            return None, self.rate_limit_error(), 429
+
+        if response.status_code != 200:
+            return None, {
+                "error": "Error al obtener things",
+                "status_code": response.status_code,
+                "details": response.text
+            }, response.status_code
+
+        return response.json(), None, 200
+
+    def get_properties(self, thing_id, headers):
+        """
+        Propiedades de un thing
+
+        Returns:
+            tuple: (respuesta o None, cuerpo de error o None, código de estado)
+        """
+        return self.get(f"/things/{thing_id}/properties", headers, endpoint="properties")
+
+    def get_stats(self):
+        """Retorna latencias recientes, errores y peticiones duplicadas"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "p50_ms": round(self._percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+            "p95_ms": round(self._percentile(latencies, 0.95) * 1000, 1) if latencies else None
+        }
+
+    @staticmethod
+    def unavailable_error(retry_in):
+        """Cuerpo de error cuando el scheduler no permite consultar"""
+        retry_after = max(1, round(retry_in))
+        return {
+            "error": "Arduino IoT Cloud no disponible temporalmente",
+            "details": f"Se superó la cuota o hubo fallos recientes. Intenta de nuevo en {retry_after} segundos.",
+            "retry_after": retry_after
+        }
+
+    @staticmethod
+    def rate_limit_error():
+        """Cuerpo de error ante un 429 de la API"""
+        return {
+            "error": "Rate limit alcanzado",
+            "details": "Demasiadas peticiones. Intenta de nuevo en unos segundos."
+        }
+
+    def _send(self, url, headers, endpoint):
+        start = time.perf_counter()
+        self.requests += 1
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.Timeout:
+            observe_upstream("arduino", endpoint, "timeout", start)
+            raise
+        except requests.RequestException:
+            observe_upstream("arduino", endpoint, "error", start)
+            raise
+        elapsed = observe_upstream("arduino", endpoint, str(response.status_code), start)
+        with self._lock:
+            self._latencies.append(elapsed)
+        return response
+
+    def _send_hedged(self, url, headers, endpoint, hedge_after):
+        executor = self._get_executor()
+        first = executor.submit(self._send, url, headers, endpoint)
+        done, _ = wait([first], timeout=hedge_after)
+        if done:
+            return first.result()
+
+        # Lenta: enviar una segunda petición si la cuota lo permite
+        if self.scheduler and not self.scheduler.acquire()[0]:
+            return first.result()
+        self.hedged += 1
+        second = executor.submit(self._send, url, headers, endpoint)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _hedge_delay(self):
+        """Segundos tras los que se duplica la petición, o None si no se duplica"""
+        if not self.hedge:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.HEDGE_MIN_SAMPLES:
+                return None
+            latencies = sorted(self._latencies)
+        return max(self.HEDGE_MIN_DELAY, self._percentile(latencies, 0.95))
+
+    def _record(self, status_code, retry_after=None):
+        if self.scheduler:
+            self.scheduler.record(status_code, retry_after)
+
+    def _get_executor(self):
+        # Se crea con la primera petición duplicada (no antes de un fork)
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="arduino-http")
+        return self._executor
+
+    @staticmethod
+    def _percentile(sorted_values, fraction):
+        index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+        return sorted_values[index]
@@ -0,0 +1,150 @@
+# arduino_devices.py
+import json
+import re
+import threading
+import time
+
+from app.utils.arduino_discovery import ThingDiscovery
+
+# Dispositivo histórico: el flujómetro principal del dashboard
+DEFAULT_DEVICES = [
+    {"id": "flujometro", "thing": "Medidor de Flujo", "properties": ["instflow", "constflow"]}
+]
+
+
+def load_devices(spec):
+    """
+    Interpreta la configuración ``ARDUINO_DEVICES``
+
+    Acepta una lista JSON o la ruta a un archivo .json con la lista. Cada
+    dispositivo tiene ``thing`` (nombre del thing en Arduino IoT Cloud),
+    ``properties`` (nombres de las propiedades a leer) y opcionalmente
+    ``id`` (identificador usado en la API; por defecto se deriva del
+    nombre del thing).
+
+    Args:
+        spec (str): JSON, ruta a un archivo JSON o None
+
+    Returns:
+        list: Dispositivos normalizados
+
+    Raises:
+        ValueError: Si la configuración no es válida
+    """
+    if not spec:
+        return [dict(device) for device in DEFAULT_DEVICES]
+
+    if spec.strip().startswith('['):
+        devices = json.loads(spec)
+    else:
+        with open(spec, 'r', encoding='utf-8') as f:
+            devices = json.load(f)
+
+    if not isinstance(devices, list) or not devices:
+        raise ValueError("ARDUINO_DEVICES debe ser una lista con al menos un dispositivo")
+
+    normalized = []
+    seen = set()
+    for device in devices:
+        thing = device.get('thing') if isinstance(device, dict) else None
+        properties = device.get('properties') if thing else None
+        if not thing or not properties or not isinstance(properties, list):
+            raise ValueError(f"Dispositivo inválido en ARDUINO_DEVICES: {device}")
+        device_id = device.get('id') or re.sub(r'[^a-z0-9]+', '-', thing.lower()).strip('-')
+        if device_id in seen:
+            raise ValueError(f"ID de dispositivo repetido en ARDUINO_DEVICES: {device_id}")
+        seen.add(device_id)
+        normalized.append({
+            "id": device_id,
+            "thing": thing,
+            "properties": [str(p).lower() for p in properties]
+        })
+    return normalized
+
+
+class DeviceRegistry:
+    """
+    Registro de los dispositivos de Arduino IoT Cloud.
+
+    Cada dispositivo tiene su propio descubrimiento (``ThingDiscovery``) y
+    su propia entrada de caché con la última lectura. Con un backend de
+    ``shared_cache.py`` compartido las lecturas se publican también para
+    los demás workers.
+    """
+
+    def __init__(self, devices, ttl=8, discovery_cache=None, shared_cache=None, discoveries=None):
+        """
+        Args:
+            devices (list): Dispositivos de ``load_devices``
+            ttl (float): Segundos de validez de cada lectura
+            discovery_cache (str): Archivo donde recordar los IDs descubiertos
+            shared_cache: Backend de caché compartida (opcional)
+            discoveries (dict): ``ThingDiscovery`` ya creados, por ID de dispositivo
+        """
+        self.devices = list(devices)
+        self.ttl = ttl
+        self.shared_cache = shared_cache if shared_cache is not None and shared_cache.shared else None
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._discoveries = dict(discoveries or {})
+        for device in self.devices:
+            if device['id'] not in self._discoveries:
+                self._discoveries[device['id']] = ThingDiscovery(
+                    device['thing'], device['properties'], cache_path=discovery_cache
+                )
+
+    def discovery(self, device_id):
+        """Descubrimiento (IDs del thing y sus propiedades) de un dispositivo"""
+        return self._discoveries[device_id]
+
+    def get_cached(self, device_id, max_age=None):
+        """
+        Última lectura de un dispositivo si tiene menos de ``max_age`` segundos
+
+        Args:
+            device_id (str): ID del dispositivo
+            max_age (float): Antigüedad máxima (por defecto el TTL)
+
+        Returns:
+            tuple: (datos, antigüedad en segundos) o None
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            entry = self._entries.get(device_id)
+        if self.shared_cache:
+            shared = self.shared_cache.get(f"device:{device_id}")
+            if shared and (entry is None or shared[1] > entry[1]):
+                entry = shared
+                with self._lock:
+                    self._entries[device_id] = entry
+        if entry is None:
+            return None
+        age = time.time() - entry[1]
+        return (entry[0], age) if age < max_age else None
+
+    def set_cached(self, device_id, data):
+        """Guarda la lectura de un dispositivo"""
+        stored_at = None
+        if self.shared_cache:
+            stored_at = self.shared_cache.set(f"device:{device_id}", data, self.ttl * 10)
+        with self._lock:
+            self._entries[device_id] = (data, stored_at or time.time())
+
+    def unresolved(self, devices=None):
+        """Dispositivos (de ``devices`` o todos) cuyo thing aún no se conoce (hay que listar los things)"""
+        devices = self.devices if devices is None else devices
+        return [d for d in devices if not self._discoveries[d['id']].get_thing_id()]
+
+    def get_stats(self):
+        """Estado del descubrimiento y antigüedad de la lectura de cada dispositivo"""
+        now = time.time()
+        with self._lock:
+            entries = dict(self._entries)
+        return {
+            device['id']: {
+                "thing": device['thing'],
+                "age": round(now - entries[device['id']][1], 1) if device['id'] in entries else None,
+                "discovery": self._discoveries[device['id']].get_stats()
+            }
+            for device in self.devices
+        }
@@ -0,0 +1,150 @@
+# arduino_discovery.py
+import json
+import os
+import threading
+
+
+class ThingDiscovery:
+    """
+    Recuerda el ID de un thing de Arduino IoT Cloud y los IDs de sus propiedades.
+
+    Tras la primera resolución solo es necesario consultar el endpoint de
+    propiedades del thing; el listado completo de things se vuelve a pedir
+    únicamente si la entrada se invalida (404, thing sin las propiedades
+    esperadas). Opcionalmente la resolución se guarda en disco para
+    sobrevivir reinicios.
+    """
+
+    # Varios dispositivos pueden compartir el mismo archivo de caché
+    _file_lock = threading.Lock()
+
+    def __init__(self, thing_name, property_names, cache_path=None):
+        self.thing_name = thing_name
+        self.property_names = list(property_names)
+        self.cache_path = os.path.normpath(cache_path) if cache_path else None
+
+        self._lock = threading.Lock()
+        self._entry = None
+
+        # Estadísticas
+        self.discoveries = 0
+        self.invalidations = 0
+
+        self._load()
+
+    def get_thing_id(self):
+        """Retorna el ID del thing resuelto o None si hay que listar los things"""
+        entry = self._entry
+        return entry['thing_id'] if entry else None
+
+    def find_thing(self, things):
+        """
+        Busca el thing por nombre dentro del listado y lo recuerda
+
+        Args:
+            things (list): Respuesta de GET /iot/v2/things
+
+        Returns:
+            dict: El thing encontrado o None
+        """
+        for thing in things:
+            if thing.get('name') == self.thing_name:
+                with self._lock:
+                    self._entry = {
+                        'thing_id': thing.get('id'),
+                        'thing_name': thing.get('name'),
+                        'properties': {}
+                    }
+                    self.discoveries += 1
+                return thing
+        return None
+
+    def map_properties(self, properties):
+        """
+        Asocia cada nombre esperado con su propiedad en la respuesta
+
+        Primero se busca por el ID recordado; si no existe se busca por nombre
+        y se actualiza el ID guardado.
+
+        Args:
+            properties (list): Respuesta de GET /iot/v2/things/{id}/properties
+
+        Returns:
+            dict: {nombre: propiedad} o None si falta alguna propiedad
+        """
+        with self._lock:
+            if not self._entry:
+                return None
+            known_ids = self._entry['properties']
+            by_id = {prop.get('id'): prop for prop in properties}
+
+            mapped = {}
+            changed = False
+            for name in self.property_names:
+                prop = by_id.get(known_ids.get(name))
+                if prop is None:
+                    prop = next((p for p in properties if name in p.get('name', '').lower()), None)
+                    if prop is None:
+                        return None
+                    known_ids[name] = prop.get('id')
+                    changed = True
+                mapped[name] = prop
+
+            if changed:
+                self._save_locked()
+            return mapped
+
+    def invalidate(self):
+        """Olvida la resolución actual para forzar un nuevo descubrimiento"""
+        with self._lock:
+            if self._entry is None:
+                return
+            self._entry = None
+            self.invalidations += 1
+            self._save_locked()
+
+    def get_stats(self):
+        """Retorna el estado actual de la resolución"""
+        entry = self._entry
+        return {
+            "thing_id": entry['thing_id'] if entry else None,
+            "properties": dict(entry['properties']) if entry else {},
+            "discoveries": self.discoveries,
+            "invalidations": self.invalidations
+        }
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f).get(self.thing_name)
+            if entry and entry.get('thing_id'):
+                entry.setdefault('properties', {})
+                self._entry = entry
+        except Exception as e:
+            print(f"No se pudo leer la caché de descubrimiento {self.cache_path}: {e}")
+
+    def _save_locked(self):
+        if not self.cache_path:
+            return
+        try:
+            with ThingDiscovery._file_lock:
+                self._write_file()
+        except Exception as e:
+            print(f"No se pudo guardar la caché de descubrimiento {self.cache_path}: {e}")
+
+    def _write_file(self):
+        data = {}
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        if self._entry:
+            data[self.thing_name] = self._entry
+        else:
+            data.pop(self.thing_name, None)
+        # Escritura atómica para no dejar el archivo a medias
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
@@ -1,60 +1,114 @@
-import os, json
+import os
+import threading
+from types import MappingProxyType
 
-from filelock import FileLock
 from dotenv import load_dotenv
 
+ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+# Clave generada cuando SECRET_KEY no está en .env (compartida por todos los workers)
+SECRET_KEY_PATH = os.path.join(ROOT_DIR, '.secret_key')
+
+_settings = None
+_settings_lock = threading.Lock()
+
+
 def load_config():
+    """
+    Retorna la configuración de la aplicación
+
+    Se construye una sola vez por proceso (lee .env y las variables de
+    entorno) y se comparte como un mapeo de solo lectura.
+
+    Returns:
+        Mapping: Configuración inmutable
+    """
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = MappingProxyType(_build_config())
+    return _settings
 
+
+def _build_config():
     load_dotenv()
     
     # Generar SECRET_KEY si no existe en .env
-    secret_key = os.getenv("SECRET_KEY")
-    if not secret_key:
-        # Generar una clave aleatoria de 24 bytes
-        secret_key = os.urandom(24).hex()
-        print("⚠️ WARNING: SECRET_KEY no encontrada en .env. Generando una aleatoria.")
-        print(f"   Para producción, agrega esta línea a tu .env: SECRET_KEY={secret_key}")
-    
-    # Manejar el contador de visitas
-    visitas_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../visitas.json')
-    visitas_path = os.path.normpath(visitas_path)
-
-    if not os.path.exists(visitas_path):
-        with open(visitas_path, 'w') as f:
-            json.dump({"num_visitas": 0}, f)
-
-    with open(visitas_path, 'r') as f:
-        visitas = json.load(f)
+    secret_key = os.getenv("SECRET_KEY") or _shared_secret_key()
 
     config = {
         "SECRET_KEY": secret_key,
         "CLIENT_ID": os.getenv("CLIENT_ID"),
         "CLIENT_SECRET": os.getenv("CLIENT_SECRET"),
+        "ARDUINO_DISCOVERY_CACHE": os.getenv("ARDUINO_DISCOVERY_CACHE"),
+        "ARDUINO_DEVICES": os.getenv("ARDUINO_DEVICES"),
+        "ARDUINO_DEVICE_WORKERS": int(os.getenv("ARDUINO_DEVICE_WORKERS", 4)),
+        "ARDUINO_RATE_LIMIT": float(os.getenv("ARDUINO_RATE_LIMIT", 10)),
+        "ARDUINO_RATE_BURST": int(os.getenv("ARDUINO_RATE_BURST", 10)),
+        "ARDUINO_BREAKER_THRESHOLD": int(os.getenv("ARDUINO_BREAKER_THRESHOLD", 5)),
+        "ARDUINO_BREAKER_RESET": float(os.getenv("ARDUINO_BREAKER_RESET", 30)),
+        "ARDUINO_POOL_SIZE": int(os.getenv("ARDUINO_POOL_SIZE", 10)),
+        "ARDUINO_CONNECT_TIMEOUT": float(os.getenv("ARDUINO_CONNECT_TIMEOUT", 3.05)),
+        "ARDUINO_READ_TIMEOUT": float(os.getenv("ARDUINO_READ_TIMEOUT", 10)),
+        "ARDUINO_HEDGE_READS": os.getenv("ARDUINO_HEDGE_READS", "false").lower() in ("1", "true", "yes"),
+        "FLOWMETER_POLL_INTERVAL": float(os.getenv("FLOWMETER_POLL_INTERVAL", 0)),
+        "FLOWMETER_STALE_GRACE": float(os.getenv("FLOWMETER_STALE_GRACE", 30)),
+        "FLOWMETER_STREAM_HEARTBEAT": float(os.getenv("FLOWMETER_STREAM_HEARTBEAT", 5)),
+        "FLOW_HISTORY_DIR": os.getenv("FLOW_HISTORY_DIR") or os.path.join(ROOT_DIR, 'historial'),
+        "INFORMES_DIR": os.getenv("INFORMES_DIR"),
+        "VISITAS_DB": os.getenv("VISITAS_DB"),
         "WEATHERCLOUD_EMAIL": os.getenv("WEATHERCLOUD_EMAIL"),
         "WEATHERCLOUD_PASSWORD": os.getenv("WEATHERCLOUD_PASSWORD"),
         "WEATHERCLOUD_DEVICEID": os.getenv("WEATHERCLOUD_DEVICEID"),
-        "NUM_VISITAS": visitas['num_visitas']
+        "WEATHERCLOUD_CACHE_STATIONS": int(os.getenv("WEATHERCLOUD_CACHE_STATIONS", 256)),
+        "WEATHERCLOUD_TTL_WEATHER": float(os.getenv("WEATHERCLOUD_TTL_WEATHER", 120)),
+        "WEATHERCLOUD_TTL_PROFILE": float(os.getenv("WEATHERCLOUD_TTL_PROFILE", 86400)),
+        "WEATHERCLOUD_TTL_INFOS": float(os.getenv("WEATHERCLOUD_TTL_INFOS", 86400)),
+        "WEATHERCLOUD_TTL_STATISTICS": float(os.getenv("WEATHERCLOUD_TTL_STATISTICS", 600)),
+        "WEATHERCLOUD_TTL_WIND": float(os.getenv("WEATHERCLOUD_TTL_WIND", 300)),
+        "WEATHERCLOUD_BATCH_TIMEOUT": float(os.getenv("WEATHERCLOUD_BATCH_TIMEOUT", 8)),
+        "WEATHERCLOUD_TTL_NEAREST": float(os.getenv("WEATHERCLOUD_TTL_NEAREST", 3600)),
+        "SHARED_CACHE_BACKEND": os.getenv("SHARED_CACHE_BACKEND", "memory"),
+        "SHARED_CACHE_PATH": os.getenv("SHARED_CACHE_PATH") or os.path.join(ROOT_DIR, 'shared_cache.mmap'),
+        "PROFILING_ENABLED": os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes"),
+        "PROFILING_TOKEN": os.getenv("PROFILING_TOKEN"),
+        "PROFILING_DIR": os.getenv("PROFILING_DIR") or os.path.join(ROOT_DIR, 'perfiles'),
+        "PROFILING_MAX_PROFILES": int(os.getenv("PROFILING_MAX_PROFILES", 50)),
+        "PROFILING_INTERVAL_MS": float(os.getenv("PROFILING_INTERVAL_MS", 5)),
+        "PROFILING_MAX_SECONDS": float(os.getenv("PROFILING_MAX_SECONDS", 30)),
+        "PORT": int(os.getenv("PORT", 5000))
     }
     
     return config
 
+
+def _shared_secret_key():
+    """
+    Clave aleatoria guardada en ``.secret_key``
+
+    La primera vez se genera y se publica con ``os.link`` (falla si otro
+    worker ya la creó), así todos los procesos usan la misma clave y las
+    sesiones siguen siendo válidas entre workers y reinicios.
+    """
+    if not os.path.exists(SECRET_KEY_PATH):
+        # Generar una clave aleatoria de 24 bytes
+        secret_key = os.urandom(24).hex()
+        tmp_path = f"{SECRET_KEY_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(secret_key)
+        os.chmod(tmp_path, 0o600)
+        try:
+            os.link(tmp_path, SECRET_KEY_PATH)
+            print("⚠️ WARNING: SECRET_KEY no encontrada en .env. Se generó una aleatoria en .secret_key")
+            print(f"   Para producción, agrega esta línea a tu .env: SECRET_KEY={secret_key}")
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+
+    with open(SECRET_KEY_PATH, 'r') as f:
+        return f.read().strip()
+
+
 def get_port():
-    load_dotenv()
-    return int(os.getenv("PORT", 5000))
-
-def incrementar_visitas():
-    visitas_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../visitas.json')
-    visitas_path = os.path.normpath(visitas_path)
-    lock_path = visitas_path + '.lock'
-    lock = FileLock(lock_path, timeout=10)  # Espera hasta 10 segundos por el lock
-
-    with lock:
-        if not os.path.exists(visitas_path):
-            with open(visitas_path, 'w') as f:
-                json.dump({"num_visitas": 0}, f)
-        with open(visitas_path, 'r') as f:
-            visitas = json.load(f)
-        visitas['num_visitas'] += 1
-        with open(visitas_path, 'w') as f:
-            json.dump(visitas, f)
-    return visitas['num_visitas']
\ No newline at end of file
+    return load_config()["PORT"]
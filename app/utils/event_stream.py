@@ -0,0 +1,115 @@
+# event_stream.py
+import json
+import queue
+import threading
+
+
+class EventBroadcaster:
+    """
+    Reparte eventos a los clientes conectados por Server-Sent Events.
+
+    Cada cliente tiene una cola acotada: si un cliente lento no alcanza a
+    leer, se descartan sus eventos más antiguos en lugar de acumular memoria.
+    Solo se publica cuando el valor cambia respecto al último enviado.
+    """
+
+    def __init__(self, queue_size=5, heartbeat=15):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._last_payload = None
+        self._event_id = 0
+
+        # Estadísticas
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self):
+        """Registra un cliente y retorna su cola de eventos"""
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        """Elimina un cliente"""
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def subscriber_count(self):
+        """Retorna el número de clientes conectados"""
+        return len(self._subscribers)
+
+    def publish(self, data):
+        """
+        Envía ``data`` a todos los clientes si cambió desde el último envío
+
+        Args:
+            data (dict): Datos serializables a JSON
+
+        Returns:
+            bool: True si el evento se publicó
+        """
+        payload = json.dumps(data, sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            if payload == self._last_payload:
+                return False
+            self._last_payload = payload
+            self._event_id += 1
+            event = self._format(self._event_id, payload)
+            subscribers = list(self._subscribers)
+            self.published += 1
+
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Cliente lento: descartar el evento más antiguo
+                try:
+                    q.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+                try:
+                    q.put_nowait(event)
+                except queue.Full:
+                    self.dropped += 1
+        return True
+
+    def stream(self):
+        """
+        Generador de texto SSE para un cliente; envía heartbeats si no hay eventos
+
+        El cliente se registra al empezar a iterar el generador (si la conexión
+        se cierra antes, nunca queda registrado) y se da de baja al cerrar la
+        conexión. El servidor solo nota la desconexión al fallar una escritura,
+        así que un cliente que se fue sigue contando hasta ``heartbeat`` segundos.
+        """
+        q = self.subscribe()
+        try:
+            with self._lock:
+                last = (self._event_id, self._last_payload)
+            # Enviar el último valor conocido para que el cliente no espere al próximo cambio
+            if last[1] is not None:
+                yield self._format(*last)
+            while True:
+                try:
+                    yield q.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+        finally:
+            self.unsubscribe(q)
+
+    def get_stats(self):
+        """Retorna clientes conectados, eventos publicados y descartados"""
+        return {
+            "subscribers": self.subscriber_count(),
+            "published": self.published,
+            "dropped": self.dropped
+        }
+
+    @staticmethod
+    def _format(event_id, payload):
+        return f"id: {event_id}\nretry: 5000\ndata: {payload}\n\n"
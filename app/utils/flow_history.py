@@ -0,0 +1,259 @@
+# flow_history.py
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from filelock import FileLock
+
+# Columnas de ancho fijo: timestamp en segundos (uint32) y valor (float64)
+TS_FORMAT = 'I'
+VALUE_FORMAT = 'd'
+TS_SIZE = struct.calcsize('<' + TS_FORMAT)
+VALUE_SIZE = struct.calcsize('<' + VALUE_FORMAT)
+# Mayor timestamp que cabe en la columna
+MAX_TIMESTAMP = 2 ** (8 * TS_SIZE) - 1
+
+
+def parse_updated_at(value):
+    """
+    Convierte el ``value_updated_at`` de Arduino a segundos epoch
+
+    Args:
+        value (str): Fecha ISO 8601, por ejemplo "2025-11-03T02:14:51.123Z"
+
+    Returns:
+        int: Segundos desde epoch o None si no se puede interpretar
+    """
+    if not value:
+        return None
+    try:
+        fecha = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return int(fecha.timestamp())
+
+
+def segment_name(timestamp):
+    """Nombre del segmento mensual que contiene ``timestamp`` (p. ej. '2025-11')"""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m')
+
+
+class FlowHistory:
+    """
+    Historial append-only de las lecturas del flujómetro.
+
+    Cada serie (``instflow``, ``constflow``) se guarda en segmentos mensuales
+    con dos columnas binarias de ancho fijo: ``AAAA-MM.ts`` con los
+    timestamps y ``AAAA-MM.val`` con los valores (12 bytes por muestra, unos
+    38 MB por serie para un año de muestras cada 10 segundos). Las lecturas
+    usan mmap, así que no se carga el historial en memoria.
+
+    Las muestras con un ``value_updated_at`` igual o anterior al último
+    guardado se descartan, por lo que registrar la misma lectura varias
+    veces (o desde varios workers) no duplica datos.
+    """
+
+    def __init__(self, base_dir, series=('instflow', 'constflow')):
+        self.base_dir = os.path.normpath(base_dir)
+        self.series = tuple(series)
+
+        self._lock = threading.Lock()
+        self._last_ts = {}
+        self._listeners = []
+
+        # Estadísticas
+        self.appended = 0
+        self.duplicates = 0
+
+        for name in self.series:
+            os.makedirs(os.path.join(self.base_dir, name), exist_ok=True)
+
+    def add_listener(self, fn):
+        """Registra ``fn(series, timestamp, value)`` para cada muestra nueva guardada"""
+        self._listeners.append(fn)
+
+    def record(self, flowmeter_data):
+        """
+        Guarda las propiedades de una lectura del flujómetro
+
+        Args:
+            flowmeter_data (dict): Datos con ``{serie: {"value", "updated_at"}}``
+
+        Returns:
+            int: Número de muestras nuevas guardadas
+        """
+        saved = 0
+        for name in self.series:
+            prop = flowmeter_data.get(name) if flowmeter_data else None
+            if not prop or not isinstance(prop.get('value'), (int, float)):
+                continue
+            timestamp = parse_updated_at(prop.get('updated_at'))
+            if timestamp is not None and self.append(name, timestamp, prop['value']):
+                saved += 1
+        return saved
+
+    def append(self, series, timestamp, value):
+        """
+        Agrega una muestra al final de la serie
+
+        Args:
+            series (str): Nombre de la serie
+            timestamp (int): Segundos desde epoch
+            value (float): Valor medido
+
+        Returns:
+            bool: False si la muestra ya estaba guardada (duplicada o antigua)
+        """
+        timestamp = int(timestamp)
+        with self._lock:
+            if timestamp <= self._last_ts.get(series, 0):
+                self.duplicates += 1
+                return False
+
+            series_dir = os.path.join(self.base_dir, series)
+            # El lock de archivo evita duplicados entre workers
+            with FileLock(os.path.join(series_dir, '.lock'), timeout=10):
+                last_ts = self._read_last_ts(series)
+                if timestamp <= last_ts:
+                    self._last_ts[series] = last_ts
+                    self.duplicates += 1
+                    return False
+
+                base = os.path.join(series_dir, segment_name(timestamp))
+                self._repair(base)
+                # Primero el valor: si el proceso muere entre ambas escrituras
+                # _repair() descarta el valor huérfano
+                with open(base + '.val', 'ab') as f:
+                    f.write(struct.pack('<' + VALUE_FORMAT, float(value)))
+                with open(base + '.ts', 'ab') as f:
+                    f.write(struct.pack('<' + TS_FORMAT, timestamp))
+
+            self._last_ts[series] = timestamp
+            self.appended += 1
+
+        for fn in self._listeners:
+            try:
+                fn(series, timestamp, float(value))
+            except Exception as e:
+                print(f"Error en listener del historial: {e}")
+        return True
+
+    def segments(self, series, start=None, end=None):
+        """Retorna las rutas base (sin extensión) de los segmentos entre ``start`` y ``end``"""
+        series_dir = os.path.join(self.base_dir, series)
+        if not os.path.isdir(series_dir):
+            return []
+        names = sorted(f[:-3] for f in os.listdir(series_dir) if f.endswith('.ts'))
+        if start is not None:
+            names = [n for n in names if n >= segment_name(start)]
+        if end is not None:
+            names = [n for n in names if n <= segment_name(end)]
+        return [os.path.join(series_dir, n) for n in names]
+
+    @contextmanager
+    def open_segment(self, base, start=None, end=None):
+        """
+        Abre un segmento con mmap y entrega vistas de sus columnas
+
+        Las vistas (``memoryview`` de uint32 y float64) solo son válidas
+        dentro del bloque ``with``.
+
+        Yields:
+            tuple: (timestamps, valores) recortados al rango [start, end]
+        """
+        ts_file = open(base + '.ts', 'rb')
+        val_file = open(base + '.val', 'rb')
+        maps = []
+        views = []
+        try:
+            count = min(os.fstat(ts_file.fileno()).st_size // TS_SIZE,
+                        os.fstat(val_file.fileno()).st_size // VALUE_SIZE)
+            if count == 0:
+                yield memoryview(b'').cast(TS_FORMAT), memoryview(b'').cast(VALUE_FORMAT)
+                return
+
+            ts_map = mmap.mmap(ts_file.fileno(), 0, access=mmap.ACCESS_READ)
+            val_map = mmap.mmap(val_file.fileno(), 0, access=mmap.ACCESS_READ)
+            maps = [ts_map, val_map]
+
+            ts_view = memoryview(ts_map).cast(TS_FORMAT)
+            val_view = memoryview(val_map).cast(VALUE_FORMAT)
+            views = [ts_view, val_view]
+
+            lo = bisect_left(ts_view, start, 0, count) if start is not None else 0
+            hi = bisect_right(ts_view, end, 0, count) if end is not None else count
+            ts_slice = ts_view[lo:hi]
+            val_slice = val_view[lo:hi]
+            views = [ts_slice, val_slice] + views
+            yield ts_slice, val_slice
+        finally:
+            for view in views:
+                view.release()
+            for m in maps:
+                m.close()
+            ts_file.close()
+            val_file.close()
+
+    def read(self, series, start=None, end=None):
+        """
+        Lee las muestras de una serie en el rango [start, end]
+
+        Args:
+            series (str): Nombre de la serie
+            start (int): Segundos epoch inicial (opcional)
+            end (int): Segundos epoch final (opcional)
+
+        Returns:
+            tuple: (lista de timestamps, lista de valores)
+        """
+        timestamps, values = [], []
+        for base in self.segments(series, start, end):
+            with self.open_segment(base, start, end) as (ts_view, val_view):
+                timestamps.extend(ts_view.tolist())
+                values.extend(val_view.tolist())
+        return timestamps, values
+
+    def get_stats(self):
+        """Retorna el número de muestras y el tamaño en disco de cada serie"""
+        stats = {"appended": self.appended, "duplicates": self.duplicates, "series": {}}
+        for name in self.series:
+            size = 0
+            samples = 0
+            for base in self.segments(name):
+                ts_size = os.path.getsize(base + '.ts')
+                samples += ts_size // TS_SIZE
+                size += ts_size + os.path.getsize(base + '.val')
+            stats["series"][name] = {"samples": samples, "bytes": size}
+        return stats
+
+    def _read_last_ts(self, series):
+        segments = self.segments(series)
+        for base in reversed(segments):
+            size = os.path.getsize(base + '.ts')
+            if size >= TS_SIZE:
+                with open(base + '.ts', 'rb') as f:
+                    f.seek((size // TS_SIZE - 1) * TS_SIZE)
+                    return struct.unpack('<' + TS_FORMAT, f.read(TS_SIZE))[0]
+        return 0
+
+    @staticmethod
+    def _repair(base):
+        """Recorta las columnas de un segmento al mismo número de muestras"""
+        ts_path, val_path = base + '.ts', base + '.val'
+        has_ts, has_val = os.path.exists(ts_path), os.path.exists(val_path)
+        if not has_ts or not has_val:
+            # Segmento nuevo interrumpido entre ambas escrituras: la columna
+            # que existe solo tiene muestras huérfanas
+            if has_ts or has_val:
+                os.truncate(ts_path if has_ts else val_path, 0)
+            return
+        count = min(os.path.getsize(ts_path) // TS_SIZE, os.path.getsize(val_path) // VALUE_SIZE)
+        for path, size in ((ts_path, TS_SIZE), (val_path, VALUE_SIZE)):
+            if os.path.getsize(path) != count * size:
+                os.truncate(path, count * size)
@@ -0,0 +1,240 @@
+# flow_reports.py
+import json
+import os
+import threading
+from datetime import datetime
+
+from filelock import FileLock
+
+# Archivo del estado, dentro de la carpeta del historial
+STATE_FILENAME = 'resumen_mensual.json'
+
+
+def _month_key(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m')
+
+
+def _new_month():
+    return {
+        "litros": 0.0,
+        "lmin_suma": 0.0,
+        "lmin_muestras": 0,
+        "lmin_pico": None,
+        "lmin_pico_ts": None,
+        "dias": {},
+        "horas_suma": [0.0] * 24,
+        "horas_muestras": [0] * 24
+    }
+
+
+class FlowReportAccumulator:
+    """
+    Acumuladores mensuales para los informes de caudal.
+
+    Cada muestra nueva del historial actualiza los totales del mes en que
+    ocurrió: litros consumidos (diferencias de ``instflow``, el contador
+    acumulado), suma y pico de ``constflow`` (L/min), litros por día y
+    promedio por hora del día. Generar un informe solo lee estos totales.
+
+    El estado se guarda en un JSON compartido por todos los workers y
+    protegido con un lock de archivo.
+    """
+
+    def __init__(self, state_path):
+        self.state_path = os.path.normpath(state_path)
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(self.state_path + '.lock', timeout=10)
+        self._mtime = None
+        self._state = self._empty_state()
+        self._load()
+
+    def exists(self):
+        """Indica si ya existe un estado guardado"""
+        return os.path.exists(self.state_path)
+
+    def ingest(self, series, timestamp, value):
+        """
+        Agrega una muestra a los acumuladores (compatible con ``FlowHistory.add_listener``)
+
+        Cada muestra reescribe el JSON completo. El costo está acotado: solo
+        llegan muestras nuevas del historial (como mucho una por serie y
+        lectura de Arduino) y el estado crece ~1 KB por mes, así que guardar
+        tarda menos de un milisegundo con años de datos. No se agrupan los
+        guardados porque cada muestra la recibe solo el worker que la escribió
+        en el historial: una muestra sin guardar se perdería al recargar el
+        estado publicado por otro worker.
+
+        Args:
+            series (str): 'instflow' o 'constflow'
+            timestamp (int): Segundos epoch de la muestra
+            value (float): Valor medido
+        """
+        with self._lock, self._file_lock:
+            self._reload_if_changed()
+            if self._apply(series, int(timestamp), float(value)):
+                self._save()
+
+    def rebuild(self, history):
+        """
+        Recalcula todos los acumuladores recorriendo el historial guardado
+
+        Lee los segmentos uno a uno con mmap, sin cargar todo en memoria.
+
+        Args:
+            history (FlowHistory): Historial de lecturas
+
+        Returns:
+            int: Número de muestras procesadas
+        """
+        processed = 0
+        with self._lock, self._file_lock:
+            self._state = self._empty_state()
+            for series in ('instflow', 'constflow'):
+                for base in history.segments(series):
+                    with history.open_segment(base) as (ts_view, val_view):
+                        for timestamp, value in zip(ts_view, val_view):
+                            self._apply(series, timestamp, value)
+                            processed += 1
+            self._save()
+        print(f"Acumuladores de informes reconstruidos con {processed} muestras")
+        return processed
+
+    def summary(self, fecha_inicio, fecha_fin):
+        """
+        Resumen de los meses entre ``fecha_inicio`` y ``fecha_fin`` (inclusive)
+
+        Args:
+            fecha_inicio (datetime): Inicio del período
+            fecha_fin (datetime): Fin del período
+
+        Returns:
+            dict: Totales, promedios, pico y perfil horario del período
+        """
+        with self._lock:
+            self._reload_if_changed()
+            months = self._state["meses"]
+            keys = [k for k in sorted(months)
+                    if fecha_inicio.strftime('%Y-%m') <= k <= fecha_fin.strftime('%Y-%m')]
+
+            litros = 0.0
+            lmin_suma = 0.0
+            lmin_muestras = 0
+            pico = None
+            pico_ts = None
+            horas_suma = [0.0] * 24
+            horas_muestras = [0] * 24
+            dias = {}
+            por_mes = {}
+
+            for key in keys:
+                month = months[key]
+                litros += month["litros"]
+                lmin_suma += month["lmin_suma"]
+                lmin_muestras += month["lmin_muestras"]
+                if month["lmin_pico"] is not None and (pico is None or month["lmin_pico"] > pico):
+                    pico, pico_ts = month["lmin_pico"], month["lmin_pico_ts"]
+                for hora in range(24):
+                    horas_suma[hora] += month["horas_suma"][hora]
+                    horas_muestras[hora] += month["horas_muestras"][hora]
+                for dia, litros_dia in month["dias"].items():
+                    dias[f"{key}-{dia}"] = litros_dia
+                por_mes[key] = {
+                    "total_litros": round(month["litros"], 2),
+                    "promedio_lmin": round(month["lmin_suma"] / month["lmin_muestras"], 2) if month["lmin_muestras"] else 0,
+                    "dias_con_datos": len(month["dias"])
+                }
+
+            dia_pico = max(dias, key=dias.get) if dias else None
+            return {
+                "total_litros": round(litros, 2),
+                "promedio_lmin": round(lmin_suma / lmin_muestras, 2) if lmin_muestras else 0,
+                "pico_lmin": round(pico, 2) if pico is not None else 0,
+                "fecha_pico": datetime.fromtimestamp(pico_ts).strftime('%d/%m/%Y %H:%M') if pico_ts else None,
+                "dias_con_datos": len(dias),
+                "dia_mayor_consumo": datetime.strptime(dia_pico, '%Y-%m-%d').strftime('%d/%m/%Y') if dia_pico else None,
+                "litros_dia_mayor_consumo": round(dias[dia_pico], 2) if dia_pico else 0,
+                "perfil_horario": [round(horas_suma[h] / horas_muestras[h], 2) if horas_muestras[h] else 0
+                                   for h in range(24)],
+                "muestras": lmin_muestras,
+                "meses": por_mes,
+                "ultimo_instflow": self._state["ultimo"]["instflow"]["valor"],
+                "ultimo_constflow": self._state["ultimo"]["constflow"]["valor"]
+            }
+
+    def _apply(self, series, timestamp, value):
+        """Aplica una muestra al estado en memoria; retorna False si ya fue contada"""
+        last = self._state["ultimo"][series]
+        if timestamp <= last["ts"]:
+            return False
+
+        month = self._state["meses"].setdefault(_month_key(timestamp), _new_month())
+        fecha = datetime.fromtimestamp(timestamp)
+
+        if series == 'instflow':
+            previous = last["valor"]
+            if previous is not None:
+                # Si el contador bajó asumimos que se reinició desde cero
+                delta = value - previous if value >= previous else value
+                month["litros"] += delta
+                dia = fecha.strftime('%d')
+                month["dias"][dia] = month["dias"].get(dia, 0.0) + delta
+        else:
+            month["lmin_suma"] += value
+            month["lmin_muestras"] += 1
+            month["horas_suma"][fecha.hour] += value
+            month["horas_muestras"][fecha.hour] += 1
+            if month["lmin_pico"] is None or value > month["lmin_pico"]:
+                month["lmin_pico"] = value
+                month["lmin_pico_ts"] = timestamp
+
+        last["ts"] = timestamp
+        last["valor"] = value
+        return True
+
+    @staticmethod
+    def _empty_state():
+        return {
+            "ultimo": {
+                "instflow": {"ts": 0, "valor": None},
+                "constflow": {"ts": 0, "valor": None}
+            },
+            "meses": {}
+        }
+
+    def _reload_if_changed(self):
+        try:
+            stat = os.stat(self.state_path)
+        except FileNotFoundError:
+            return
+        # Otro worker pudo haber reemplazado el archivo
+        if (stat.st_ino, stat.st_mtime_ns) != self._mtime:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self._state = json.load(f)
+            stat = os.stat(self.state_path)
+            self._mtime = (stat.st_ino, stat.st_mtime_ns)
+        except Exception as e:
+            print(f"No se pudo leer el estado de informes {self.state_path}: {e}")
+
+    def _save(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+        stat = os.stat(self.state_path)
+        self._mtime = (stat.st_ino, stat.st_mtime_ns)
+
+
+if __name__ == '__main__':
+    # Reconstrucción manual: python -m app.utils.flow_reports
+    # Solo el historial y los acumuladores, sin el cableado de api_controller
+    from app.utils import config
+    from app.utils.flow_history import FlowHistory
+
+    flow_history = FlowHistory(config.load_config()['FLOW_HISTORY_DIR'])
+    FlowReportAccumulator(os.path.join(flow_history.base_dir, STATE_FILENAME)).rebuild(flow_history)
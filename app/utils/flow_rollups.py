@@ -0,0 +1,210 @@
+# flow_rollups.py
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.utils.flow_history import TS_SIZE, VALUE_SIZE, segment_name
+
+# Resoluciones precalculadas (segundos)
+ROLLUP_RESOLUTIONS = (60, 3600)
+
+ROLLUP_DTYPE = np.dtype([
+    ('t', '<u4'),
+    ('min', '<f8'),
+    ('max', '<f8'),
+    ('sum', '<f8'),
+    ('count', '<u4'),
+    ('last', '<f8')
+])
+
+
+def aggregate(timestamps, mins, maxs, sums, counts, lasts, bucket):
+    """
+    Agrupa filas ordenadas por tiempo en buckets de ``bucket`` segundos
+
+    Funciona tanto con muestras crudas (min = max = sum = last = valor,
+    count = 1) como con filas ya agregadas, porque min/max/sum/count/last
+    se pueden combinar.
+
+    Returns:
+        numpy.ndarray: Filas con ``ROLLUP_DTYPE``, una por bucket no vacío
+    """
+    if len(timestamps) == 0:
+        return np.empty(0, dtype=ROLLUP_DTYPE)
+
+    keys = (np.asarray(timestamps, dtype=np.int64) // bucket) * bucket
+    # Los timestamps vienen ordenados: cada bucket empieza donde cambia la clave
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+
+    out = np.empty(len(starts), dtype=ROLLUP_DTYPE)
+    out['t'] = keys[starts]
+    out['min'] = np.minimum.reduceat(mins, starts)
+    out['max'] = np.maximum.reduceat(maxs, starts)
+    out['sum'] = np.add.reduceat(sums, starts)
+    out['count'] = np.add.reduceat(counts, starts)
+    out['last'] = np.asarray(lasts)[ends]
+    return out
+
+
+def aggregate_rows(rows, bucket):
+    """Reagrupa filas ``ROLLUP_DTYPE`` en buckets más grandes"""
+    return aggregate(rows['t'], rows['min'], rows['max'], rows['sum'], rows['count'], rows['last'], bucket)
+
+
+def aggregate_samples(timestamps, values, bucket):
+    """Agrupa muestras crudas en buckets de ``bucket`` segundos"""
+    values = np.asarray(values, dtype=np.float64)
+    return aggregate(timestamps, values, values, values, np.ones(len(values), dtype=np.uint32), values, bucket)
+
+
+class FlowRollups:
+    """
+    Resúmenes precalculados (1 minuto y 1 hora) sobre ``FlowHistory``.
+
+    Los resúmenes de cada segmento mensual se calculan una vez y se guardan
+    junto al segmento (``AAAA-MM.r60.npy``); se recalculan solo si el
+    segmento creció. Las consultas combinan los resúmenes en el tamaño de
+    bucket pedido sin volver a leer las muestras crudas.
+    """
+
+    def __init__(self, history):
+        self.history = history
+        self._lock = threading.Lock()
+        self._memory = {}
+
+        # Estadísticas
+        self.builds = 0
+        self.hits = 0
+
+    def query(self, series, start, end, bucket):
+        """
+        Serie agregada en buckets de ``bucket`` segundos entre ``start`` y ``end``
+
+        Args:
+            series (str): Nombre de la serie
+            start (int): Segundos epoch inicial
+            end (int): Segundos epoch final
+            bucket (int): Tamaño del bucket en segundos
+
+        Returns:
+            dict: Arreglos paralelos t, min, max, avg, last y count
+        """
+        resolution = self._best_resolution(bucket)
+        # Buckets completos en ambos extremos, se lean resúmenes o muestras crudas
+        start = (start // bucket) * bucket
+        end = (end // bucket) * bucket + bucket - 1
+
+        parts = []
+        for base in self.history.segments(series, start, end):
+            if resolution:
+                rows = self.get_rollup(base, resolution)
+                lo = np.searchsorted(rows['t'], start, side='left')
+                hi = np.searchsorted(rows['t'], end, side='right')
+                parts.append(aggregate_rows(rows[lo:hi], bucket))
+            else:
+                with self.history.open_segment(base, start, end) as (ts_view, val_view):
+                    timestamps = np.array(ts_view, dtype=np.uint32)
+                    values = np.array(val_view, dtype=np.float64)
+                parts.append(aggregate_samples(timestamps, values, bucket))
+
+        rows = np.concatenate(parts) if parts else np.empty(0, dtype=ROLLUP_DTYPE)
+        # Un bucket puede quedar partido entre dos segmentos mensuales
+        if len(parts) > 1:
+            rows = aggregate_rows(rows, bucket)
+
+        counts = rows['count']
+        return {
+            "bucket": bucket,
+            "resolution": resolution or 1,
+            "t": rows['t'].tolist(),
+            "min": rows['min'].tolist(),
+            "max": rows['max'].tolist(),
+            "avg": np.round(rows['sum'] / np.maximum(counts, 1), 4).tolist(),
+            "last": rows['last'].tolist(),
+            "count": counts.tolist()
+        }
+
+    def get_rollup(self, base, resolution):
+        """
+        Retorna el resumen de un segmento, actualizándolo solo si el segmento creció
+
+        El segmento del mes en curso se actualiza de forma incremental: solo
+        se leen las muestras desde el último bucket resumido. Los segmentos
+        de meses cerrados se guardan en disco y no se vuelven a calcular.
+
+        Args:
+            base (str): Ruta del segmento sin extensión
+            resolution (int): Resolución en segundos (60 o 3600)
+
+        Returns:
+            numpy.ndarray: Filas con ``ROLLUP_DTYPE``
+        """
+        count = self._segment_count(base)
+        key = (base, resolution)
+        path = f"{base}.r{resolution}.npy"
+
+        with self._lock:
+            cached = self._memory.get(key)
+        if cached and cached[0] == count:
+            self.hits += 1
+            return cached[1]
+
+        if cached is None and os.path.exists(path):
+            try:
+                stored = np.load(path)
+                # La primera fila guarda cuántas muestras se resumieron
+                cached = (int(stored[0]['count']), stored[1:])
+            except Exception as e:
+                print(f"No se pudo leer el resumen {path}: {e}")
+
+        if cached and cached[0] == count:
+            rows = cached[1]
+        elif cached and 0 < cached[0] < count and len(cached[1]):
+            # Recalcular solo el último bucket (posiblemente incompleto) y los nuevos
+            previous = cached[1]
+            rows = np.concatenate([previous[:-1], self._build(base, resolution, int(previous[-1]['t']))])
+        else:
+            rows = self._build(base, resolution)
+
+        closed = os.path.basename(base) < segment_name(int(datetime.now(timezone.utc).timestamp()))
+        if closed and not (cached and cached[0] == count and os.path.exists(path)):
+            self._save(path, rows, count)
+
+        with self._lock:
+            self._memory[key] = (count, rows)
+        return rows
+
+    def get_stats(self):
+        """Retorna cuántos resúmenes se calcularon y cuántas consultas se sirvieron desde memoria"""
+        return {"builds": self.builds, "hits": self.hits, "cached_segments": len(self._memory)}
+
+    def _build(self, base, resolution, start=None):
+        with self.history.open_segment(base, start) as (ts_view, val_view):
+            timestamps = np.array(ts_view, dtype=np.uint32)
+            values = np.array(val_view, dtype=np.float64)
+        self.builds += 1
+        return aggregate_samples(timestamps, values, resolution)
+
+    def _save(self, path, rows, count):
+        header = np.zeros(1, dtype=ROLLUP_DTYPE)
+        header[0]['count'] = count
+        tmp_path = path + '.tmp.npy'
+        try:
+            np.save(tmp_path, np.concatenate([header, rows]))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"No se pudo guardar el resumen {path}: {e}")
+
+    @staticmethod
+    def _segment_count(base):
+        return min(os.path.getsize(base + '.ts') // TS_SIZE, os.path.getsize(base + '.val') // VALUE_SIZE)
+
+    @staticmethod
+    def _best_resolution(bucket):
+        for resolution in sorted(ROLLUP_RESOLUTIONS, reverse=True):
+            if bucket >= resolution and bucket % resolution == 0:
+                return resolution
+        return None
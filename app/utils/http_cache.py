@@ -0,0 +1,94 @@
+# http_cache.py
+import gzip
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él solo se ofrece gzip
+    brotli = None
+
+
+def available_encodings():
+    """Codificaciones que el servidor puede producir, en orden de preferencia"""
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """
+    Elige la mejor codificación aceptada por el cliente
+
+    Args:
+        accept_encodings: ``request.accept_encodings`` de Flask
+
+    Returns:
+        str: 'br', 'gzip' o 'identity'
+    """
+    for encoding in available_encodings():
+        if accept_encodings[encoding]:
+            return encoding
+    return 'identity'
+
+
+class EncodedBodyCache:
+    """
+    Caché LRU de cuerpos de respuesta ya serializados y comprimidos.
+
+    Pensado para contenido inmutable (los informes no cambian una vez
+    escritos): cada cuerpo se comprime una sola vez por codificación y la
+    clave incluye el ETag, así que un contenido nuevo nunca sirve uno viejo.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        # Estadísticas
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build_body, encoding='identity'):
+        """
+        Retorna el cuerpo para ``key`` en la codificación pedida
+
+        Args:
+            key (hashable): Clave del contenido (debe incluir el ETag)
+            build_body (callable): Función que genera el cuerpo sin comprimir (bytes)
+            encoding (str): 'identity', 'gzip' o 'br'
+
+        Returns:
+            bytes: Cuerpo codificado
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if encoding in entry:
+                    self.hits += 1
+                    return entry[encoding]
+
+        self.misses += 1
+        if entry is None:
+            entry = {'identity': build_body()}
+        if encoding not in entry:
+            entry[encoding] = self._encode(entry['identity'], encoding)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry[encoding]
+
+    def get_stats(self):
+        """Retorna aciertos, fallos y entradas en memoria"""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    @staticmethod
+    def _encode(body, encoding):
+        if encoding == 'gzip':
+            return gzip.compress(body, compresslevel=6)
+        if encoding == 'br':
+            return brotli.compress(body)
+        return body
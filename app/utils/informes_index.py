@@ -0,0 +1,272 @@
+# informes_index.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from filelock import FileLock
+
+from app.utils.metrics import INFORMES_IO
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS informes (
+    id TEXT PRIMARY KEY,
+    nombre TEXT,
+    periodo TEXT,
+    mes_anio TEXT,
+    generado REAL NOT NULL,
+    mtime_ns INTEGER,
+    size INTEGER,
+    etag TEXT
+);
+CREATE INDEX IF NOT EXISTS informes_generado ON informes (generado DESC, id DESC);
+CREATE INDEX IF NOT EXISTS informes_mes_anio ON informes (mes_anio, generado DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def parse_fecha_generacion(value):
+    """Convierte 'dd/mm/YYYY HH:MM:SS' a segundos epoch, None si no es válida"""
+    try:
+        return datetime.strptime(value, '%d/%m/%Y %H:%M:%S').timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class InformesIndex:
+    """
+    Índice SQLite con la metadata de los informes guardados en ``informes/``.
+
+    El listado se resuelve con una consulta paginada sobre el índice sin
+    abrir los JSON. El índice se actualiza en la misma operación que crea o
+    elimina un informe y se reconcilia con el directorio cuando este cambia
+    (por ejemplo, si se copian o borran archivos a mano).
+    """
+
+    def __init__(self, informes_dir):
+        self.informes_dir = os.path.normpath(informes_dir)
+        index_dir = os.path.join(self.informes_dir, '.index')
+        os.makedirs(index_dir, exist_ok=True)
+        # El índice vive en un subdirectorio para no alterar el mtime de informes/
+        self.db_path = os.path.join(index_dir, 'informes.sqlite3')
+        self._sync_lock = threading.Lock()
+        # Serializa la generación de informes entre hilos y workers
+        self.write_lock = FileLock(os.path.join(index_dir, 'generar.lock'), timeout=30)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            # Índices creados antes de guardar el hash del contenido
+            columns = [r['name'] for r in conn.execute("PRAGMA table_info(informes)")]
+            if 'etag' not in columns:
+                conn.execute("ALTER TABLE informes ADD COLUMN etag TEXT")
+                conn.execute("DELETE FROM meta WHERE key = 'dir_mtime'")
+
+    def add(self, informe_id, informe):
+        """
+        Registra un informe recién guardado en disco
+
+        Args:
+            informe_id (str): ID del informe (nombre del archivo sin .json)
+            informe (dict): Contenido del informe
+        """
+        filepath = self.path_for(informe_id)
+        with open(filepath, 'rb') as f:
+            content = f.read()
+        with self._connect() as conn:
+            self._upsert(conn, informe_id, informe, os.stat(filepath), content)
+            self._bump_version(conn)
+
+    def remove(self, informe_id):
+        """Elimina un informe del índice"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM informes WHERE id = ?", (informe_id,))
+            self._bump_version(conn)
+
+    def get(self, informe_id):
+        """
+        Metadata de un informe, incluido el hash de su contenido
+
+        Returns:
+            dict: {id, etag, mtime_ns, size} o None si no existe
+        """
+        self.sync()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, etag, mtime_ns, size FROM informes WHERE id = ?", (informe_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def version(self):
+        """Número que cambia cada vez que se agrega o elimina un informe"""
+        self.sync()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row['value']) if row else 0
+
+    def list(self, limit=50, cursor=None):
+        """
+        Lista la metadata de los informes, del más reciente al más antiguo
+
+        Args:
+            limit (int): Máximo de informes a retornar
+            cursor (str): Cursor retornado por la página anterior
+
+        Returns:
+            tuple: (lista de informes, cursor de la página siguiente o None)
+        """
+        self.sync()
+        query = "SELECT id, nombre, periodo, mes_anio, generado FROM informes"
+        params = []
+        if cursor:
+            generado, _, last_id = cursor.partition('|')
+            query += " WHERE generado < ? OR (generado = ? AND id < ?)"
+            params = [float(generado), float(generado), last_id]
+        query += " ORDER BY generado DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1]['generado']!r}|{rows[-1]['id']}"
+
+        informes = []
+        for row in rows:
+            fecha = datetime.fromtimestamp(row['generado'])
+            informes.append({
+                'id': row['id'],
+                'nombre': row['nombre'],
+                'fecha': fecha.strftime('%d/%m/%Y'),
+                'fecha_completa': fecha.strftime('%d/%m/%Y %H:%M'),
+                'timestamp': row['generado'],
+                'periodo': row['periodo'],
+                'mes_anio': row['mes_anio']
+            })
+        return informes, next_cursor
+
+    def find_by_month(self, mes_anio):
+        """
+        Busca el informe más reciente de un mes
+
+        Args:
+            mes_anio (str): Mes en formato 'M/AAAA' (p. ej. '11/2025')
+
+        Returns:
+            dict: {id, nombre, generado} o None si no hay informe de ese mes
+        """
+        self.sync()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, nombre, generado FROM informes WHERE mes_anio = ? "
+                "ORDER BY generado DESC LIMIT 1", (mes_anio,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def count(self):
+        """Retorna el número total de informes indexados"""
+        self.sync()
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM informes").fetchone()[0]
+
+    def path_for(self, informe_id):
+        """Ruta del archivo JSON de un informe"""
+        return os.path.join(self.informes_dir, f"{informe_id}.json")
+
+    def sync(self, force=False):
+        """
+        Reconcilia el índice con los archivos del directorio
+
+        Solo se recorre el directorio si su mtime cambió desde la última
+        sincronización, y solo se leen los JSON nuevos o modificados.
+        """
+        dir_mtime = str(os.stat(self.informes_dir).st_mtime_ns)
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'dir_mtime'").fetchone()
+        if not force and row and row['value'] == dir_mtime:
+            return
+
+        with self._sync_lock, self._connect() as conn, INFORMES_IO.time('scan'):
+            # Filas sin etag (índices antiguos) se vuelven a leer
+            indexed = {
+                r['id']: (r['mtime_ns'], r['size'])
+                for r in conn.execute("SELECT id, mtime_ns, size FROM informes WHERE etag IS NOT NULL")
+            }
+            on_disk = set()
+            changed = False
+            for filename in os.listdir(self.informes_dir):
+                if not filename.endswith('.json'):
+                    continue
+                informe_id = filename[:-5]
+                on_disk.add(informe_id)
+                try:
+                    stat = os.stat(self.path_for(informe_id))
+                    if indexed.get(informe_id) == (stat.st_mtime_ns, stat.st_size):
+                        continue
+                    with open(self.path_for(informe_id), 'rb') as f:
+                        content = f.read()
+                    self._upsert(conn, informe_id, json.loads(content), stat, content)
+                    changed = True
+                except Exception as e:
+                    print(f"Error al indexar informe {filename}: {e}")
+
+            stale = [
+                r['id'] for r in conn.execute("SELECT id FROM informes")
+                if r['id'] not in on_disk
+            ]
+            conn.executemany("DELETE FROM informes WHERE id = ?", [(i,) for i in stale])
+            if changed or stale:
+                self._bump_version(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('dir_mtime', ?)", (dir_mtime,)
+            )
+
+    @staticmethod
+    def _bump_version(conn):
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('version', '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    def _upsert(self, conn, informe_id, informe, stat, content):
+        generado = parse_fecha_generacion(informe.get('fecha_generacion')) or stat.st_mtime
+        # El mes se deriva de la fecha de generación (como la validación de duplicados original)
+        fecha = datetime.fromtimestamp(generado)
+        mes_anio = f"{fecha.month}/{fecha.year}"
+        conn.execute(
+            "INSERT OR REPLACE INTO informes (id, nombre, periodo, mes_anio, generado, mtime_ns, size, etag) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (informe_id, informe.get('nombre', f"{informe_id}.json"), informe.get('periodo', 'N/A'),
+             mes_anio, generado, stat.st_mtime_ns, stat.st_size, hashlib.sha1(content).hexdigest()[:20])
+        )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return _Connection(conn)
+
+
+class _Connection:
+    """Conexión que confirma la transacción y se cierra al salir del bloque ``with``"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
@@ -0,0 +1,197 @@
+# metrics.py
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from app.utils.profiler import record_span
+
+# Límites de los buckets de latencia, en segundos
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador acumulado por combinación de etiquetas"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labelvalues, amount=1):
+        """Suma ``amount`` a la serie de las etiquetas dadas (en el orden de ``labelnames``)"""
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Histograma acumulativo por combinación de etiquetas.
+
+    Registrar una observación cuesta una búsqueda binaria y un incremento
+    bajo lock; los buckets acumulados se calculan solo al exportar.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # etiquetas -> [conteo por bucket (+ desborde), suma]
+        self._series = {}
+
+    def observe(self, value, *labelvalues):
+        """Registra un valor para las etiquetas dadas (en el orden de ``labelnames``)"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labelvalues):
+        """Mide la duración del bloque ``with``"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def collect(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Conjunto de métricas del proceso exportables en formato de texto de Prometheus.
+
+    Además de contadores e histogramas admite ``collectors``: funciones que
+    al exportar retornan ``[(nombre, tipo, ayuda, [(etiquetas, valor)])]``
+    para publicar como métricas valores que ya se llevan en otros objetos
+    (por ejemplo sus ``get_stats()``).
+    """
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        """Texto de todas las métricas para ``/metrics``"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Error al exportar métricas: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    label_text = _format_labels(labels.keys(), labels.values())
+                    lines.append(f"{name}{label_text} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# Métricas de la aplicación (por proceso)
+REGISTRY = MetricsRegistry()
+
+HTTP_LATENCY = REGISTRY.histogram(
+    'zaino_http_request_duration_seconds',
+    'Duración de las peticiones HTTP por ruta',
+    ('route', 'method', 'status')
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    'zaino_upstream_request_duration_seconds',
+    'Duración de las llamadas a servicios externos por endpoint y resultado',
+    ('service', 'endpoint', 'status')
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    'zaino_cache_requests_total',
+    'Consultas a caché por resultado (hit, stale, miss)',
+    ('cache', 'result')
+)
+INFORMES_IO = REGISTRY.histogram(
+    'zaino_informes_io_duration_seconds',
+    'Duración de las operaciones de archivos en informes/',
+    ('operation',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+
+def observe_upstream(service, endpoint, status, start):
+    """
+    Registra una llamada a un servicio externo en ``UPSTREAM_LATENCY`` y en los perfiles en curso
+
+    Args:
+        service (str): Servicio externo
+        endpoint (str): Endpoint llamado
+        status (str): Código de estado o resultado (``timeout``, ``error``)
+        start (float): ``time.perf_counter()`` al enviar la petición
+
+    Returns:
+        float: Duración en segundos
+    """
+    end = time.perf_counter()
+    UPSTREAM_LATENCY.observe(end - start, service, endpoint, status)
+    record_span(service, endpoint, status, start, end)
+    return end - start
@@ -0,0 +1,76 @@
+# poller.py
+import random
+import threading
+
+
+class BackgroundPoller:
+    """
+    Ejecuta periódicamente una función de refresco en un hilo daemon.
+
+    La función debe retornar el código de estado HTTP de la consulta. Tras un
+    200 se espera ``interval`` segundos (± ``jitter``); ante un 429 o un error
+    la espera se duplica en cada fallo consecutivo hasta ``max_backoff``.
+    """
+
+    def __init__(self, refresh_fn, interval, jitter=0.1, max_backoff=300, name="poller"):
+        self.refresh_fn = refresh_fn
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.name = name
+
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Estadísticas
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_status = None
+
+    def start(self):
+        """Inicia el hilo de consulta si no está corriendo"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Detiene el hilo de consulta"""
+        self._stop.set()
+
+    def next_delay(self):
+        """Calcula la espera hasta la próxima consulta según los fallos recientes"""
+        delay = self.interval * (2 ** self.consecutive_failures)
+        delay = min(delay, self.max_backoff) if self.consecutive_failures else delay
+        return max(0.1, delay * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def get_stats(self):
+        """Retorna el estado del poller"""
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "last_status": self.last_status
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                status = self.refresh_fn()
+            except Exception as e:
+                print(f"Error en {self.name}: {e}")
+                status = None
+
+            self.runs += 1
+            self.last_status = status
+            if status == 200:
+                self.consecutive_failures = 0
+            else:
+                self.failures += 1
+                self.consecutive_failures += 1
+
+            self._stop.wait(self.next_delay())
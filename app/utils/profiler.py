@@ -0,0 +1,270 @@
+# profiler.py
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import has_request_context
+
+# Perfiles en curso (vacío salvo mientras se perfila alguna petición)
+_active = []
+_active_lock = threading.Lock()
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+def record_span(service, endpoint, status, start, end):
+    """
+    Registra una llamada a un servicio externo en los perfiles en curso
+
+    Sin perfiles activos retorna de inmediato. Las llamadas hechas desde el
+    hilo de una petición perfilada se asignan a ese perfil; las hechas desde
+    pools de hilos (lotes de Weathercloud, dispositivos, hedging) se asignan
+    a todos los perfiles activos.
+
+    Args:
+        service (str): Servicio externo (``arduino``, ``weathercloud``)
+        endpoint (str): Endpoint llamado
+        status (str): Código de estado o resultado
+        start (float): ``time.perf_counter()`` al enviar
+        end (float): ``time.perf_counter()`` al terminar
+    """
+    if not _active:
+        return
+    thread = threading.current_thread()
+    with _active_lock:
+        profiles = list(_active)
+    own = [p for p in profiles if p.thread_id == thread.ident]
+    if not own and has_request_context():
+        # Hilo de otra petición que no se está perfilando
+        return
+    for profile in own or profiles:
+        profile.add_span(thread.name, f"{service} {endpoint} {status}", start, end)
+
+
+class RequestProfile:
+    """
+    Perfil por muestreo de una petición.
+
+    Un hilo aparte toma la pila del hilo de la petición cada ``interval``
+    segundos (``sys._current_frames``); cada muestra pesa el tiempo real
+    transcurrido desde la anterior, así que el resultado es tiempo de reloj
+    (incluye esperas de red y de locks, no solo CPU). Las llamadas a
+    servicios externos se registran como spans con ``record_span``.
+
+    ``write()`` guarda el perfil en formato collapsed stacks (``.folded``,
+    para flamegraph.pl o speedscope) y en formato speedscope
+    (``.speedscope.json``, con un perfil muestreado y los spans de cada hilo).
+    """
+
+    def __init__(self, name, interval=0.005, max_duration=30.0):
+        """
+        Args:
+            name (str): Nombre del perfil (método y ruta)
+            interval (float): Segundos entre muestras
+            max_duration (float): Segundos máximos de muestreo
+        """
+        self.name = name
+        self.thread_id = threading.get_ident()
+        self.thread_name = threading.current_thread().name
+        self.interval = interval
+        self.max_duration = max_duration
+        self.samples = []  # (instante, pila de la raíz a la hoja)
+        self.spans = []  # (hilo, etiqueta, inicio, fin)
+        self.started = None
+        self.ended = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        with _active_lock:
+            _active.append(self)
+        self._thread = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Detiene el muestreo (se puede llamar más de una vez)"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.ended = time.perf_counter()
+        with _active_lock:
+            if self in _active:
+                _active.remove(self)
+
+    def add_span(self, thread_name, label, start, end):
+        with self._lock:
+            self.spans.append((thread_name, label, start, end))
+
+    def write(self, directory, max_profiles, status=None):
+        """
+        Guarda el perfil y elimina los más antiguos si hay más de ``max_profiles``
+
+        Args:
+            directory (str): Carpeta de perfiles
+            max_profiles (int): Perfiles que se conservan
+            status (int): Código de estado de la respuesta (se agrega al nombre)
+
+        Returns:
+            str: ID del perfil (nombre de los archivos sin extensión)
+        """
+        os.makedirs(directory, exist_ok=True)
+        duration_ms = round(((self.ended or time.perf_counter()) - self.started) * 1000, 1)
+        title = f"{self.name} {status} {duration_ms} ms" if status else f"{self.name} {duration_ms} ms"
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', self.name).strip('_')[:60]
+        profile_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{slug}"
+
+        self._write_atomic(os.path.join(directory, f"{profile_id}.folded"), self.collapsed())
+        self._write_atomic(os.path.join(directory, f"{profile_id}.speedscope.json"),
+                           json.dumps(self.speedscope(title), ensure_ascii=False))
+        rotate_profiles(directory, max_profiles)
+        return profile_id
+
+    def collapsed(self):
+        """
+        Pilas en formato collapsed (``raíz;...;hoja peso``), con pesos en microsegundos
+
+        Las muestras tomadas durante una llamada externa terminan en un
+        marco ``[servicio endpoint estado]``; las llamadas de otros hilos se
+        agregan como ``[hilo nombre];[servicio endpoint estado]``.
+        """
+        totals = {}
+        for stack, weight in self._weighted_samples():
+            key = ';'.join(self._frame_label(frame) for frame in stack)
+            totals[key] = totals.get(key, 0) + weight
+        for thread_name, label, start, end in self._foreign_spans():
+            key = f"[hilo {thread_name}];[{label}]"
+            totals[key] = totals.get(key, 0) + (end - start)
+        return ''.join(f"{key} {max(1, round(weight * 1_000_000))}\n" for key, weight in sorted(totals.items()))
+
+    def speedscope(self, title):
+        """Perfil en el formato de archivo de speedscope (tiempos en milisegundos)"""
+        frames = []
+        frame_index = {}
+
+        def index(frame):
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                name, filename, line = frame
+                entry = {"name": name}
+                if filename:
+                    entry.update({"file": filename, "line": line})
+                frames.append(entry)
+            return frame_index[frame]
+
+        end_ms = ((self.ended or time.perf_counter()) - self.started) * 1000
+        weighted = self._weighted_samples()
+        profiles = [{
+            "type": "sampled",
+            "name": f"{self.name} (hilo {self.thread_name})",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": round(end_ms, 3),
+            "samples": [[index(frame) for frame in stack] for stack, _ in weighted],
+            "weights": [round(weight * 1000, 3) for _, weight in weighted]
+        }]
+
+        # Un perfil por hilo con sus llamadas externas (dentro de un hilo no se solapan)
+        by_thread = {}
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s[2])
+        for thread_name, label, start, end in spans:
+            by_thread.setdefault(thread_name, []).append((label, start, end))
+        for thread_name, thread_spans in sorted(by_thread.items()):
+            events = []
+            last = 0.0
+            for label, start, end in thread_spans:
+                at_open = max(last, (start - self.started) * 1000)
+                at_close = max(at_open, min(end_ms, (end - self.started) * 1000))
+                frame = index((f"[{label}]", "", 0))
+                events.append({"type": "O", "frame": frame, "at": round(at_open, 3)})
+                events.append({"type": "C", "frame": frame, "at": round(at_close, 3)})
+                last = at_close
+            profiles.append({
+                "type": "evented",
+                "name": f"Llamadas externas (hilo {thread_name})",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(max(end_ms, last), 3),
+                "events": events
+            })
+
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": title,
+            "exporter": "zaino-web",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles
+        }
+
+    def _sample(self):
+        last = self.started
+        deadline = self.started + self.max_duration
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None or now > deadline:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append((last, now, tuple(stack)))
+            last = now
+
+    def _weighted_samples(self):
+        """[(pila, segundos)] con el marco de la llamada externa en curso agregado como hoja"""
+        with self._lock:
+            own_spans = [(label, start, end) for thread_name, label, start, end in self.spans
+                         if thread_name == self.thread_name]
+        weighted = []
+        for previous, at, stack in self.samples:
+            span = next((label for label, start, end in own_spans if start <= at <= end), None)
+            if span:
+                stack = stack + ((f"[{span}]", "", 0),)
+            weighted.append((stack, at - previous))
+        return weighted
+
+    def _foreign_spans(self):
+        with self._lock:
+            return [span for span in self.spans if span[0] != self.thread_name]
+
+    @staticmethod
+    def _frame_label(frame):
+        name, filename, line = frame
+        if not filename:
+            return name
+        return f"{name} ({os.path.basename(filename)}:{line})".replace(';', ',')
+
+    @staticmethod
+    def _write_atomic(path, content):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+def rotate_profiles(directory, max_profiles):
+    """Elimina los perfiles más antiguos hasta dejar ``max_profiles`` (por ID, que empieza con la fecha)"""
+    profiles = {}
+    for filename in os.listdir(directory):
+        for suffix in ('.speedscope.json', '.folded'):
+            if filename.endswith(suffix):
+                profiles.setdefault(filename[:-len(suffix)], []).append(filename)
+    for profile_id in sorted(profiles)[:max(0, len(profiles) - max_profiles)]:
+        for filename in profiles[profile_id]:
+            try:
+                os.remove(os.path.join(directory, filename))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,326 @@
+# shared_cache.py
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from filelock import FileLock
+
+from app.utils import config
+
+
+class MemoryBackend:
+    """
+    Caché clave/valor en memoria del proceso (backend por defecto).
+
+    Interfaz común de los backends:
+
+    - ``get(key)`` -> ``(valor, stored_at)`` o None si no existe o venció
+    - ``set(key, value, ttl)`` -> ``stored_at`` o None si no se pudo guardar
+    - ``add(key, value, ttl)`` -> True solo si la clave no existía (o venció);
+      sirve como lease entre procesos
+    - ``delete(key)``
+    - ``get_stats()``
+
+    Los valores deben poder serializarse a JSON y no deben modificarse
+    después de guardarlos o leerlos.
+    """
+
+    # Indica si el contenido es visible para otros procesos
+    shared = False
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        # Estadísticas
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= now:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._store(key, value, now, ttl)
+        return now
+
+    def add(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > now:
+                return False
+            self._store(key, value, now, ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "entries": len(self._entries)
+            }
+
+    def _store(self, key, value, now, ttl):
+        self._entries[key] = (value, now, now + ttl)
+        self._entries.move_to_end(key)
+        self.writes += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# Encabezado del archivo: magic, número de slots y tamaño de slot
+FILE_MAGIC = b'ZCACHE01'
+FILE_HEADER = struct.Struct('<8sII')
+FILE_HEADER_SIZE = 64
+# Encabezado de cada slot: secuencia, hash de la clave, guardado, vence, largo
+SLOT_HEADER = struct.Struct('<Q16sddI4x')
+SEQ = struct.Struct('<Q')
+# Slots vecinos que se revisan antes de reemplazar el slot propio de la clave
+MAX_PROBES = 8
+
+
+class MmapBackend:
+    """
+    Caché clave/valor en un archivo mapeado en memoria, compartido por
+    todos los workers del mismo host.
+
+    El archivo tiene ``slots`` ranuras de ``slot_size`` bytes. Cada clave
+    ocupa una ranura (hash con sondeo lineal) con su valor en JSON. Las
+    lecturas no toman locks: cada ranura tiene un contador de secuencia
+    (seqlock) que el escritor deja impar mientras escribe, y el lector
+    reintenta si el contador cambió durante la copia. Las escrituras entre
+    procesos se serializan con un lock de archivo.
+
+    Los valores que no caben en una ranura no se guardan.
+    """
+
+    shared = True
+
+    def __init__(self, path, slots=256, slot_size=65536):
+        self.path = os.path.normpath(path)
+        self.slots = slots
+        self.slot_size = slot_size
+        self.max_value_size = slot_size - SLOT_HEADER.size
+        self._lock = threading.Lock()
+        self._file_lock = None
+        self._file_lock_pid = None
+        # clave -> (slot, secuencia, valor, stored_at, expires_at) ya decodificado
+        self._decoded = {}
+
+        # Estadísticas
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.oversize = 0
+        self.read_retries = 0
+
+        size = FILE_HEADER_SIZE + slots * slot_size
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._writer_lock():
+            with open(self.path, 'a+b') as f:
+                f.seek(0)
+                header = f.read(FILE_HEADER.size)
+                if len(header) < FILE_HEADER.size or FILE_HEADER.unpack(header) != (FILE_MAGIC, slots, slot_size):
+                    # Archivo nuevo o con otra geometría: empezar vacío
+                    f.truncate(0)
+                    f.truncate(size)
+                    f.seek(0)
+                    f.write(FILE_HEADER.pack(FILE_MAGIC, slots, slot_size))
+                    f.flush()
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    def get(self, key):
+        digest = self._digest(key)
+        now = time.time()
+        for slot in self._probe(digest):
+            entry = self._read(slot, key, digest)
+            if entry is None:
+                continue
+            value, stored_at, expires_at = entry
+            if expires_at <= now:
+                break
+            self.hits += 1
+            return value, stored_at
+        self.misses += 1
+        return None
+
+    def set(self, key, value, ttl):
+        payload = self._encode(value)
+        if payload is None:
+            return None
+        digest = self._digest(key)
+        with self._lock, self._writer_lock():
+            return self._write(self._slot_for_write(digest), digest, payload, ttl)
+
+    def add(self, key, value, ttl):
+        payload = self._encode(value)
+        if payload is None:
+            return False
+        digest = self._digest(key)
+        with self._lock, self._writer_lock():
+            slot = self._slot_for_write(digest)
+            _, slot_digest, _, expires_at, _ = self._header(slot)
+            if slot_digest == digest and expires_at > time.time():
+                return False
+            self._write(slot, digest, payload, ttl)
+            return True
+
+    def delete(self, key):
+        digest = self._digest(key)
+        with self._lock, self._writer_lock():
+            for slot in self._probe(digest):
+                if self._header(slot)[1] == digest:
+                    self._write(slot, digest, b'', 0)
+                    return
+
+    def get_stats(self):
+        return {
+            "backend": "mmap",
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "oversize": self.oversize,
+            "read_retries": self.read_retries,
+            "slots": self.slots,
+            "slot_size": self.slot_size
+        }
+
+    def _writer_lock(self):
+        # El mapa sobrevive a un fork (gunicorn --preload), pero el lock de
+        # archivo debe crearse en cada proceso
+        if self._file_lock_pid != os.getpid():
+            self._file_lock = FileLock(self.path + '.lock', timeout=10)
+            self._file_lock_pid = os.getpid()
+        return self._file_lock
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+    def _probe(self, digest):
+        home = int.from_bytes(digest[:8], 'little') % self.slots
+        return [(home + i) % self.slots for i in range(MAX_PROBES)]
+
+    def _offset(self, slot):
+        return FILE_HEADER_SIZE + slot * self.slot_size
+
+    def _header(self, slot):
+        return SLOT_HEADER.unpack_from(self._map, self._offset(slot))
+
+    def _encode(self, value):
+        payload = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if len(payload) > self.max_value_size:
+            self.oversize += 1
+            return None
+        return payload
+
+    def _read(self, slot, key, digest):
+        """Lectura con seqlock; retorna (valor, stored_at, expires_at) o None si el slot es de otra clave"""
+        offset = self._offset(slot)
+        for _ in range(100):
+            seq = SEQ.unpack_from(self._map, offset)[0]
+            if seq & 1:
+                # Escritura en curso
+                self.read_retries += 1
+                time.sleep(0)
+                continue
+
+            cached = self._decoded.get(key)
+            if cached and cached[0] == slot and cached[1] == seq:
+                return cached[2], cached[3], cached[4]
+
+            _, slot_digest, stored_at, expires_at, length = SLOT_HEADER.unpack_from(self._map, offset)
+            payload = self._map[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + length]
+            if SEQ.unpack_from(self._map, offset)[0] != seq:
+                self.read_retries += 1
+                continue
+            if slot_digest != digest:
+                return None
+            if not length:
+                return None, stored_at, 0.0
+            value = json.loads(payload)
+            if len(self._decoded) > self.slots * 2:
+                self._decoded.clear()
+            self._decoded[key] = (slot, seq, value, stored_at, expires_at)
+            return value, stored_at, expires_at
+        return None
+
+    def _slot_for_write(self, digest):
+        """Slot de la clave, o el primero libre/vencido, o el slot propio si no hay ninguno"""
+        now = time.time()
+        candidates = self._probe(digest)
+        free = None
+        for slot in candidates:
+            _, slot_digest, _, expires_at, _ = self._header(slot)
+            if slot_digest == digest:
+                return slot
+            if free is None and expires_at <= now:
+                free = slot
+        return free if free is not None else candidates[0]
+
+    def _write(self, slot, digest, payload, ttl):
+        offset = self._offset(slot)
+        # Secuencia impar: los lectores esperan hasta que termine la escritura
+        # (ya es impar si un proceso murió a mitad de una escritura)
+        odd = SEQ.unpack_from(self._map, offset)[0] | 1
+        SEQ.pack_into(self._map, offset, odd)
+        now = time.time()
+        self._map[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + len(payload)] = payload
+        SLOT_HEADER.pack_into(self._map, offset, odd, digest, now, now + ttl, len(payload))
+        SEQ.pack_into(self._map, offset, odd + 1)
+        self.writes += 1
+        return now
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """
+    Retorna el backend de caché configurado para el proceso
+
+    ``SHARED_CACHE_BACKEND=memory`` (por defecto) mantiene cada worker con
+    su propia caché; ``mmap`` la comparte entre todos los workers del host
+    mediante el archivo ``SHARED_CACHE_PATH``.
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                settings = config.load_config()
+                backend = settings.get('SHARED_CACHE_BACKEND')
+                if backend == 'mmap':
+                    _shared_cache = MmapBackend(settings.get('SHARED_CACHE_PATH'))
+                else:
+                    if backend != 'memory':
+                        print(f"SHARED_CACHE_BACKEND desconocido '{backend}', usando memoria del proceso")
+                    _shared_cache = MemoryBackend()
+    return _shared_cache
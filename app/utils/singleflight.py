@@ -0,0 +1,116 @@
+# singleflight.py
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+
+    El primer hilo que llega (líder) ejecuta la función; los demás esperan
+    su resultado hasta ``timeout`` segundos en lugar de repetir el trabajo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+        # Contadores
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def do(self, key, fn, timeout=None):
+        """
+        Ejecuta ``fn`` una sola vez por clave entre los hilos concurrentes
+
+        Args:
+            key (str): Clave que identifica el trabajo
+            fn (callable): Función sin argumentos a ejecutar
+            timeout (float): Segundos máximos de espera para los no líderes
+
+        Returns:
+            tuple: (resultado, shared) donde shared indica si se reutilizó
+            el resultado de otro hilo
+
+        Raises:
+            TimeoutError: Si el líder no terminó dentro de ``timeout``
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.event.wait(timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise TimeoutError(f"Tiempo de espera agotado para '{key}'")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+    def start(self, key, fn):
+        """
+        Ejecuta ``fn`` en un hilo aparte si no hay otra llamada en curso
+
+        Args:
+            key (str): Clave que identifica el trabajo
+            fn (callable): Función sin argumentos a ejecutar
+
+        Returns:
+            bool: True si se inició una nueva ejecución
+        """
+        with self._lock:
+            if key in self._calls:
+                return False
+            call = _Call()
+            self._calls[key] = call
+            self.leaders += 1
+
+        def run():
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+                print(f"Error en ejecución en segundo plano '{key}': {e}")
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+    def get_stats(self):
+        """Retorna los contadores de líderes, peticiones agrupadas y timeouts"""
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+                "in_flight": len(self._calls)
+            }
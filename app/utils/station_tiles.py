@@ -0,0 +1,220 @@
+# station_tiles.py
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils.singleflight import SingleFlight
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.195
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distancia en km entre dos coordenadas"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def station_location(station):
+    """
+    Extrae (id, lat, lon) de una estación retornada por Weathercloud
+
+    Returns:
+        tuple: (id, lat, lon) o None si la estación no trae coordenadas
+    """
+    if not isinstance(station, dict):
+        return None
+    station_id = station.get('code') or station.get('id') or station.get('device')
+    lat = station.get('lat', station.get('latitude'))
+    lon = station.get('lon', station.get('lng', station.get('longitude')))
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if station_id is None:
+        station_id = f"{lat:.5f},{lon:.5f}"
+    return str(station_id), lat, lon
+
+
+class NearestStationsCache:
+    """
+    Índice espacial de las estaciones cercanas, dividido en celdas de grilla.
+
+    El mapa se divide en celdas de ``tile_deg`` grados. La primera vez que
+    una consulta toca una celda se pide a Weathercloud un círculo que la
+    cubre entera y sus estaciones se guardan en la celda. Las consultas
+    siguientes (aunque cambien un poco las coordenadas o el radio) se
+    responden filtrando por distancia haversine las estaciones de las
+    celdas que intersectan el círculo, sin ir a Weathercloud.
+
+    Si la respuesta no trae coordenadas por estación no se puede indexar y
+    la consulta se envía tal cual.
+    """
+
+    # Consultas que tocan más celdas se envían directamente a Weathercloud
+    MAX_TILES_PER_QUERY = 16
+
+    def __init__(self, fetch, tile_deg=0.25, ttl=3600, max_tiles=512):
+        """
+        Args:
+            fetch (callable): ``fetch(lat, lon, radius)`` que consulta Weathercloud
+            tile_deg (float): Tamaño de la celda en grados
+            ttl (float): Segundos que una celda se considera vigente
+            max_tiles (int): Máximo de celdas en memoria (LRU)
+        """
+        self.fetch = fetch
+        self.tile_deg = tile_deg
+        self.ttl = ttl
+        self.max_tiles = max_tiles
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        # celda -> (vence, {id: (lat, lon, estación)})
+        self._tiles = OrderedDict()
+        # Pasa a False si Weathercloud no entrega coordenadas por estación
+        self.indexable = True
+
+        # Estadísticas
+        self.local_hits = 0
+        self.tile_fetches = 0
+        self.passthrough = 0
+        self.evictions = 0
+
+    def query(self, lat, lon, radius):
+        """
+        Estaciones a ``radius`` km o menos de (lat, lon), de la más cercana a la más lejana
+
+        Args:
+            lat (float): Latitud
+            lon (float): Longitud
+            radius (float): Radio en km
+
+        Returns:
+            list: Estaciones (o el error de Weathercloud si la consulta falla)
+        """
+        tiles = self.tiles_for(lat, lon, radius)
+        if not self.indexable or not tiles or len(tiles) > self.MAX_TILES_PER_QUERY:
+            self.passthrough += 1
+            return self.fetch(lat, lon, radius)
+
+        missing = [tile for tile in tiles if not self._is_covered(tile)]
+        for tile in missing:
+            result, _ = self._flight.do(tile, lambda tile=tile: self._fetch_tile(tile), timeout=30)
+            if result is not True:
+                if isinstance(result, list):
+                    # Estaciones sin coordenadas: no se pueden filtrar localmente
+                    self.passthrough += 1
+                    return self.fetch(lat, lon, radius)
+                return result
+        if not missing:
+            self.local_hits += 1
+
+        found = []
+        with self._lock:
+            for tile in tiles:
+                entry = self._tiles.get(tile)
+                if entry is None:
+                    continue
+                self._tiles.move_to_end(tile)
+                for s_lat, s_lon, station in entry[1].values():
+                    distance = haversine_km(lat, lon, s_lat, s_lon)
+                    if distance <= radius:
+                        found.append((distance, station))
+
+        found.sort(key=lambda item: item[0])
+        return [self._with_distance(station, distance) for distance, station in found]
+
+    def tiles_for(self, lat, lon, radius):
+        """Celdas (fila, columna) que intersectan el círculo de la consulta"""
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180) or radius < 0:
+            return []
+        dlat = radius / KM_PER_DEGREE
+        # Cerca de los polos el círculo abarca todas las longitudes
+        cos_lat = math.cos(math.radians(min(89.0, abs(lat) + dlat)))
+        dlon = min(180.0, radius / (KM_PER_DEGREE * cos_lat))
+
+        rows = range(self._index(max(-90.0, lat - dlat)), self._index(min(90.0, lat + dlat)) + 1)
+        cols = range(self._index(lon - dlon), self._index(lon + dlon) + 1)
+        return sorted({(row, col % self._columns()) for row in rows for col in cols})
+
+    def get_stats(self):
+        """Retorna consultas resueltas localmente, celdas descargadas y celdas en memoria"""
+        return {
+            "local_hits": self.local_hits,
+            "tile_fetches": self.tile_fetches,
+            "passthrough": self.passthrough,
+            "evictions": self.evictions,
+            "tiles": len(self._tiles)
+        }
+
+    def _index(self, degrees):
+        return int(math.floor(degrees / self.tile_deg))
+
+    def _columns(self):
+        return int(round(360 / self.tile_deg))
+
+    def _tile_of(self, lat, lon):
+        return self._index(lat), self._index(lon) % self._columns()
+
+    def _is_covered(self, tile):
+        with self._lock:
+            entry = self._tiles.get(tile)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def _fetch_tile(self, tile):
+        """
+        Descarga las estaciones de una celda
+
+        Returns:
+            True si la celda quedó indexada; si no, la respuesta de Weathercloud
+        """
+        if self._is_covered(tile):
+            return True
+
+        row, col = tile
+        lat_min = row * self.tile_deg
+        lon_min = col * self.tile_deg
+        if lon_min >= 180:
+            lon_min -= 360
+        center_lat = lat_min + self.tile_deg / 2
+        center_lon = lon_min + self.tile_deg / 2
+        # Radio que cubre la celda completa (media diagonal, medida en el borde más ancho)
+        half_height = self.tile_deg / 2 * KM_PER_DEGREE
+        half_width = half_height * math.cos(math.radians(min(abs(lat_min), abs(lat_min + self.tile_deg))))
+        radius = math.ceil(math.hypot(half_height, half_width)) + 1
+
+        stations = self.fetch(center_lat, center_lon, radius)
+        self.tile_fetches += 1
+        if not isinstance(stations, list):
+            return stations
+
+        indexed = {}
+        for station in stations:
+            location = station_location(station)
+            if location is None:
+                self.indexable = False
+                print("Weathercloud no entrega coordenadas por estación; búsqueda de cercanas sin índice")
+                return stations
+            station_id, s_lat, s_lon = location
+            # El círculo también trae estaciones de las celdas vecinas
+            if self._tile_of(s_lat, s_lon) == tile:
+                indexed[station_id] = (s_lat, s_lon, station)
+
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._tiles[tile] = (expires, indexed)
+            self._tiles.move_to_end(tile)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    @staticmethod
+    def _with_distance(station, distance):
+        # La distancia de Weathercloud es relativa al centro de la celda
+        if 'distance' in station:
+            station = dict(station, distance=round(distance, 2))
+        return station
@@ -0,0 +1,211 @@
+# upstream_scheduler.py
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value):
+    """
+    Interpreta la cabecera ``Retry-After`` (segundos o fecha HTTP)
+
+    Returns:
+        float: Segundos a esperar o None si no viene o no es válida
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class UpstreamScheduler:
+    """
+    Regula las llamadas a un servicio externo según su cuota y sus fallos.
+
+    - Token bucket: como máximo ``rate`` peticiones por segundo, con ráfagas
+      de hasta ``burst``. Las peticiones sin presupuesto se rechazan (o
+      esperan hasta ``max_wait`` segundos) en lugar de provocar un 429.
+    - Tras un 429/503 no se envía nada hasta que pase el ``Retry-After``;
+      sin cabecera, o ante errores de red/5xx, la espera crece de forma
+      exponencial con jitter.
+    - Circuit breaker: con ``failure_threshold`` fallos consecutivos el
+      circuito se abre durante ``reset_timeout`` segundos y las peticiones
+      se rechazan de inmediato. Después pasa una sola petición de prueba
+      (half-open): si tiene éxito el circuito se cierra, si no se reabre.
+
+    Con ``shared_cache`` las esperas impuestas por el servicio (429) se
+    publican para que los demás workers también las respeten.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, rate, burst=None, failure_threshold=5, reset_timeout=30,
+                 base_backoff=1.0, max_backoff=60.0, jitter=0.2, shared_cache=None, name="upstream"):
+        """
+        Args:
+            rate (float): Peticiones por segundo permitidas
+            burst (int): Tamaño del bucket (por defecto ``rate``)
+            failure_threshold (int): Fallos consecutivos que abren el circuito
+            reset_timeout (float): Segundos que el circuito permanece abierto
+            base_backoff (float): Espera tras el primer fallo sin ``Retry-After``
+            max_backoff (float): Espera máxima entre reintentos
+            jitter (float): Variación aleatoria relativa de las esperas
+            shared_cache: Backend de ``shared_cache.py`` (opcional)
+            name (str): Nombre usado en los logs y en la clave compartida
+        """
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, rate))
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.shared_cache = shared_cache if shared_cache is not None and shared_cache.shared else None
+        self.name = name
+        self.shared_key = f"{name}:cooldown"
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._state = self.CLOSED
+        self._opened_until = 0.0
+        self._probe_in_flight = False
+        self._cooldown_until = 0.0
+        self._consecutive_failures = 0
+
+        # Estadísticas
+        self.allowed = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.opened = 0
+
+    def acquire(self, max_wait=0.0):
+        """
+        Reserva presupuesto para una petición
+
+        Args:
+            max_wait (float): Segundos que se puede esperar a que el bucket se recargue
+
+        Returns:
+            tuple: (permitido, segundos hasta poder reintentar)
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                blocked = self._blocked_for_locked(now)
+                if blocked:
+                    self.rejected += 1
+                    return False, blocked
+                self._refill_locked(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    if self._state == self.HALF_OPEN:
+                        self._probe_in_flight = True
+                    self.allowed += 1
+                    return True, 0.0
+                wait = (1 - self._tokens) / self.rate
+                if now + wait > deadline:
+                    self.throttled += 1
+                    return False, wait
+            time.sleep(wait)
+
+    def blocked_for(self):
+        """Segundos que faltan para que el circuito o el ``Retry-After`` permitan enviar (0 si ya se puede)"""
+        with self._lock:
+            return self._blocked_for_locked(time.monotonic())
+
+    def record(self, status_code, retry_after=None):
+        """
+        Registra el resultado de una petición enviada
+
+        Args:
+            status_code (int): Código HTTP o None si falló la conexión
+            retry_after (str): Cabecera ``Retry-After`` de la respuesta
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._probe_in_flight = False
+            if status_code is not None and status_code < 500 and status_code != 429:
+                if self._state != self.CLOSED:
+                    print(f"Circuito de {self.name} cerrado")
+                self._state = self.CLOSED
+                self._consecutive_failures = 0
+                return
+
+            self.failures += 1
+            self._consecutive_failures += 1
+            delay = parse_retry_after(retry_after) if status_code in (429, 503) else None
+            if delay is None:
+                delay = min(self.max_backoff, self.base_backoff * 2 ** (self._consecutive_failures - 1))
+                delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+            self._cooldown_until = max(self._cooldown_until, now + delay)
+
+            if status_code == 429:
+                self.rate_limited += 1
+                # El bucket local estaba sobrestimando el presupuesto
+                self._tokens = 0.0
+                if self.shared_cache:
+                    self.shared_cache.set(self.shared_key, time.time() + delay, delay)
+
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                    print(f"Circuito de {self.name} abierto por {self.reset_timeout}s "
+                          f"tras {self._consecutive_failures} fallos consecutivos")
+                self._state = self.OPEN
+                self._opened_until = now + max(self.reset_timeout, delay)
+
+    def get_stats(self):
+        """Retorna el estado del circuito, el presupuesto disponible y los contadores"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill_locked(now)
+            retry_in = self._blocked_for_locked(now)
+            return {
+                "state": self._state,
+                "retry_in": round(retry_in, 2),
+                "budget": {
+                    "remaining": round(self._tokens, 2),
+                    "capacity": self.burst,
+                    "rate_per_second": self.rate
+                },
+                "consecutive_failures": self._consecutive_failures,
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "throttled": self.throttled,
+                "failures": self.failures,
+                "rate_limited": self.rate_limited,
+                "opened": self.opened
+            }
+
+    def _refill_locked(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _blocked_for_locked(self, now):
+        if self._state == self.OPEN:
+            if now < self._opened_until:
+                return self._opened_until - now
+            # Se acabó la espera: dejar pasar una petición de prueba
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self._state == self.HALF_OPEN and self._probe_in_flight:
+            return 1.0
+
+        cooldown = self._cooldown_until - now
+        if self.shared_cache:
+            entry = self.shared_cache.get(self.shared_key)
+            if entry:
+                cooldown = max(cooldown, entry[0] - time.time())
+        return max(0.0, cooldown)
@@ -0,0 +1,151 @@
+# visit_counter.py
+import atexit
+import json
+import os
+import sqlite3
+import threading
+
+
+class VisitCounter:
+    """
+    Contador de visitas que suma en memoria y guarda en lotes.
+
+    Cada visita solo incrementa un contador local. Un hilo en segundo plano
+    vuelca lo pendiente cada ``flush_interval`` segundos (y una última vez
+    al terminar el proceso) con un ``UPDATE total = total + n`` en SQLite
+    (WAL), que es atómico entre workers: el total guardado siempre es la
+    suma exacta de las visitas de todos los procesos.
+
+    El número que se muestra es el total guardado en el último volcado más
+    las visitas pendientes del propio worker.
+    """
+
+    def __init__(self, db_path, flush_interval=2.0, legacy_json=None):
+        """
+        Args:
+            db_path (str): Ruta de la base SQLite
+            flush_interval (float): Segundos entre volcados
+            legacy_json (str): ``visitas.json`` antiguo desde el que importar el total inicial
+        """
+        self.db_path = os.path.normpath(db_path)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+        # Estadísticas
+        self.flushes = 0
+        self.flush_errors = 0
+
+        self._init_db(legacy_json)
+        self._total = self._read_total()
+
+    def increment(self):
+        """
+        Registra una visita
+
+        Returns:
+            int: Número de visitas a mostrar
+        """
+        self._ensure_started()
+        with self._lock:
+            self._pending += 1
+            return self._total + self._pending
+
+    def total(self):
+        """Total de visitas conocido por este worker (guardadas + pendientes)"""
+        with self._lock:
+            return self._total + self._pending
+
+    def flush(self):
+        """Guarda las visitas pendientes; retorna cuántas se guardaron"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, 0
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=10)
+                try:
+                    with conn:
+                        if pending:
+                            conn.execute("UPDATE visitas SET total = total + ? WHERE id = 1", (pending,))
+                        total = conn.execute("SELECT total FROM visitas WHERE id = 1").fetchone()[0]
+                finally:
+                    conn.close()
+            except Exception as e:
+                # Se reintenta en el próximo volcado
+                with self._lock:
+                    self._pending += pending
+                self.flush_errors += 1
+                print(f"Error al guardar visitas: {e}")
+                return 0
+
+            with self._lock:
+                self._total = total
+            if pending:
+                self.flushes += 1
+            return pending
+
+    def stop(self):
+        """Detiene el hilo de volcado y guarda lo pendiente"""
+        self._stop.set()
+        self.flush()
+
+    def get_stats(self):
+        """Retorna el total, las visitas pendientes y los volcados realizados"""
+        with self._lock:
+            return {
+                "total": self._total + self._pending,
+                "pending": self._pending,
+                "flushes": self.flushes,
+                "flush_errors": self.flush_errors
+            }
+
+    def _ensure_started(self):
+        # El hilo se crea con la primera visita, ya dentro del worker
+        # (no en el proceso maestro antes de hacer fork)
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="visitas-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _init_db(self, legacy_json):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS visitas (id INTEGER PRIMARY KEY CHECK (id = 1), total INTEGER NOT NULL)")
+                # INSERT OR IGNORE: solo el primer worker importa el total antiguo
+                conn.execute(
+                    "INSERT OR IGNORE INTO visitas (id, total) VALUES (1, ?)",
+                    (self._legacy_total(legacy_json),)
+                )
+        finally:
+            conn.close()
+
+    def _read_total(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            return conn.execute("SELECT total FROM visitas WHERE id = 1").fetchone()[0]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _legacy_total(legacy_json):
+        if not legacy_json or not os.path.exists(legacy_json):
+            return 0
+        try:
+            with open(legacy_json, 'r') as f:
+                return int(json.load(f).get('num_visitas', 0))
+        except Exception as e:
+            print(f"No se pudo leer {legacy_json}: {e}")
+            return 0
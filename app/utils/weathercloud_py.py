@@ -1,45 +1,230 @@
 # weathercloud_py.py
 import requests
-import json
-import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import wraps
+from requests.adapters import HTTPAdapter
 from app.utils import config
+from app.utils.station_tiles import NearestStationsCache
+from app.utils.shared_cache import get_shared_cache
+from app.utils.metrics import observe_upstream
+
+
+class StationCache:
+    """
+    Caché LRU en memoria de las respuestas de Weathercloud por estación.
+
+    Cada método tiene su propio TTL (los valores en vivo cambian cada pocos
+    minutos; el perfil y la información casi nunca). El límite es por número
+    de estaciones: al superarlo se descarta la estación usada hace más
+    tiempo con todas sus entradas. Los IDs inválidos se guardan aparte para
+    que no desplacen a estaciones reales.
+
+    Con ``backend`` (ver ``shared_cache.py``) las respuestas también se
+    publican para los demás workers y se consultan allí antes de ir a
+    Weathercloud.
+
+    Los valores se comparten entre peticiones y no deben modificarse.
+    """
+
+    def __init__(self, ttls, max_stations=256, negative_ttl=3600, backend=None):
+        self.ttls = dict(ttls)
+        self.max_stations = max_stations
+        self.negative_ttl = negative_ttl
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._negative = OrderedDict()
+
+        # Estadísticas
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self.shared_hits = 0
+        self.method_stats = {method: {"hits": 0, "misses": 0} for method in self.ttls}
+
+    def get(self, station_id, method):
+        """
+        Busca una respuesta vigente
+
+        Args:
+            station_id (str): ID de la estación
+            method (str): Nombre del método ('weather', 'profile', ...)
+
+        Returns:
+            tuple: (encontrado, valor)
+        """
+        now = time.monotonic()
+        with self._lock:
+            expires = self._negative.get(station_id)
+            if expires is not None:
+                if expires > now:
+                    self.negative_hits += 1
+                    return True, {"error": "ID inválido"}
+                del self._negative[station_id]
+
+            station = self._entries.get(station_id)
+            entry = station.get(method) if station else None
+            if entry and entry[0] > now:
+                self._entries.move_to_end(station_id)
+                self.hits += 1
+                self.method_stats.setdefault(method, {"hits": 0, "misses": 0})["hits"] += 1
+                return True, entry[1]
+
+        shared = self._get_shared(station_id, method)
+        with self._lock:
+            stats = self.method_stats.setdefault(method, {"hits": 0, "misses": 0})
+            if shared is not None:
+                self.shared_hits += 1
+                stats["hits"] += 1
+                return True, shared
+            self.misses += 1
+            stats["misses"] += 1
+            return False, None
+
+    def set(self, station_id, method, value):
+        """Guarda una respuesta con el TTL del método (no se guarda si el TTL es 0)"""
+        ttl = self.ttls.get(method, 0)
+        if ttl <= 0 or self.max_stations <= 0:
+            return
+        self._store_local(station_id, method, value, ttl)
+        if self.backend:
+            self.backend.set(f"weathercloud:{method}:{station_id}", value, ttl)
+
+    def set_invalid(self, station_id):
+        """Recuerda que un ID no es válido"""
+        if self.negative_ttl <= 0 or self.max_stations <= 0:
+            return
+        with self._lock:
+            self._negative[station_id] = time.monotonic() + self.negative_ttl
+            self._negative.move_to_end(station_id)
+            while len(self._negative) > self.max_stations:
+                self._negative.popitem(last=False)
+
+    def _get_shared(self, station_id, method):
+        """Respuesta publicada por otro worker; se copia a la caché local por el tiempo que le queda"""
+        if not self.backend:
+            return None
+        entry = self.backend.get(f"weathercloud:{method}:{station_id}")
+        if entry is None:
+            return None
+        value, stored_at = entry
+        remaining = self.ttls.get(method, 0) - (time.time() - stored_at)
+        if remaining <= 0:
+            return None
+        self._store_local(station_id, method, value, remaining)
+        return value
+
+    def _store_local(self, station_id, method, value, ttl):
+        with self._lock:
+            station = self._entries.setdefault(station_id, {})
+            station[method] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(station_id)
+            while len(self._entries) > self.max_stations:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Descarta todas las entradas"""
+        with self._lock:
+            self._entries.clear()
+            self._negative.clear()
+
+    def get_stats(self):
+        """Retorna aciertos, fallos, desalojos y estaciones en memoria"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "shared_hits": self.shared_hits,
+                "evictions": self.evictions,
+                "stations": len(self._entries),
+                "invalid_ids": len(self._negative),
+                "methods": {method: dict(counts) for method, counts in self.method_stats.items()},
+                "ttls": dict(self.ttls)
+            }
+
+
+def cached_by_station(method):
+    """
+    Sirve las llamadas ``fn(self, id_)`` desde ``self.cache``
+
+    Solo se guardan respuestas correctas; los errores se reintentan en la
+    siguiente llamada, salvo "ID inválido", que se recuerda aparte.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(self, id_):
+            found, value = self.cache.get(id_, method)
+            if found:
+                return value
+            value = fn(self, id_)
+            if isinstance(value, dict) and "error" in value:
+                if value["error"] == "ID inválido":
+                    self.cache.set_invalid(id_)
+            else:
+                self.cache.set(id_, method, value)
+            return value
+        return wrapper
+    return decorator
+
 
 class WeathercloudAPI:
     BASE_URL = "https://app.weathercloud.net"
+    # (conexión, lectura) en segundos para todas las peticiones a Weathercloud
+    DEFAULT_TIMEOUT = (3.05, 10)
+    POOL_SIZE = 10
+    # Segundos sin llamadas exitosas tras los que se vuelve a hacer login
+    SESSION_IDLE_TIMEOUT = 1800
+    # Margen antes del vencimiento de la cookie para renovar la sesión
+    COOKIE_EXPIRY_MARGIN = 60
     
-    def __init__(self):
+    def __init__(self, timeout=None):
         settings = config.load_config()
         
+        self.timeout = timeout or self.DEFAULT_TIMEOUT
         self.session = requests.Session()
+        # Pool de conexiones keep-alive compartido por todos los hilos
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.POOL_SIZE)
+        self.session.mount("https://", adapter)
         self.session.headers.update({
             "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
             "X-Requested-With": "XMLHttpRequest"
         })
+        self._login_lock = threading.Lock()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Cambia en cada login; permite que varios hilos con la sesión
+        # vencida hagan un solo login
+        self._login_generation = 0
+        self._session_expires = None
+        self._last_success = 0.0
         self.cookie = None
         self.email = settings.get('WEATHERCLOUD_EMAIL', '')
         self.password = settings.get('WEATHERCLOUD_PASSWORD', '')
         self.is_authenticated = False
+        self.cache = StationCache({
+            "weather": settings.get('WEATHERCLOUD_TTL_WEATHER', 120),
+            "profile": settings.get('WEATHERCLOUD_TTL_PROFILE', 86400),
+            "infos": settings.get('WEATHERCLOUD_TTL_INFOS', 86400),
+            "statistics": settings.get('WEATHERCLOUD_TTL_STATISTICS', 600),
+            "wind": settings.get('WEATHERCLOUD_TTL_WIND', 300)
+        }, max_stations=settings.get('WEATHERCLOUD_CACHE_STATIONS', 256), backend=self._shared_backend())
+        self.nearest = NearestStationsCache(self._fetch_nearest, ttl=settings.get('WEATHERCLOUD_TTL_NEAREST', 3600))
+        
+        # Estadísticas
+        self.logins = 0
+        self.relogins = 0
+        self.probes_avoided = 0
+        self.auth_failures = 0
         
         if not self.email or not self.password:
             raise ValueError("WEATHERCLOUD_EMAIL y WEATHERCLOUD_PASSWORD son requeridos en .env")
     
-    def is_authenticated_session(self):
-        """
-        Verifica si la sesión actual está autenticada
-        
-        Returns:
-            bool: True si la sesión está autenticada
-        """
-        if not self.cookie:
-            return False
-            
-        try:
-            # Intenta hacer una petición simple para verificar la sesión
-            response = self.session.get(f"{self.BASE_URL}/profile")
-            return response.status_code == 200
-        except:
-            return False
-
     def login(self, email=None, password=None, store_credentials=True):
         """
         Inicia sesión en Weathercloud
@@ -65,11 +250,17 @@ class WeathercloudAPI:
                 "rememberMe": "1" if store_credentials else "0"
             }
             
-            response = self.session.post(f"{self.BASE_URL}/signin", data=data, allow_redirects=False)
+            start = time.perf_counter()
+            response = self.session.post(f"{self.BASE_URL}/signin", data=data, allow_redirects=False, timeout=self.timeout)
+            observe_upstream("weathercloud", "signin", str(response.status_code), start)
             
             if response.status_code == 200 or response.status_code == 302:
                 self.cookie = response.cookies.get_dict()
                 self.is_authenticated = True
+                self._session_expires = self._cookie_expiry()
+                self._last_success = time.time()
+                self._login_generation += 1
+                self.logins += 1
                 if store_credentials:
                     self.credentials = {"email": email, "password": password}
                 return {"success": True, "error": None}
@@ -100,15 +291,121 @@ class WeathercloudAPI:
         """
         Asegura que la sesión está autenticada, intenta re-autenticar si es necesario
         
+        La validez se decide localmente (vencimiento de la cookie y última
+        llamada exitosa), sin consultar /profile. Si la sesión vence antes
+        de lo esperado, ``_request`` lo detecta y repite el login.
+        
         Returns:
             dict: {"success": bool, "error": str or None}
         """
-        if self.is_authenticated and self.is_authenticated_session():
+        if self._session_valid():
+            self.probes_avoided += 1
             return {"success": True, "error": None}
             
-        # Intentar login
-        return self.login()
+        # Intentar login (un solo hilo a la vez; los demás reutilizan la sesión)
+        with self._login_lock:
+            if self._session_valid():
+                return {"success": True, "error": None}
+            if self.is_authenticated:
+                self.relogins += 1
+            return self.login()
+
+    @staticmethod
+    def _shared_backend():
+        # Con el backend en memoria la caché local ya cumple ese papel
+        backend = get_shared_cache()
+        return backend if backend.shared else None
 
+    def get_stats(self):
+        """Retorna los contadores de login y de verificaciones de sesión evitadas"""
+        expires_in = None
+        if self._session_expires is not None:
+            expires_in = round(self._session_expires - time.time(), 1)
+        return {
+            "authenticated": self._session_valid(),
+            "logins": self.logins,
+            "relogins": self.relogins,
+            "probes_avoided": self.probes_avoided,
+            "auth_failures": self.auth_failures,
+            "cookie_expires_in": expires_in,
+            "cache": self.cache.get_stats(),
+            "nearest": self.nearest.get_stats()
+        }
+
+    def _session_valid(self):
+        if not self.is_authenticated:
+            return False
+        now = time.time()
+        if self._session_expires is not None and now >= self._session_expires - self.COOKIE_EXPIRY_MARGIN:
+            return False
+        return now - self._last_success < self.SESSION_IDLE_TIMEOUT
+
+    def _cookie_expiry(self):
+        """Vencimiento más próximo de las cookies de la sesión (None si son de sesión)"""
+        expiries = [c.expires for c in self.session.cookies if c.expires]
+        return min(expiries) if expiries else None
+
+    @staticmethod
+    def _needs_login(response):
+        """Indica si Weathercloud rechazó la petición por falta de sesión"""
+        if response.status_code == 401:
+            return True
+        if 300 <= response.status_code < 400 and '/signin' in response.headers.get('Location', ''):
+            return True
+        # Redirecciones ya seguidas por requests
+        return bool(response.history) and '/signin' in response.url
+
+    def _relogin(self, generation):
+        """
+        Repite el login tras un rechazo por sesión vencida
+        
+        Si otro hilo ya hizo login desde que se envió la petición
+        (``generation`` cambió), se reutiliza esa sesión.
+        """
+        with self._login_lock:
+            if self._login_generation != generation:
+                return {"success": True, "error": None}
+            self.is_authenticated = False
+            self.relogins += 1
+            return self.login()
+
+    def _request(self, method, url, endpoint, **kwargs):
+        """
+        Petición a Weathercloud que repite el login y reintenta una vez si la sesión venció
+        
+        Args:
+            method (str): Método HTTP
+            url (str): URL completa
+            endpoint (str): Nombre del endpoint en las métricas
+        
+        Returns:
+            requests.Response: Respuesta final
+        """
+        generation = self._login_generation
+        response = self._send(method, url, endpoint, **kwargs)
+        if self._needs_login(response):
+            self.auth_failures += 1
+            if self._relogin(generation)["success"]:
+                response = self._send(method, url, endpoint, **kwargs)
+        if response.status_code == 200:
+            self._last_success = time.time()
+        return response
+
+    def _send(self, method, url, endpoint, **kwargs):
+        """Envía la petición y registra su duración en las métricas"""
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        except requests.Timeout:
+            observe_upstream("weathercloud", endpoint, "timeout", start)
+            raise
+        except requests.RequestException:
+            observe_upstream("weathercloud", endpoint, "error", start)
+            raise
+        observe_upstream("weathercloud", endpoint, str(response.status_code), start)
+        return response
+
+    @cached_by_station('weather')
     def get_weather(self, id_):
         """
         Obtiene datos meteorológicos actuales
@@ -130,7 +427,7 @@ class WeathercloudAPI:
                 return {"error": "ID inválido"}
             
             url = f"{self.BASE_URL}/{id_type}/values"
-            response = self.session.post(url, params={"code": id_})
+            response = self._request('POST', url, 'values', params={"code": id_})
             
             if response.status_code == 200:
                 data = response.json()
@@ -148,7 +445,8 @@ class WeathercloudAPI:
                     "weatherAvg": None
                 }
                 
-                # Corregir visibilidad si está presente
+                # Corregir visibilidad si está presente (el resultado se guarda
+                # en caché ya corregido, así que no se vuelve a escalar)
                 if "vis" in data and isinstance(data["vis"], (int, float)):
                     data["vis"] = data["vis"] * 100
                 
@@ -159,6 +457,64 @@ class WeathercloudAPI:
         except Exception as e:
             return {"error": str(e)}
     
+    def get_weather_batch(self, ids, timeout=8):
+        """
+        Obtiene los datos meteorológicos de varias estaciones en paralelo
+        
+        Las estaciones se consultan en un pool de hilos acotado que comparte
+        la sesión (un solo login para todo el lote). Las que no responden
+        dentro de ``timeout`` se reportan como error; su respuesta queda en
+        caché cuando llegue.
+        
+        Args:
+            ids (list): IDs de estaciones o METAR
+            timeout (float): Tiempo total máximo en segundos
+            
+        Returns:
+            tuple: (resultados {id: datos}, errores {id: mensaje})
+        """
+        results = {}
+        errors = {}
+        valid = []
+        for id_ in dict.fromkeys(i.strip() for i in ids if i and i.strip()):
+            if self.check_id(id_):
+                valid.append(id_)
+            else:
+                errors[id_] = "ID inválido"
+        if not valid:
+            return results, errors
+        
+        auth_result = self.ensure_authenticated()
+        if not auth_result["success"]:
+            for id_ in valid:
+                errors[id_] = f"Error de autenticación: {auth_result['error']}"
+            return results, errors
+        
+        futures = {self._get_executor().submit(self.get_weather, id_): id_ for id_ in valid}
+        done, _ = wait(futures, timeout=timeout)
+        for future, id_ in futures.items():
+            if future not in done:
+                errors[id_] = "Tiempo de espera agotado"
+                continue
+            try:
+                data = future.result()
+            except Exception as e:
+                data = {"error": str(e)}
+            if isinstance(data, dict) and "error" in data:
+                errors[id_] = data["error"]
+            else:
+                results[id_] = data
+        return results, errors
+    
+    def _get_executor(self):
+        # Tantos hilos como conexiones del pool HTTP
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.POOL_SIZE, thread_name_prefix="weathercloud")
+        return self._executor
+    
+    @cached_by_station('profile')
     def get_profile(self, id_):
         """
         Obtiene el perfil de una estación
@@ -175,7 +531,7 @@ class WeathercloudAPI:
                 return {"error": "ID inválido"}
             
             url = f"{self.BASE_URL}/{id_type}/ajaxprofile"
-            response = self.session.post(url, data={"d": id_})
+            response = self._request('POST', url, 'profile', data={"d": id_})
             
             if response.status_code == 200:
                 data = response.json()
@@ -186,6 +542,7 @@ class WeathercloudAPI:
         except Exception as e:
             return {"error": str(e)}
     
+    @cached_by_station('infos')
     def get_infos(self, id_):
         """
         Obtiene información general de una estación
@@ -202,7 +559,7 @@ class WeathercloudAPI:
                 return {"error": "ID inválido"}
             
             url = f"{self.BASE_URL}/{id_type}/info/{id_}"
-            response = self.session.post(url)
+            response = self._request('POST', url, 'info')
             
             if response.status_code == 200:
                 return response.json()
@@ -210,6 +567,7 @@ class WeathercloudAPI:
         except Exception as e:
             return {"error": str(e)}
     
+    @cached_by_station('wind')
     def get_wind(self, id_):
         """
         Obtiene datos históricos de viento
@@ -226,7 +584,7 @@ class WeathercloudAPI:
                 return {"error": "ID inválido"}
             
             url = f"{self.BASE_URL}/{id_type}/wind"
-            response = self.session.post(url, params={"code": id_})
+            response = self._request('POST', url, 'wind', params={"code": id_})
             
             if response.status_code == 200:
                 data = response.json()
@@ -249,6 +607,7 @@ class WeathercloudAPI:
         except Exception as e:
             return {"error": str(e)}
     
+    @cached_by_station('statistics')
     def get_statistics(self, id_):
         """
         Obtiene estadísticas de la estación
@@ -265,7 +624,7 @@ class WeathercloudAPI:
                 return {"error": "ID inválido"}
             
             url = f"{self.BASE_URL}/{id_type}/stats"
-            response = self.session.post(url, data={"code": id_})
+            response = self._request('POST', url, 'statistics', data={"code": id_})
             
             if response.status_code == 200:
                 return response.json()
@@ -277,6 +636,9 @@ class WeathercloudAPI:
         """
         Obtiene estaciones cercanas a una ubicación
         
+        Se responde desde el índice por celdas de ``self.nearest``; solo se
+        consulta Weathercloud por las celdas que aún no están cubiertas.
+        
         Args:
             lat (float): Latitud
             lon (float): Longitud
@@ -285,12 +647,38 @@ class WeathercloudAPI:
         Returns:
             list: Lista de estaciones cercanas
         """
+        return self.nearest.query(lat, lon, radius)
+    
+    def _fetch_nearest(self, lat, lon, radius):
+        """Consulta a Weathercloud las estaciones cercanas (sin caché)"""
         try:
             url = f"{self.BASE_URL}/page/coordinates/latitude/{lat}/longitude/{lon}/distance/{radius}"
-            response = self.session.post(url)
+            response = self._request('POST', url, 'nearest')
             
             if response.status_code == 200:
                 return response.json()
             return {"error": "Error en la solicitud"}
         except Exception as e:
             return {"error": str(e)}
+
+
+# Cliente compartido por todo el proceso
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+def get_weathercloud_client():
+    """
+    Retorna el cliente de Weathercloud compartido por todas las peticiones
+
+    Reutiliza la misma sesión HTTP (conexiones keep-alive y cookies de
+    autenticación), así que solo se hace login cuando la sesión lo requiere.
+
+    Raises:
+        ValueError: Si faltan WEATHERCLOUD_EMAIL o WEATHERCLOUD_PASSWORD
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = WeathercloudAPI()
+    return _shared_client
@@ -0,0 +1,293 @@
+"""
+Servidores locales que imitan Arduino IoT Cloud y Weathercloud
+
+Responden con la misma forma que los servicios reales a las rutas que usa
+la aplicación, con latencia configurable y, para Arduino, una fracción de
+respuestas 429 con ``Retry-After``. Cuentan las llamadas recibidas por
+endpoint para poder comparar cuántas llegan al servicio en cada escenario.
+
+Uso independiente (para probar la aplicación a mano):
+    python benchmarks/fake_upstreams.py --arduino-port 8601 --weathercloud-port 8602
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FLOWMETER_THING = "Medidor de Flujo"
+
+
+class FakeServer:
+    """Servidor HTTP/1.1 (keep-alive) en un hilo, con latencia y contadores por endpoint"""
+
+    def __init__(self, port=0, latency_ms=0.0, jitter_ms=0.0, seed=1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.random = random.Random(seed)
+        self.calls = {}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = {}
+
+    def snapshot_calls(self):
+        with self._lock:
+            return dict(sorted(self.calls.items()))
+
+    def count(self, endpoint, status):
+        key = f"{endpoint} {status}"
+        with self._lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+    def delay(self):
+        with self._lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        delay = max(0.0, self.latency_ms + jitter) / 1000
+        if delay:
+            time.sleep(delay)
+
+    def handle(self, handler, method):
+        """Retorna (endpoint, estado, cuerpo, cabeceras extra)"""
+        raise NotImplementedError
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.body = self.rfile.read(length) if length else b''
+                server.delay()
+                endpoint, status, body, headers = server.handle(self, method)
+                server.count(endpoint, status)
+                payload = json.dumps(body).encode('utf-8') if body is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+        return Handler
+
+
+class FakeArduino(FakeServer):
+    """
+    Imita ``api2.arduino.cc``: token OAuth2, listado de things y propiedades
+
+    ``rate_limit_ratio`` es la fracción de peticiones a la API v2 que
+    responden 429 con ``Retry-After: retry_after``.
+    """
+
+    def __init__(self, port=0, latency_ms=0.0, jitter_ms=0.0, extra_devices=0, rate_limit_ratio=0.0,
+                 retry_after=1, token_ttl=300, seed=1):
+        super().__init__(port, latency_ms, jitter_ms, seed)
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.token_ttl = token_ttl
+        self.things = [{"id": "thing-flujometro", "name": FLOWMETER_THING}] + [
+            {"id": f"thing-{i}", "name": f"Dispositivo {i}"} for i in range(1, extra_devices + 1)
+        ]
+        self._tokens = set()
+
+    @property
+    def api_url(self):
+        return f"{self.url}/iot/v2"
+
+    @property
+    def token_url(self):
+        return f"{self.url}/iot/v1/clients/token"
+
+    def devices_config(self):
+        """Valor de ``ARDUINO_DEVICES`` para los things de este servidor"""
+        devices = [{"id": "flujometro", "thing": FLOWMETER_THING, "properties": ["instflow", "constflow"]}]
+        devices += [{"thing": t["name"], "properties": ["nivel", "presion"]} for t in self.things[1:]]
+        return json.dumps(devices)
+
+    def handle(self, handler, method):
+        path = urlparse(handler.path).path
+        if method == 'POST' and path == '/iot/v1/clients/token':
+            token = f"fake-{len(self._tokens) + 1}"
+            with self._lock:
+                self._tokens.add(token)
+            return 'token', 200, {"access_token": token, "token_type": "Bearer", "expires_in": self.token_ttl}, None
+
+        endpoint = 'properties' if path.endswith('/properties') else 'things'
+        auth = handler.headers.get('Authorization', '')
+        if auth[len('Bearer '):] not in self._tokens:
+            return endpoint, 401, {"detail": "unauthorized"}, None
+        with self._lock:
+            limited = self.rate_limit_ratio and self.random.random() < self.rate_limit_ratio
+        if limited:
+            return endpoint, 429, {"detail": "rate limit"}, {'Retry-After': str(self.retry_after)}
+
+        if path == '/iot/v2/things':
+            return endpoint, 200, self.things, None
+        match = re.fullmatch(r'/iot/v2/things/([^/]+)/properties', path)
+        if match and any(t["id"] == match.group(1) for t in self.things):
+            return endpoint, 200, self._properties(match.group(1)), None
+        return endpoint, 404, {"detail": "not found"}, None
+
+    @staticmethod
+    def _properties(thing_id):
+        # Los valores cambian cada segundo, como un dispositivo que reporta seguido
+        now = time.time()
+        updated_at = datetime.fromtimestamp(int(now), timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        if thing_id == "thing-flujometro":
+            values = {"instFlow": round(100000 + (now % 86400) / 6, 2), "constFlow": round(12 + 3 * math.sin(now / 300), 2)}
+        else:
+            values = {"nivel": round(50 + 10 * math.sin(now / 120), 2), "presion": round(2 + math.cos(now / 90), 2)}
+        return [
+            {"id": f"{thing_id}-{name.lower()}", "name": name, "last_value": value, "value_updated_at": updated_at}
+            for name, value in values.items()
+        ]
+
+
+class FakeWeathercloud(FakeServer):
+    """
+    Imita ``app.weathercloud.net``: login con cookie, valores, perfil,
+    información, viento, estadísticas y estaciones cercanas
+    """
+
+    # Separación de la grilla de estaciones ficticias, en grados
+    STATION_SPACING = 0.1
+
+    def __init__(self, port=0, latency_ms=0.0, jitter_ms=0.0, seed=1):
+        super().__init__(port, latency_ms, jitter_ms, seed)
+        self._sessions = set()
+
+    def handle(self, handler, method):
+        parsed = urlparse(handler.path)
+        path = parsed.path
+        if path == '/signin' and method == 'GET':
+            # Página de login a la que redirigen las peticiones sin sesión
+            return 'signin_page', 200, None, None
+        if path == '/signin':
+            session = f"s{len(self._sessions) + 1}"
+            with self._lock:
+                self._sessions.add(session)
+            return 'signin', 302, None, {
+                'Location': '/',
+                'Set-Cookie': f'PHPSESSID={session}; Path=/; Max-Age=86400'
+            }
+
+        endpoint = self._endpoint(path)
+        cookie = handler.headers.get('Cookie', '')
+        if not any(f'PHPSESSID={s}' in cookie for s in self._sessions):
+            return endpoint, 302, None, {'Location': '/signin'}
+
+        code = (parse_qs(parsed.query).get('code') or parse_qs(handler.body.decode()).get('code')
+                or parse_qs(handler.body.decode()).get('d') or [path.rsplit('/', 1)[-1]])[0]
+        if endpoint == 'values':
+            return endpoint, 200, {"temp": 18.5, "dew": 9.1, "hum": 54, "bar": 1016.2, "wspd": 3.4,
+                                   "wdir": 220, "rain": 0, "vis": 120, "station": code}, None
+        if endpoint == 'profile':
+            return endpoint, 200, {"followers": 12, "name": f"Estación {code}", "views": 3400}, None
+        if endpoint == 'info':
+            return endpoint, 200, {"name": f"Estación {code}", "elevation": 520, "model": "WS-2902"}, None
+        if endpoint == 'wind':
+            return endpoint, 200, [{"date": int(time.time()), "values": {"scale": [i % 5 for i in range(16)]}}
+                                   for _ in range(4)], None
+        if endpoint == 'statistics':
+            return endpoint, 200, {"temp": {"max": 24.1, "min": 8.3}, "rain": {"day": 0, "month": 32.4}}, None
+        if endpoint == 'nearest':
+            return endpoint, 200, self._nearest(path), None
+        if endpoint == 'profile_check':
+            return endpoint, 200, {}, None
+        return endpoint, 404, None, None
+
+    @staticmethod
+    def _endpoint(path):
+        if path.startswith('/page/coordinates/'):
+            return 'nearest'
+        if path == '/profile':
+            return 'profile_check'
+        for suffix, name in (('/values', 'values'), ('/ajaxprofile', 'profile'), ('/wind', 'wind'),
+                             ('/stats', 'statistics')):
+            if path.endswith(suffix):
+                return name
+        return 'info' if '/info/' in path else 'other'
+
+    def _nearest(self, path):
+        match = re.search(r'latitude/([-\d.]+)/longitude/([-\d.]+)/distance/([\d.]+)', path)
+        lat, lon, radius = (float(v) for v in match.groups())
+        dlat = radius / 111.195
+        dlon = radius / (111.195 * max(0.01, math.cos(math.radians(lat))))
+        step = self.STATION_SPACING
+        stations = []
+        for i in range(math.floor((lat - dlat) / step), math.ceil((lat + dlat) / step) + 1):
+            for j in range(math.floor((lon - dlon) / step), math.ceil((lon + dlon) / step) + 1):
+                s_lat, s_lon = round(i * step, 4), round(j * step, 4)
+                distance = _haversine_km(lat, lon, s_lat, s_lon)
+                if distance <= radius:
+                    stations.append({"code": f"d{abs(i) * 100000 + abs(j):010d}", "lat": s_lat, "lon": s_lon,
+                                     "name": f"Estación {i},{j}", "distance": round(distance, 2)})
+        stations.sort(key=lambda s: s["distance"])
+        return stations
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * 6371.0088 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--arduino-port', type=int, default=8601)
+    parser.add_argument('--weathercloud-port', type=int, default=8602)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.0)
+    args = parser.parse_args()
+
+    arduino = FakeArduino(args.arduino_port, args.latency_ms, args.jitter_ms,
+                          rate_limit_ratio=args.rate_limit_ratio).start()
+    weathercloud = FakeWeathercloud(args.weathercloud_port, args.latency_ms, args.jitter_ms).start()
+    print(f"Arduino IoT Cloud falso en {arduino.url}; Weathercloud falso en {weathercloud.url} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        arduino.stop()
+        weathercloud.stop()
+
+
+if __name__ == '__main__':
+    main()
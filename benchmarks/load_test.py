@@ -0,0 +1,568 @@
+"""
+Prueba de carga de las rutas de ``api_controller.py``
+
+Levanta servidores falsos de Arduino IoT Cloud y Weathercloud
+(``fake_upstreams.py``) con latencia y 429 configurables, arranca la
+aplicación en un subproceso apuntando a ellos, con ``informes/``,
+historial y contador de visitas en un directorio temporal, y recorre cada
+ruta con N clientes concurrentes (lazo cerrado: cada cliente envía la
+siguiente petición al recibir la respuesta).
+
+Por escenario reporta throughput, p50/p95/p99, códigos de estado y las
+llamadas que llegaron a los servicios falsos. La salida es JSON con claves
+ordenadas para poder comparar corridas con ``diff``.
+
+Uso:
+    python benchmarks/load_test.py [--concurrency 16] [--requests 500] [--informes 5000]
+                                   [--upstream-latency-ms 80] [--arduino-429-ratio 0.05]
+                                   [--scenarios informes,weather_batch] [--output resultado.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_upstreams import FakeArduino, FakeWeathercloud  # noqa: E402
+
+ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Centro de la zona usada en /api/weather/nearest (Santiago)
+NEAREST_CENTER = (-33.45, -70.66)
+# Vigencia de la caché del flujómetro en api_controller.py
+FLOWMETER_CACHE_TTL = 8
+# Segundos máximos de espera del primer evento SSE
+STREAM_TIMEOUT = 20
+# Segundos máximos de espera a que la aplicación dé de baja a los clientes SSE
+# cerrados (lo detecta al fallar el siguiente heartbeat)
+STREAM_IDLE_TIMEOUT = 30
+
+
+class Scenario:
+    """
+    Una ruta a medir
+
+    ``target(i, rng)`` retorna ``(path, cabeceras)`` de la petición i;
+    ``expect`` son los códigos de estado que no cuentan como error.
+    """
+
+    def __init__(self, name, method, target, expect=(200,), concurrency=None, requests=None,
+                 stream=False, arduino_429_ratio=None, warmup=True, settle=0, require=None,
+                 idle_streams=False):
+        self.name = name
+        self.method = method
+        self.target = target
+        self.expect = set(expect)
+        self.concurrency = concurrency
+        self.requests = requests
+        self.stream = stream
+        self.arduino_429_ratio = arduino_429_ratio
+        self.warmup = warmup
+        # Segundos de espera antes de empezar (por ejemplo, a que venza una caché)
+        self.settle = settle
+        # (servicio, estado) que debe aparecer en las llamadas a los servicios falsos
+        self.require = require
+        # Esperar, antes de ``settle``, a que no queden clientes SSE: mientras
+        # haya alguno su poller mantiene fresca la caché del flujómetro
+        self.idle_streams = idle_streams
+
+
+def percentile(sorted_values, fraction):
+    """Percentil por rango más cercano sobre valores ordenados"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def seed_informes(informes_dir, count, rng):
+    """
+    Crea ``count`` informes con el formato de ``/api/informes/generar``, uno por día hacia atrás
+
+    Se omite el mes actual para que ``generar`` pueda crear uno nuevo.
+    """
+    os.makedirs(informes_dir, exist_ok=True)
+    ids = []
+    fecha = datetime.now().replace(day=1, hour=8, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    for _ in range(count):
+        fecha_inicio = (fecha.replace(day=1) - timedelta(days=1)).replace(day=1)
+        total = round(rng.uniform(50_000, 400_000), 2)
+        informe = {
+            'nombre': 'Informe de Caudal - Último Mes',
+            'fecha_generacion': fecha.strftime('%d/%m/%Y %H:%M:%S'),
+            'periodo': 'Último Mes',
+            'fecha_inicio': fecha_inicio.strftime('%d/%m/%Y'),
+            'fecha_fin': fecha.strftime('%d/%m/%Y'),
+            'mes_anio': f"{fecha.month}/{fecha.year}",
+            'datos': {
+                'flujo_instantaneo': round(rng.uniform(5, 20), 2),
+                'flujo_acumulado': round(rng.uniform(1e5, 1e6), 2),
+                'promedio_diario': round(total / 30, 2)
+            },
+            'estadisticas': {
+                'total_litros': total,
+                'promedio_lmin': round(rng.uniform(5, 15), 2),
+                'pico_lmin': round(rng.uniform(20, 40), 2),
+                'fecha_pico': fecha_inicio.strftime('%d/%m/%Y 07:15'),
+                'dia_mayor_consumo': fecha_inicio.strftime('%d/%m/%Y'),
+                'litros_dia_mayor_consumo': round(total / 12, 2),
+                'dias_con_datos': 30,
+                'muestras': 43200,
+                'perfil_horario': [round(rng.uniform(0, 20), 2) for _ in range(24)],
+                'meses': []
+            }
+        }
+        informe_id = f"informe_{fecha.strftime('%Y%m%d_%H%M%S')}"
+        with open(os.path.join(informes_dir, f"{informe_id}.json"), 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        ids.append(informe_id)
+        fecha -= timedelta(days=1)
+    return ids
+
+
+def seed_history(history_dir, days, interval=60):
+    """
+    Llena el historial con ``days`` días de muestras cada ``interval`` segundos
+
+    Importa ``app``, así que se ejecuta en el subproceso (``--seed-history``)
+    con el mismo entorno que la aplicación.
+    """
+    sys.path.insert(0, ROOT_DIR)
+    from app.utils.flow_history import FlowHistory
+
+    history = FlowHistory(history_dir)
+    end = int(time.time()) - interval
+    start = end - days * 86400
+    acumulado = 100_000.0
+    for ts in range(start, end, interval):
+        caudal = 10 + 5 * ((ts // 3600) % 24 in range(7, 22))
+        acumulado += caudal * interval / 60
+        history.append('constflow', ts, caudal)
+        history.append('instflow', ts, round(acumulado, 2))
+
+
+def serve(args):
+    """Modo subproceso: arranca la aplicación apuntando a los servicios falsos"""
+    import logging
+    sys.path.insert(0, ROOT_DIR)
+    os.chdir(ROOT_DIR)
+
+    from app import app
+    from app.controllers import app_controller, api_controller, metrics_controller, profiling_controller  # noqa: F401
+    from app.utils.arduino_auth import ArduinoTokenManager
+    from app.utils.arduino_client import ArduinoClient
+    from app.utils.weathercloud_py import WeathercloudAPI
+
+    ArduinoClient.BASE_URL = f"{args.arduino_url}/iot/v2"
+    ArduinoTokenManager.TOKEN_URL = f"{args.arduino_url}/iot/v1/clients/token"
+    WeathercloudAPI.BASE_URL = args.weathercloud_url
+
+    # Sin una línea de log por petición
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app.run(host='127.0.0.1', port=args.port, threaded=True)
+
+
+def app_env(arduino, workdir, stations, stale_grace):
+    """Variables de entorno de la aplicación: servicios falsos y datos en ``workdir``"""
+    env = dict(os.environ)
+    env.update({
+        'SECRET_KEY': 'benchmark',
+        'CLIENT_ID': 'benchmark',
+        'CLIENT_SECRET': 'benchmark',
+        'ARDUINO_DEVICES': arduino.devices_config(),
+        'WEATHERCLOUD_EMAIL': 'benchmark@example.com',
+        'WEATHERCLOUD_PASSWORD': 'benchmark',
+        'WEATHERCLOUD_DEVICEID': stations[0],
+        'FLOW_HISTORY_DIR': os.path.join(workdir, 'historial'),
+        'INFORMES_DIR': os.path.join(workdir, 'informes'),
+        'VISITAS_DB': os.path.join(workdir, 'visitas.sqlite3'),
+        'SHARED_CACHE_PATH': os.path.join(workdir, 'shared_cache.mmap'),
+        'FLOWMETER_STALE_GRACE': str(stale_grace),
+        # Los servicios falsos son HTTP; oauthlib exige HTTPS salvo con esta variable
+        'OAUTHLIB_INSECURE_TRANSPORT': '1',
+        'PYTHONUNBUFFERED': '1'
+    })
+    return env
+
+
+def start_app(port, arduino, weathercloud, env, log_file):
+    command = [sys.executable, os.path.abspath(__file__), '--serve', '--port', str(port),
+               '--arduino-url', arduino.url, '--weathercloud-url', weathercloud.url]
+    return subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def wait_ready(base_url, process, timeout=60):
+    """Espera a que la aplicación responda; retorna los segundos que tardó en arrancar"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"La aplicación terminó al arrancar (código {process.returncode})")
+        try:
+            requests.get(f"{base_url}/api/arduino/upstream", timeout=1)
+            return time.perf_counter() - start
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    raise RuntimeError("La aplicación no respondió a tiempo")
+
+
+def wait_streams_idle(base_url, timeout=STREAM_IDLE_TIMEOUT):
+    """Espera a que la aplicación no tenga clientes SSE; retorna los segundos esperados o None"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        stream = requests.get(f"{base_url}/api/arduino/upstream", timeout=5).json().get("stream") or {}
+        if not stream.get("subscribers"):
+            return time.perf_counter() - start
+        time.sleep(0.25)
+    return None
+
+
+def run_scenario(base_url, scenario, concurrency, total, warmup, seed):
+    """
+    Envía ``total`` peticiones con ``concurrency`` clientes
+
+    Returns:
+        dict: Resultados del escenario
+    """
+    latencies = []
+    statuses = {}
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+    rng_lock = threading.Lock()
+    rng = random.Random(seed)
+
+    def send(session, i):
+        with rng_lock:
+            path, headers = scenario.target(i, rng)
+        start = time.perf_counter()
+        if scenario.stream:
+            # Tiempo hasta el primer evento SSE (los heartbeats no cuentan)
+            with session.get(f"{base_url}{path}", headers=headers, stream=True, timeout=30) as response:
+                if response.status_code != 200:
+                    return response.status_code, time.perf_counter() - start
+                for line in response.iter_lines():
+                    if line.startswith(b'data:'):
+                        return 200, time.perf_counter() - start
+                    if time.perf_counter() - start > STREAM_TIMEOUT:
+                        break
+            return 'no_event', None
+        response = session.request(scenario.method, f"{base_url}{path}", headers=headers, timeout=30)
+        response.content
+        return response.status_code, time.perf_counter() - start
+
+    def worker():
+        nonlocal errors
+        with requests.Session() as session:
+            for i in range(warmup):
+                try:
+                    send(session, -1 - i)
+                except requests.RequestException:
+                    pass
+            barrier.wait()
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                try:
+                    status, elapsed = send(session, i)
+                except requests.RequestException as e:
+                    status, elapsed = type(e).__name__, None
+                with lock:
+                    statuses[str(status)] = statuses.get(str(status), 0) + 1
+                    if elapsed is not None:
+                        latencies.append(elapsed)
+                    if status not in scenario.expect:
+                        errors += 1
+
+    barrier = threading.Barrier(concurrency + 1)
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ms = [v * 1000 for v in latencies]
+    return {
+        "method": scenario.method,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "status": dict(sorted(statuses.items())),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(ms, 0.50), 2) if ms else None,
+            "p95": round(percentile(ms, 0.95), 2) if ms else None,
+            "p99": round(percentile(ms, 0.99), 2) if ms else None,
+            "max": round(ms[-1], 2) if ms else None,
+            "mean": round(sum(ms) / len(ms), 2) if ms else None
+        }
+    }
+
+
+def walk_cursors(base_url, limit):
+    """Recorre el listado completo de informes; retorna los cursores de cada página"""
+    cursors = [None]
+    while True:
+        params = {'limit': limit}
+        if cursors[-1]:
+            params['cursor'] = cursors[-1]
+        body = requests.get(f"{base_url}/api/informes", params=params, timeout=30).json()
+        if not body.get('next_cursor'):
+            return cursors
+        cursors.append(body['next_cursor'])
+
+
+def build_scenarios(base_url, args, stations, informe_ids):
+    """Escenarios en el orden en que se ejecutan (los que modifican datos al final)"""
+    now = int(time.time())
+    lat0, lon0 = NEAREST_CENTER
+
+    def fixed(path, headers=None):
+        return lambda i, rng: (path, headers)
+
+    def station(prefix):
+        return lambda i, rng: (f"{prefix}{rng.choice(stations)}", None)
+
+    def batch(i, rng):
+        return f"/api/weather/batch?ids={','.join(rng.sample(stations, min(10, len(stations))))}", None
+
+    def nearest(i, rng):
+        lat = round(lat0 + rng.uniform(-0.5, 0.5), 3)
+        lon = round(lon0 + rng.uniform(-0.5, 0.5), 3)
+        return f"/api/weather/nearest?lat={lat}&lon={lon}&radius={args.nearest_radius}", None
+
+    def history(span):
+        return lambda i, rng: (f"/api/arduino/flowmeter/history?series=constflow&from={now - span}&to={now}", None)
+
+    cursors = walk_cursors(base_url, 100) if informe_ids else [None]
+
+    def page(i, rng):
+        cursor = rng.choice(cursors)
+        return "/api/informes?limit=100" + (f"&cursor={cursor}" if cursor else ""), None
+
+    def informe(i, rng):
+        return f"/api/informes/{rng.choice(informe_ids)}", None
+
+    etags = {}
+    for informe_id in informe_ids[:50]:
+        etags[informe_id] = requests.get(f"{base_url}/api/informes/{informe_id}", timeout=30).headers.get('ETag')
+
+    def informe_304(i, rng):
+        informe_id = rng.choice(list(etags))
+        return f"/api/informes/{informe_id}", {'If-None-Match': etags[informe_id]}
+
+    # Los más antiguos, para no tocar los de las páginas medidas antes
+    to_delete = list(reversed(informe_ids))
+
+    def delete(i, rng):
+        return f"/api/informes/{to_delete[i] if i >= 0 else 'no_existe'}", None
+
+    stream_concurrency = min(args.concurrency, 4)
+    stream_requests = min(args.requests, 20)
+    scenarios = [
+        Scenario('arduino_flowmeter', 'GET', fixed('/api/arduino/flowmeter')),
+        Scenario('arduino_devices', 'GET', fixed('/api/arduino/devices')),
+        Scenario('arduino_upstream', 'GET', fixed('/api/arduino/upstream')),
+        Scenario('arduino_history_1h', 'GET', history(3600), expect=(200,)),
+        Scenario('arduino_history_7d', 'GET', history(7 * 86400), expect=(200,)),
+        Scenario('arduino_stream_first_event', 'GET', fixed('/api/arduino/flowmeter/stream'),
+                 concurrency=stream_concurrency, requests=stream_requests, stream=True),
+        # Sin clientes SSE del escenario anterior y con la caché vencida también para
+        # stale-while-revalidate (TTL + FLOWMETER_STALE_GRACE), para que las peticiones
+        # lleguen a Arduino y reciban 429
+        Scenario('arduino_flowmeter_429', 'GET', fixed('/api/arduino/flowmeter'), expect=(200, 429, 503),
+                 arduino_429_ratio=args.arduino_429_burst_ratio, warmup=False, idle_streams=True,
+                 settle=FLOWMETER_CACHE_TTL + args.flowmeter_stale_grace + 1, require=('arduino', '429')),
+        Scenario('weather_default', 'GET', fixed('/api/weather')),
+        Scenario('weather_station', 'GET', station('/api/weather/')),
+        Scenario('weather_profile', 'GET', station('/api/weather/profile/')),
+        Scenario('weather_statistics', 'GET', station('/api/weather/statistics/')),
+        Scenario('weather_batch', 'GET', batch),
+        Scenario('weather_nearest', 'GET', nearest),
+        Scenario('visitas', 'POST', fixed('/api/visitas')),
+        Scenario('metrics', 'GET', fixed('/metrics')),
+        Scenario('informes_list', 'GET', fixed('/api/informes')),
+        Scenario('informes_list_500', 'GET', fixed('/api/informes?limit=500')),
+        Scenario('informes_page_cursor', 'GET', page),
+        Scenario('informes_get', 'GET', informe, expect=(200,) if informe_ids else (404,)),
+        Scenario('informes_get_304', 'GET', informe_304, expect=(304,)) if etags else None,
+        Scenario('informes_generar', 'POST', fixed('/api/informes/generar'), expect=(200, 400),
+                 requests=min(args.requests, 50), warmup=False),
+        Scenario('informes_delete', 'DELETE', delete, requests=min(args.requests, len(to_delete)),
+                 warmup=False) if to_delete else None,
+    ]
+    return [s for s in scenarios if s is not None]
+
+
+def selected(name, patterns):
+    return not patterns or any(name.startswith(p) for p in patterns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=16, help='Clientes concurrentes (por defecto 16)')
+    parser.add_argument('--requests', type=int, default=500, help='Peticiones por escenario (por defecto 500)')
+    parser.add_argument('--warmup', type=int, default=2, help='Peticiones sin medir por cliente antes de cada escenario')
+    parser.add_argument('--informes', type=int, default=2000, help='Informes en informes/ (por defecto 2000)')
+    parser.add_argument('--history-days', type=int, default=7, help='Días de historial por minuto (por defecto 7)')
+    parser.add_argument('--stations', type=int, default=50, help='Estaciones distintas consultadas (por defecto 50)')
+    parser.add_argument('--devices', type=int, default=3, help='Dispositivos Arduino además del flujómetro')
+    parser.add_argument('--nearest-radius', type=int, default=25, help='Radio en km de /api/weather/nearest')
+    parser.add_argument('--upstream-latency-ms', type=float, default=50, help='Latencia de los servicios falsos')
+    parser.add_argument('--upstream-jitter-ms', type=float, default=10, help='Variación de esa latencia (±)')
+    parser.add_argument('--arduino-429-ratio', type=float, default=0.0,
+                        help='Fracción de respuestas 429 de Arduino en todos los escenarios')
+    parser.add_argument('--arduino-429-burst-ratio', type=float, default=1.0,
+                        help='Fracción de 429 durante el escenario arduino_flowmeter_429')
+    parser.add_argument('--flowmeter-stale-grace', type=float, default=30,
+                        help='FLOWMETER_STALE_GRACE de la aplicación; arduino_flowmeter_429 espera TTL + este valor')
+    parser.add_argument('--scenarios', default='', help='Prefijos de escenarios a ejecutar, separados por coma')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Archivo donde guardar el JSON (por defecto la salida estándar)')
+    # Uso interno: subproceso con la aplicación
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--seed-history', metavar='DIR', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--arduino-url', help=argparse.SUPPRESS)
+    parser.add_argument('--weathercloud-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+    if args.seed_history:
+        seed_history(args.seed_history, args.history_days)
+        return
+
+    rng = random.Random(args.seed)
+    patterns = [p.strip() for p in args.scenarios.split(',') if p.strip()]
+    stations = [f"d{1000000000 + i}" for i in range(max(1, args.stations))]
+
+    arduino = FakeArduino(latency_ms=args.upstream_latency_ms, jitter_ms=args.upstream_jitter_ms,
+                          extra_devices=args.devices, rate_limit_ratio=args.arduino_429_ratio, seed=args.seed).start()
+    weathercloud = FakeWeathercloud(latency_ms=args.upstream_latency_ms, jitter_ms=args.upstream_jitter_ms,
+                                    seed=args.seed).start()
+
+    with tempfile.TemporaryDirectory(prefix='zaino-bench-') as workdir:
+        setup = {}
+        start = time.perf_counter()
+        informe_ids = seed_informes(os.path.join(workdir, 'informes'), args.informes, rng)
+        setup["seed_informes_s"] = round(time.perf_counter() - start, 3)
+        env = app_env(arduino, workdir, stations, args.flowmeter_stale_grace)
+        if args.history_days:
+            start = time.perf_counter()
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--seed-history',
+                            os.path.join(workdir, 'historial'), '--history-days', str(args.history_days)],
+                           cwd=ROOT_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+            setup["seed_history_s"] = round(time.perf_counter() - start, 3)
+
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        log_path = os.path.join(workdir, 'app.log')
+        with open(log_path, 'wb') as log_file:
+            process = start_app(port, arduino, weathercloud, env, log_file)
+        results = {}
+        failed_checks = []
+        try:
+            setup["app_ready_s"] = round(wait_ready(base_url, process), 3)
+            # Primer listado: construye el índice de informes/ desde cero
+            start = time.perf_counter()
+            requests.get(f"{base_url}/api/informes", timeout=120)
+            setup["informes_first_list_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+            for i, scenario in enumerate(build_scenarios(base_url, args, stations, informe_ids)):
+                if not selected(scenario.name, patterns):
+                    continue
+                streams_idle_s = None
+                if scenario.idle_streams:
+                    streams_idle_s = wait_streams_idle(base_url)
+                    if streams_idle_s is None:
+                        failed_checks.append(f"{scenario.name}: quedaron clientes SSE conectados tras "
+                                             f"{STREAM_IDLE_TIMEOUT} s")
+                time.sleep(scenario.settle)
+                arduino.rate_limit_ratio = args.arduino_429_ratio if scenario.arduino_429_ratio is None \
+                    else scenario.arduino_429_ratio
+                arduino.reset_calls()
+                weathercloud.reset_calls()
+                result = run_scenario(
+                    base_url, scenario,
+                    concurrency=scenario.concurrency or args.concurrency,
+                    total=scenario.requests or args.requests,
+                    warmup=args.warmup if scenario.warmup else 0,
+                    seed=args.seed + i
+                )
+                if scenario.idle_streams:
+                    result["streams_idle_wait_s"] = round(streams_idle_s, 2) if streams_idle_s is not None else None
+                result["upstream_calls"] = {
+                    "arduino": arduino.snapshot_calls(),
+                    "weathercloud": weathercloud.snapshot_calls()
+                }
+                if scenario.require:
+                    service, status = scenario.require
+                    seen = sum(n for key, n in result["upstream_calls"][service].items() if key.endswith(f" {status}"))
+                    result["required_upstream"] = {"service": service, "status": status, "calls": seen, "ok": seen > 0}
+                    if not seen:
+                        failed_checks.append(f"{scenario.name}: ninguna respuesta {status} de {service}")
+                results[scenario.name] = result
+                print(f"{scenario.name}: {result['throughput_rps']} req/s, p95 {result['latency_ms']['p95']} ms, "
+                      f"{result['errors']} errores", file=sys.stderr)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            arduino.stop()
+            weathercloud.stop()
+
+        if process.returncode not in (0, -15) and not results:
+            with open(log_path, encoding='utf-8', errors='replace') as f:
+                print(f.read()[-4000:], file=sys.stderr)
+
+    report = {
+        "config": {k: v for k, v in sorted(vars(args).items())
+                   if k not in ('serve', 'seed_history', 'port', 'arduino_url', 'weathercloud_url', 'output')},
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "setup": setup,
+        "scenarios": results
+    }
+    output = json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if failed_checks:
+        for message in failed_checks:
+            print(f"Escenario inválido: {message}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Mide el tiempo de arranque de la aplicación
+
+Lanza varias veces un intérprete nuevo que importa ``app`` y los
+controladores (lo mismo que hace ``app.py`` antes de atender peticiones) y
+reporta mínimo, mediana y máximo en milisegundos. También mide el
+intérprete vacío como referencia y, con ``--importtime``, los módulos que
+más tardan en importarse.
+
+Uso:
+    python benchmarks/startup_time.py [--runs 10] [--importtime 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+APP_IMPORT = "import app; from app.controllers import app_controller, api_controller, metrics_controller, profiling_controller"
+CONFIG_CALLS = (
+    "import time; from app.utils import config; "
+    "t = time.perf_counter(); config._build_config(); build = time.perf_counter() - t; "
+    "t = time.perf_counter(); [config.load_config() for _ in range(1000)]; cached = (time.perf_counter() - t) / 1000; "
+    "print(build * 1000, cached * 1000)"
+)
+
+
+def run(code, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def summarize(samples):
+    return {
+        "min_ms": round(min(samples), 1),
+        "median_ms": round(statistics.median(samples), 1),
+        "max_ms": round(max(samples), 1)
+    }
+
+
+def slowest_imports(env, top):
+    """Módulos con mayor tiempo acumulado según ``python -X importtime``"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', APP_IMPORT], cwd=ROOT_DIR,
+                            env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        # Formato: "import time:  self [us] | cumulative | módulo"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|', 2)
+        rows.append((int(cumulative_us), int(self_us), module.strip()))
+    rows.sort(reverse=True)
+    return [{"module": m, "cumulative_ms": round(c / 1000, 1), "self_ms": round(s / 1000, 1)} for c, s, m in rows[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='Arranques a medir (por defecto 10)')
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help='Mostrar los N módulos que más tardan en importarse')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        # Historial aislado para no depender de los datos locales
+        env.setdefault('FLOW_HISTORY_DIR', os.path.join(tmp, 'historial'))
+
+        # Primera ejecución fuera de la medición: crea índices y archivos
+        run(APP_IMPORT, env)
+
+        interpreter = [run('pass', env) for _ in range(args.runs)]
+        startup = [run(APP_IMPORT, env) for _ in range(args.runs)]
+
+        output = subprocess.run([sys.executable, '-c', CONFIG_CALLS], cwd=ROOT_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout.split()
+        report = {
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            "interpreter": summarize(interpreter),
+            "app_startup": summarize(startup),
+            "app_startup_net_median_ms": round(statistics.median(startup) - statistics.median(interpreter), 1),
+            "load_config": {
+                "build_ms": round(float(output[-2]), 3),
+                "cached_call_ms": round(float(output[-1]), 5)
+            }
+        }
+        if args.importtime:
+            report["slowest_imports"] = slowest_imports(env, args.importtime)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# La configuración se lee una sola vez por proceso: los datos de las pruebas
+# van a un directorio temporal antes de que algún test importe ``app``
+_DATA_DIR = tempfile.mkdtemp(prefix='zaino-tests-')
+atexit.register(shutil.rmtree, _DATA_DIR, ignore_errors=True)
+
+os.environ.update({
+    'SECRET_KEY': 'tests',
+    'FLOW_HISTORY_DIR': os.path.join(_DATA_DIR, 'historial'),
+    'INFORMES_DIR': os.path.join(_DATA_DIR, 'informes'),
+    'VISITAS_DB': os.path.join(_DATA_DIR, 'visitas.sqlite3'),
+    'SHARED_CACHE_PATH': os.path.join(_DATA_DIR, 'shared_cache.mmap'),
+    'PROFILING_DIR': os.path.join(_DATA_DIR, 'perfiles'),
+})
+
+
+@pytest.fixture
+def client():
+    """Cliente de pruebas con todas las rutas y hooks registrados, como en ``app.py``"""
+    from app import app
+    # Flask no admite registrar hooks después de la primera petición
+    from app.controllers import app_controller, api_controller, metrics_controller, profiling_controller  # noqa: F401
+    return app.test_client()
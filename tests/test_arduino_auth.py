@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from app.utils import arduino_auth
+from app.utils.arduino_auth import ArduinoTokenManager
+from app.utils.shared_cache import MemoryBackend
+
+
+@pytest.fixture
+def token_server(monkeypatch):
+    """Reemplaza la petición OAuth2 y cuenta los tokens emitidos"""
+    issued = []
+
+    def fetch_token(self, **kwargs):
+        issued.append(kwargs['token_url'])
+        return {"access_token": f"token-{len(issued)}", "expires_in": 300}
+
+    monkeypatch.setattr(arduino_auth.OAuth2Session, 'fetch_token', fetch_token)
+    return issued
+
+
+def test_concurrent_callers_share_one_token(token_server):
+    manager = ArduinoTokenManager('id', 'secret')
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(manager.get_token())) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert tokens == [("token-1", None)] * 10
+    assert len(token_server) == 1
+    assert manager.get_stats()['refresh_count'] == 1
+
+
+def test_invalidate_forces_a_new_token(token_server):
+    manager = ArduinoTokenManager('id', 'secret')
+    assert manager.get_token() == ("token-1", None)
+    manager.invalidate()
+    assert manager.get_token() == ("token-2", None)
+
+
+def test_missing_credentials_do_not_call_the_api(token_server):
+    token, error = ArduinoTokenManager('', 'secret').get_token()
+    assert token is None and error
+    assert token_server == []
+
+
+def test_fetch_error_is_reported_and_counted(monkeypatch):
+    def fetch_token(self, **kwargs):
+        raise ConnectionError("sin red")
+
+    monkeypatch.setattr(arduino_auth.OAuth2Session, 'fetch_token', fetch_token)
+    manager = ArduinoTokenManager('id', 'secret')
+    token, error = manager.get_token()
+    assert token is None
+    assert "sin red" in error
+    assert manager.get_stats()['refresh_errors'] == 1
+
+
+def test_token_published_by_another_worker_is_adopted(token_server):
+    shared = MemoryBackend()
+    first = ArduinoTokenManager('id', 'secret', shared_cache=shared)
+    second = ArduinoTokenManager('id', 'secret', shared_cache=shared)
+
+    assert first.get_token() == ("token-1", None)
+    assert second.get_token() == ("token-1", None)
+    assert len(token_server) == 1
+    assert second.get_stats()['shared_adopted'] == 1
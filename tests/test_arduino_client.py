@@ -0,0 +1,116 @@
+import threading
+
+import pytest
+import requests
+
+from app.utils.arduino_client import ArduinoClient
+from app.utils.upstream_scheduler import UpstreamScheduler
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.text = str(body)
+
+    def json(self):
+        return self.body
+
+
+class FakeTokens:
+    def __init__(self):
+        self.invalidations = 0
+
+    def get_token(self):
+        return "token", None
+
+    def invalidate(self):
+        self.invalidations += 1
+
+
+def make_client(monkeypatch, send, **kwargs):
+    client = ArduinoClient(FakeTokens(), **kwargs)
+    monkeypatch.setattr(client.session, 'get', send)
+    return client
+
+
+def test_successful_response_is_returned_and_recorded(monkeypatch):
+    scheduler = UpstreamScheduler(rate=100)
+    client = make_client(monkeypatch, lambda url, **kw: FakeResponse(200, [{"id": "t1"}]), scheduler=scheduler)
+
+    assert client.list_things({}) == ([{"id": "t1"}], None, 200)
+    assert client.get_stats()["requests"] == 1
+    assert client.get_stats()["p50_ms"] is not None
+    assert scheduler.get_stats()["allowed"] == 1
+
+
+def test_timeouts_and_connection_errors_map_to_gateway_errors(monkeypatch):
+    errors = [requests.Timeout("lento"), requests.ConnectionError("caído")]
+
+    def send(url, **kw):
+        raise errors.pop(0)
+
+    client = make_client(monkeypatch, send)
+    assert client.get("/things", {})[2] == 504
+    assert client.get("/things", {})[2] == 502
+    stats = client.get_stats()
+    assert (stats["timeouts"], stats["errors"]) == (1, 1)
+
+
+def test_rejected_token_is_invalidated(monkeypatch):
+    client = make_client(monkeypatch, lambda url, **kw: FakeResponse(401, "unauthorized"))
+    response, error, status_code = client.get("/things", {})
+    assert status_code == 401 and error is None
+    assert client.tokens.invalidations == 1
+
+
+def test_rate_limit_honors_retry_after(monkeypatch):
+    scheduler = UpstreamScheduler(rate=100, failure_threshold=5)
+    client = make_client(monkeypatch, lambda url, **kw: FakeResponse(429, headers={"Retry-After": "30"}),
+                         scheduler=scheduler, max_queue_wait=0)
+
+    assert client.list_things({})[2] == 429
+    response, error, status_code = client.get("/things", {})
+    assert status_code == 503 and error["retry_after"] == 30
+    assert client.get_stats()["requests"] == 1
+
+
+def test_unexpected_error_releases_the_half_open_probe(monkeypatch):
+    scheduler = UpstreamScheduler(rate=100, failure_threshold=1, reset_timeout=0, base_backoff=0, jitter=0)
+
+    def send(url, **kw):
+        raise ValueError("cabecera inválida")
+
+    client = make_client(monkeypatch, send, scheduler=scheduler, max_queue_wait=0)
+    scheduler.record(None)
+    assert scheduler.get_stats()["state"] == UpstreamScheduler.HALF_OPEN
+
+    with pytest.raises(ValueError):
+        client.get("/things", {})
+    # La sonda fallida reabre el circuito en vez de dejarlo esperando su resultado
+    assert client.get_stats()["errors"] == 1
+    assert scheduler.get_stats()["opened"] == 2
+    assert scheduler.acquire()[0] is True
+
+
+def test_slow_request_is_hedged_and_first_answer_wins(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def send(url, **kw):
+        calls.append(url)
+        if len(calls) == 1:
+            # La primera petición queda colgada hasta que termine la prueba
+            release.wait(5)
+            return FakeResponse(200, "lenta")
+        return FakeResponse(200, "rápida")
+
+    client = make_client(monkeypatch, send, hedge=True)
+    client._latencies.extend([0.01] * ArduinoClient.HEDGE_MIN_SAMPLES)
+    try:
+        response, _, _ = client.get("/things", {})
+    finally:
+        release.set()
+    assert response.body == "rápida"
+    assert (client.hedged, client.hedge_wins) == (1, 1)
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from app.utils.arduino_devices import DeviceRegistry, load_devices
+from app.utils.shared_cache import MemoryBackend, MmapBackend
+
+DEVICES = [
+    {"id": "flujometro", "thing": "Medidor de Flujo", "properties": ["instflow"]},
+    {"id": "presion", "thing": "Sensor Presión", "properties": ["presion"]},
+]
+
+
+def test_load_devices_normalizes_ids_and_properties(tmp_path):
+    assert load_devices(None)[0]["id"] == "flujometro"
+
+    devices = load_devices(json.dumps([{"thing": "Bomba Norte #2", "properties": ["Caudal", "RPM"]}]))
+    assert devices == [{"id": "bomba-norte-2", "thing": "Bomba Norte #2", "properties": ["caudal", "rpm"]}]
+
+    path = tmp_path / "devices.json"
+    path.write_text(json.dumps(DEVICES), encoding="utf-8")
+    assert [d["id"] for d in load_devices(str(path))] == ["flujometro", "presion"]
+
+
+@pytest.mark.parametrize("spec", [
+    "[]",
+    '[{"thing": "Sin propiedades"}]',
+    '[{"thing": "A", "properties": "instflow"}]',
+    '[{"thing": "A", "properties": ["x"]}, {"thing": "a", "properties": ["y"]}]',
+])
+def test_load_devices_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        load_devices(spec)
+
+
+def test_unresolved_lists_devices_until_their_thing_is_found(tmp_path):
+    registry = DeviceRegistry(DEVICES, discovery_cache=str(tmp_path / "discovery.json"))
+    assert [d["id"] for d in registry.unresolved()] == ["flujometro", "presion"]
+
+    registry.discovery("flujometro").find_thing([{"id": "t1", "name": "Medidor de Flujo"}])
+    assert [d["id"] for d in registry.unresolved()] == ["presion"]
+    # Solo se consideran los dispositivos pedidos
+    assert registry.unresolved([DEVICES[0]]) == []
+    assert registry.get_stats()["presion"]["discovery"]["thing_id"] is None
+
+
+def test_cached_reading_expires_after_ttl():
+    registry = DeviceRegistry(DEVICES, ttl=8)
+    assert registry.get_cached("flujometro") is None
+
+    registry.set_cached("flujometro", {"instflow": 3})
+    data, age = registry.get_cached("flujometro")
+    assert data == {"instflow": 3} and age < 1
+    assert registry.get_cached("flujometro", max_age=0) is None
+    assert registry.get_cached("presion") is None
+    assert registry.get_stats()["flujometro"]["age"] < 1
+
+
+def test_readings_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "cache.mmap")
+    worker_a = DeviceRegistry(DEVICES, shared_cache=MmapBackend(path, slots=16, slot_size=1024))
+    worker_b = DeviceRegistry(DEVICES, shared_cache=MmapBackend(path, slots=16, slot_size=1024))
+
+    worker_a.set_cached("presion", {"presion": 1.5})
+    assert worker_b.get_cached("presion")[0] == {"presion": 1.5}
+    # Una lectura más nueva de otro worker reemplaza la copia local
+    worker_a.set_cached("presion", {"presion": 2.0})
+    assert worker_b.get_cached("presion")[0] == {"presion": 2.0}
+
+    # Un backend solo en memoria no se comparte
+    local = DeviceRegistry(DEVICES, shared_cache=MemoryBackend())
+    assert local.shared_cache is None
+
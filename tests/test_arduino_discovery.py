@@ -0,0 +1,52 @@
+from app.utils.arduino_discovery import ThingDiscovery
+
+THINGS = [{"id": "t-otro", "name": "Otro"}, {"id": "t-flujo", "name": "Medidor de Flujo"}]
+PROPERTIES = [
+    {"id": "p1", "name": "instFlow", "last_value": 10},
+    {"id": "p2", "name": "constFlow", "last_value": 2},
+]
+
+
+def test_resolution_is_remembered_across_restarts(tmp_path):
+    cache_path = str(tmp_path / 'discovery.json')
+    discovery = ThingDiscovery("Medidor de Flujo", ["instflow", "constflow"], cache_path=cache_path)
+    assert discovery.get_thing_id() is None
+
+    assert discovery.find_thing(THINGS)["id"] == "t-flujo"
+    mapped = discovery.map_properties(PROPERTIES)
+    assert {name: prop["id"] for name, prop in mapped.items()} == {"instflow": "p1", "constflow": "p2"}
+
+    restarted = ThingDiscovery("Medidor de Flujo", ["instflow", "constflow"], cache_path=cache_path)
+    assert restarted.get_thing_id() == "t-flujo"
+    assert restarted.get_stats()["properties"] == {"instflow": "p1", "constflow": "p2"}
+
+
+def test_property_with_a_new_id_is_found_again_by_name():
+    discovery = ThingDiscovery("Medidor de Flujo", ["instflow"])
+    discovery.find_thing(THINGS)
+    discovery.map_properties(PROPERTIES)
+
+    recreated = [{"id": "p9", "name": "instFlow", "last_value": 11}]
+    assert discovery.map_properties(recreated)["instflow"]["last_value"] == 11
+    assert discovery.get_stats()["properties"] == {"instflow": "p9"}
+
+
+def test_missing_property_or_thing_is_not_resolved():
+    discovery = ThingDiscovery("Medidor de Flujo", ["instflow", "presion"])
+    assert discovery.map_properties(PROPERTIES) is None
+    assert discovery.find_thing([{"id": "x", "name": "Otro"}]) is None
+
+    discovery.find_thing(THINGS)
+    assert discovery.map_properties(PROPERTIES) is None
+
+
+def test_invalidate_forgets_the_saved_resolution(tmp_path):
+    cache_path = str(tmp_path / 'discovery.json')
+    discovery = ThingDiscovery("Medidor de Flujo", ["instflow"], cache_path=cache_path)
+    discovery.find_thing(THINGS)
+    discovery.map_properties(PROPERTIES)
+
+    discovery.invalidate()
+    assert discovery.get_thing_id() is None
+    assert ThingDiscovery("Medidor de Flujo", ["instflow"], cache_path=cache_path).get_thing_id() is None
+    assert discovery.get_stats()["invalidations"] == 1
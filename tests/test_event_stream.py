@@ -0,0 +1,40 @@
+from app.utils.event_stream import EventBroadcaster
+
+
+def test_client_is_subscribed_only_while_the_stream_is_iterated():
+    broadcaster = EventBroadcaster(heartbeat=0.01)
+    stream = broadcaster.stream()
+    # Generador creado pero nunca iterado (cliente que se fue antes de empezar)
+    assert broadcaster.subscriber_count() == 0
+
+    assert next(stream) == ": heartbeat\n\n"
+    assert broadcaster.subscriber_count() == 1
+    stream.close()
+    assert broadcaster.subscriber_count() == 0
+
+
+def test_new_client_receives_the_last_value_and_later_changes():
+    broadcaster = EventBroadcaster(heartbeat=1)
+    broadcaster.publish({"instflow": 1})
+    stream = broadcaster.stream()
+    assert next(stream) == 'id: 1\nretry: 5000\ndata: {"instflow": 1}\n\n'
+
+    assert not broadcaster.publish({"instflow": 1})
+    assert broadcaster.publish({"instflow": 2})
+    assert next(stream) == 'id: 2\nretry: 5000\ndata: {"instflow": 2}\n\n'
+    stream.close()
+
+
+def test_slow_client_keeps_only_the_newest_events():
+    broadcaster = EventBroadcaster(queue_size=2, heartbeat=0.01)
+    stream = broadcaster.stream()
+    next(stream)
+    for value in range(5):
+        broadcaster.publish({"v": value})
+
+    assert [next(stream) for _ in range(2)] == [
+        'id: 4\nretry: 5000\ndata: {"v": 3}\n\n',
+        'id: 5\nretry: 5000\ndata: {"v": 4}\n\n',
+    ]
+    assert broadcaster.get_stats()["dropped"] == 3
+    stream.close()
@@ -0,0 +1,24 @@
+import os
+import struct
+
+from app.utils.flow_history import VALUE_FORMAT, FlowHistory, segment_name
+
+# 2025-11-03 y 2025-12-01 (UTC)
+NOV = 1762136091
+DEC = 1764547200
+
+
+def test_append_after_crash_between_val_and_ts_of_new_segment(tmp_path):
+    history = FlowHistory(str(tmp_path), series=('instflow',))
+    history.append('instflow', NOV, 1.0)
+
+    # El proceso muere tras escribir el primer valor de un segmento nuevo
+    base = os.path.join(str(tmp_path), 'instflow', segment_name(DEC))
+    with open(base + '.val', 'ab') as f:
+        f.write(struct.pack('<' + VALUE_FORMAT, 99.0))
+
+    history = FlowHistory(str(tmp_path), series=('instflow',))
+    assert history.append('instflow', DEC, 2.0)
+    assert history.append('instflow', DEC + 10, 3.0)
+
+    assert history.read('instflow') == ([NOV, DEC, DEC + 10], [1.0, 2.0, 3.0])
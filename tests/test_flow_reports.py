@@ -0,0 +1,59 @@
+import os
+from datetime import datetime
+
+from app.utils.flow_history import FlowHistory
+from app.utils.flow_reports import STATE_FILENAME, FlowReportAccumulator
+
+# Hora local, como los acumuladores
+BASE = int(datetime(2025, 3, 10, 8, 0).timestamp())
+
+
+def test_liters_come_from_counter_differences_including_resets(tmp_path):
+    accumulator = FlowReportAccumulator(str(tmp_path / STATE_FILENAME))
+    for i, value in enumerate([100.0, 150.0, 180.0, 20.0, 50.0]):
+        accumulator.ingest('instflow', BASE + i * 60, value)
+
+    summary = accumulator.summary(datetime(2025, 3, 1), datetime(2025, 3, 31))
+    # 50 + 30 + 20 (el contador se reinició desde cero) + 30
+    assert summary["total_litros"] == 130.0
+    assert summary["dia_mayor_consumo"] == "10/03/2025"
+    assert summary["ultimo_instflow"] == 50.0
+
+
+def test_flow_average_peak_and_hourly_profile(tmp_path):
+    accumulator = FlowReportAccumulator(str(tmp_path / STATE_FILENAME))
+    for i, value in enumerate([2.0, 4.0, 9.0]):
+        accumulator.ingest('constflow', BASE + i * 60, value)
+    # Repetida: no se cuenta dos veces
+    accumulator.ingest('constflow', BASE, 100.0)
+
+    summary = accumulator.summary(datetime(2025, 3, 1), datetime(2025, 3, 31))
+    assert summary["promedio_lmin"] == 5.0
+    assert summary["pico_lmin"] == 9.0
+    assert summary["fecha_pico"] == "10/03/2025 08:02"
+    assert summary["perfil_horario"][8] == 5.0
+    assert summary["muestras"] == 3
+
+
+def test_state_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / STATE_FILENAME)
+    first = FlowReportAccumulator(path)
+    second = FlowReportAccumulator(path)
+    first.ingest('constflow', BASE, 3.0)
+    second.ingest('constflow', BASE + 60, 5.0)
+
+    assert first.summary(datetime(2025, 3, 1), datetime(2025, 3, 31))["muestras"] == 2
+
+
+def test_rebuild_from_history_matches_live_ingestion(tmp_path):
+    history = FlowHistory(str(tmp_path / 'historial'))
+    live = FlowReportAccumulator(str(tmp_path / 'vivo.json'))
+    history.add_listener(live.ingest)
+    for i in range(120):
+        history.append('instflow', BASE + i * 600, 1000.0 + i * 7)
+        history.append('constflow', BASE + i * 600, float(i % 13))
+
+    rebuilt = FlowReportAccumulator(os.path.join(history.base_dir, STATE_FILENAME))
+    assert rebuilt.rebuild(history) == 240
+    period = (datetime(2025, 3, 1), datetime(2025, 3, 31))
+    assert rebuilt.summary(*period) == live.summary(*period)
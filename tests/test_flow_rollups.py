@@ -0,0 +1,86 @@
+import pytest
+
+from app.utils.flow_history import MAX_TIMESTAMP, FlowHistory
+from app.utils.flow_rollups import FlowRollups
+
+# 2025-11-30 22:00 UTC: las muestras cruzan al segmento de diciembre
+START = 1764540000
+STEP = 30
+COUNT = 4 * 3600 // STEP
+
+
+@pytest.fixture
+def rollups(tmp_path):
+    history = FlowHistory(str(tmp_path), series=('constflow',))
+    for i in range(COUNT):
+        history.append('constflow', START + i * STEP, float(i % 50))
+    return FlowRollups(history)
+
+
+def expected(start, end, bucket):
+    """Agregación directa de las muestras del fixture, en buckets completos"""
+    buckets = {}
+    for i in range(COUNT):
+        ts = START + i * STEP
+        if (start // bucket) * bucket <= ts < (end // bucket + 1) * bucket:
+            buckets.setdefault((ts // bucket) * bucket, []).append(float(i % 50))
+    keys = sorted(buckets)
+    return {
+        "t": keys,
+        "min": [min(buckets[k]) for k in keys],
+        "max": [max(buckets[k]) for k in keys],
+        "last": [buckets[k][-1] for k in keys],
+        "count": [len(buckets[k]) for k in keys],
+    }
+
+
+@pytest.mark.parametrize("bucket", [45, 60, 300, 3600, 7200])
+def test_rollups_match_raw_aggregation_across_segments(rollups, bucket):
+    end = START + COUNT * STEP
+    result = rollups.query('constflow', START, end, bucket)
+    assert {k: result[k] for k in ("t", "min", "max", "last", "count")} == expected(START, end, bucket)
+
+
+@pytest.mark.parametrize("bucket", [45, 60])
+def test_range_edges_return_whole_buckets_from_rollups_and_raw_samples(rollups, bucket):
+    start = START + 3600 + 50
+    end = START + 2 * 3600 + 10
+    result = rollups.query('constflow', start, end, bucket)
+    assert result["t"][0] == (start // bucket) * bucket
+    assert result["t"][-1] == (end // bucket) * bucket
+    assert result == {**result, **expected(start, end, bucket)}
+
+
+def test_new_samples_show_up_in_the_cached_rollup(rollups):
+    end = START + COUNT * STEP + 3600
+    before = rollups.query('constflow', START, end, 3600)
+    rollups.history.append('constflow', START + COUNT * STEP, 999.0)
+    after = rollups.query('constflow', START, end, 3600)
+
+    assert sum(after["count"]) == sum(before["count"]) + 1
+    assert after["max"][-1] == 999.0
+
+
+def test_empty_range_at_the_timestamp_limit(rollups):
+    result = rollups.query('constflow', MAX_TIMESTAMP - 3600, MAX_TIMESTAMP, 60)
+    assert result["t"] == [] and result["count"] == []
+
+
+@pytest.mark.parametrize("query", [
+    "from=100&to=50",
+    f"from=0&to={MAX_TIMESTAMP + 1}",
+    "from=0&to=3600&bucket=0",
+    "from=0&to=3600&bucket=-60",
+    "from=0&to=3600&bucket=uno",
+    "from=ayer",
+    "series=presion",
+    "from=0&to=86400000&bucket=1",
+])
+def test_history_route_rejects_invalid_ranges(client, query):
+    assert client.get(f'/api/arduino/flowmeter/history?{query}').status_code == 400
+
+
+def test_history_route_accepts_the_timestamp_limit(client):
+    response = client.get(f'/api/arduino/flowmeter/history?from={MAX_TIMESTAMP - 3600}&to={MAX_TIMESTAMP}&bucket=60')
+    assert response.status_code == 200
+    assert response.get_json()["to"] == MAX_TIMESTAMP
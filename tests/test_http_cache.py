@@ -0,0 +1,82 @@
+import gzip
+import json
+
+from werkzeug.http import parse_accept_header
+
+from app.utils.http_cache import EncodedBodyCache, choose_encoding
+
+
+def save_informe(informe_id, **content):
+    from app.controllers import api_controller
+
+    informe = {"nombre": informe_id, "periodo": "mensual", "fecha_generacion": "01/03/2025 10:00:00", **content}
+    with open(api_controller.informes_index.path_for(informe_id), 'w', encoding='utf-8') as f:
+        json.dump(informe, f)
+    api_controller.informes_index.add(informe_id, informe)
+
+
+def test_body_is_built_and_compressed_once_per_encoding():
+    cache = EncodedBodyCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return b'{"a": 1}' * 100
+
+    identity = cache.get(('informe', 'etag-1'), build)
+    compressed = cache.get(('informe', 'etag-1'), build, 'gzip')
+    assert cache.get(('informe', 'etag-1'), build, 'gzip') is compressed
+
+    assert gzip.decompress(compressed) == identity
+    assert builds == [1]
+    assert cache.get_stats() == {"hits": 1, "misses": 2, "entries": 1}
+
+
+def test_oldest_bodies_are_evicted():
+    cache = EncodedBodyCache(max_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.get(key, lambda: key.encode())
+    assert cache.get_stats()["entries"] == 2
+    assert cache.get('a', lambda: b'nuevo') == b'nuevo'
+
+
+def test_identity_when_the_client_accepts_no_known_encoding():
+    assert choose_encoding(parse_accept_header('deflate')) == 'identity'
+    assert choose_encoding(parse_accept_header('gzip, deflate')) in ('br', 'gzip')
+
+
+def test_informe_is_revalidated_with_etag_and_served_compressed(client):
+    save_informe('informe_etag', total_litros=10)
+
+    first = client.get('/api/informes/informe_etag')
+    assert first.status_code == 200
+    assert first.get_json()["informe"]["total_litros"] == 10
+    etag = first.headers['ETag']
+
+    not_modified = client.get('/api/informes/informe_etag', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+    assert not_modified.headers['ETag'] == etag
+
+    compressed = client.get('/api/informes/informe_etag', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert json.loads(gzip.decompress(compressed.data)) == first.get_json()
+
+
+def test_changed_informe_gets_a_new_etag(client):
+    save_informe('informe_cambia', total_litros=1)
+    etag = client.get('/api/informes/informe_cambia').headers['ETag']
+
+    save_informe('informe_cambia', total_litros=200)
+    response = client.get('/api/informes/informe_cambia', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()["informe"]["total_litros"] == 200
+
+
+def test_listing_etag_changes_when_an_informe_is_added(client):
+    etag = client.get('/api/informes').headers['ETag']
+    assert client.get('/api/informes', headers={'If-None-Match': etag}).status_code == 304
+
+    save_informe('informe_nuevo')
+    assert client.get('/api/informes', headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,58 @@
+import json
+import os
+
+from app.utils.informes_index import InformesIndex
+
+
+def write_informe(index, informe_id, fecha, **extra):
+    informe = {"nombre": f"Informe {informe_id}", "periodo": "mensual", "fecha_generacion": fecha, **extra}
+    with open(index.path_for(informe_id), 'w', encoding='utf-8') as f:
+        json.dump(informe, f)
+    return informe
+
+
+def test_cursor_pages_cover_every_informe_once_in_order(tmp_path):
+    index = InformesIndex(str(tmp_path))
+    # Varios informes con la misma fecha: el cursor desempata por ID
+    for i in range(23):
+        informe_id = f"informe_{i:02d}"
+        index.add(informe_id, write_informe(index, informe_id, f"{1 + i // 4:02d}/03/2025 10:00:00"))
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = index.list(limit=5, cursor=cursor)
+        seen += [(informe['timestamp'], informe['id']) for informe in page]
+        if not cursor:
+            break
+
+    assert len(seen) == 23
+    assert seen == sorted(seen, reverse=True)
+    assert index.count() == 23
+
+
+def test_files_changed_by_hand_are_reconciled(tmp_path):
+    index = InformesIndex(str(tmp_path))
+    index.add('a', write_informe(index, 'a', "01/03/2025 10:00:00"))
+    version = index.version()
+
+    write_informe(index, 'b', "02/04/2025 10:00:00")
+    os.remove(index.path_for('a'))
+    index.sync(force=True)
+
+    page, _ = index.list()
+    assert [informe['id'] for informe in page] == ['b']
+    assert index.find_by_month('4/2025')['id'] == 'b'
+    assert index.find_by_month('3/2025') is None
+    assert index.version() > version
+
+
+def test_etag_follows_the_file_content(tmp_path):
+    index = InformesIndex(str(tmp_path))
+    index.add('a', write_informe(index, 'a', "01/03/2025 10:00:00"))
+    before = index.get('a')['etag']
+
+    write_informe(index, 'a', "01/03/2025 10:00:00", total_litros=5)
+    index.sync(force=True)
+
+    assert index.get('a')['etag'] != before
+    assert index.get('no_existe') is None
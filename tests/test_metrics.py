@@ -0,0 +1,61 @@
+from app.utils.metrics import MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative_per_label_set():
+    registry = MetricsRegistry()
+    latency = registry.histogram('latencia_seconds', 'Latencia', ('route',), buckets=(0.1, 1.0))
+    latency.observe(0.05, '/a')
+    latency.observe(0.1, '/a')  # El límite es inclusivo (le)
+    latency.observe(0.5, '/a')
+    latency.observe(3.0, '/a')
+    latency.observe(0.2, '/b')
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ['# HELP latencia_seconds Latencia', '# TYPE latencia_seconds histogram']
+    assert 'latencia_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'latencia_seconds_bucket{route="/a",le="1.0"} 3' in lines
+    assert 'latencia_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latencia_seconds_sum{route="/a"} 3.65' in lines
+    assert 'latencia_seconds_count{route="/a"} 4' in lines
+    assert 'latencia_seconds_bucket{route="/b",le="0.1"} 0' in lines
+    assert 'latencia_seconds_count{route="/b"} 1' in lines
+
+
+def test_counter_labels_are_escaped():
+    registry = MetricsRegistry()
+    counter = registry.counter('peticiones_total', 'Peticiones', ('path',))
+    counter.inc('/con "comillas"\\')
+    counter.inc('/con "comillas"\\', amount=2)
+    counter.inc('/otra')
+
+    text = registry.render()
+    assert 'peticiones_total{path="/con \\"comillas\\"\\\\"} 3\n' in text
+    assert 'peticiones_total{path="/otra"} 1\n' in text
+
+
+def test_collectors_are_rendered_and_failures_skipped():
+    registry = MetricsRegistry()
+
+    def broken():
+        raise RuntimeError("sin datos")
+
+    registry.add_collector(broken)
+    registry.add_collector(lambda: [
+        ('cola_items', 'gauge', 'Items en cola', [({"cola": "informes"}, 3), ({}, 1.5)])
+    ])
+
+    assert registry.render() == (
+        '# HELP cola_items Items en cola\n'
+        '# TYPE cola_items gauge\n'
+        'cola_items{cola="informes"} 3\n'
+        'cola_items 1.5\n'
+    )
+
+
+def test_metrics_endpoint_exports_request_latency(client):
+    client.get('/api/informes')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type == MetricsRegistry.CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    assert 'zaino_http_request_duration_seconds_count{route="/api/informes",method="GET",status="200"}' in text
@@ -0,0 +1,42 @@
+import threading
+
+from app.utils.poller import BackgroundPoller
+
+
+def test_delay_doubles_after_each_failure_up_to_the_limit():
+    poller = BackgroundPoller(lambda: 200, interval=5, jitter=0, max_backoff=30)
+    delays = []
+    for failures in range(5):
+        poller.consecutive_failures = failures
+        delays.append(poller.next_delay())
+    assert delays == [5, 10, 20, 30, 30]
+
+
+def test_jitter_stays_within_bounds():
+    poller = BackgroundPoller(lambda: 200, interval=10, jitter=0.2)
+    assert all(8 <= poller.next_delay() <= 12 for _ in range(200))
+
+
+def test_failures_and_errors_are_counted_until_a_success():
+    statuses = iter([429, 'error', 200])
+    done = threading.Event()
+
+    def refresh():
+        status = next(statuses, None)
+        if status is None:
+            done.set()
+            return 200
+        if status == 'error':
+            raise RuntimeError("Arduino no responde")
+        return status
+
+    # Con interval=0 cada espera es el mínimo (0,1 s)
+    poller = BackgroundPoller(refresh, interval=0, jitter=0)
+    poller.start()
+    assert done.wait(5)
+    poller.stop()
+
+    stats = poller.get_stats()
+    assert stats['failures'] == 2
+    assert stats['consecutive_failures'] == 0
+    assert stats['last_status'] == 200
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+
+from app.utils import profiler
+from app.utils.profiler import RequestProfile, record_span
+
+
+def espera_upstream(seconds):
+    # Simula una llamada externa desde el hilo de la petición
+    start = time.perf_counter()
+    time.sleep(seconds)
+    record_span("arduino", "things", "200", start, time.perf_counter())
+
+
+def call_from_pool():
+    start = time.perf_counter()
+    time.sleep(0.01)
+    record_span("weathercloud", "station", "200", start, time.perf_counter())
+
+
+def profile_request():
+    profile = RequestProfile("GET /api/prueba", interval=0.002).start()
+    try:
+        espera_upstream(0.08)
+        worker = threading.Thread(target=call_from_pool, name="pool-1")
+        worker.start()
+        worker.join()
+    finally:
+        profile.stop()
+    return profile
+
+
+def test_collapsed_stacks_attribute_time_to_external_calls():
+    profile = profile_request()
+    assert profiler._active == []
+
+    lines = profile.collapsed().splitlines()
+    stacks = {line.rsplit(' ', 1)[0]: int(line.rsplit(' ', 1)[1]) for line in lines}
+    upstream = [s for s in stacks if 'espera_upstream' in s and s.endswith('[arduino things 200]')]
+    assert upstream
+    # Los pesos son tiempo de reloj en microsegundos
+    assert 50_000 < sum(stacks[s] for s in upstream) < 200_000
+    # La llamada del pool se agrega con el nombre de su hilo
+    assert '[hilo pool-1];[weathercloud station 200]' in stacks
+
+
+def test_speedscope_output_is_consistent():
+    profile = profile_request()
+    document = profile.speedscope("GET /api/prueba 200")
+    frames = document["shared"]["frames"]
+    sampled, *evented = document["profiles"]
+
+    assert document["$schema"] == profiler.SPEEDSCOPE_SCHEMA
+    assert len(sampled["samples"]) == len(sampled["weights"]) > 0
+    assert all(0 <= i < len(frames) for stack in sampled["samples"] for i in stack)
+
+    names = {p["name"]: p for p in evented}
+    pool = names["Llamadas externas (hilo pool-1)"]
+    assert [e["type"] for e in pool["events"]] == ["O", "C"]
+    assert frames[pool["events"][0]["frame"]]["name"] == "[weathercloud station 200]"
+    assert pool["events"][0]["at"] <= pool["events"][1]["at"] <= pool["endValue"]
+
+
+def test_record_span_without_active_profiles_is_a_no_op():
+    record_span("arduino", "things", "200", 0.0, 1.0)
+    assert profiler._active == []
+
+
+def test_write_keeps_only_the_newest_profiles(tmp_path):
+    directory = str(tmp_path / "perfiles")
+    ids = []
+    for _ in range(3):
+        profile = RequestProfile("GET /api/informes").start()
+        profile.stop()
+        ids.append(profile.write(directory, max_profiles=2, status=200))
+        time.sleep(0.001)
+
+    assert sorted(os.listdir(directory)) == sorted(
+        f"{profile_id}{suffix}" for profile_id in ids[1:] for suffix in ('.folded', '.speedscope.json')
+    )
+    with open(os.path.join(directory, f"{ids[-1]}.speedscope.json"), encoding='utf-8') as f:
+        assert json.load(f)["name"].startswith("GET /api/informes 200 ")
+
+
+def test_only_requests_with_the_configured_token_are_profiled(monkeypatch, tmp_path):
+    from flask import Response
+
+    from app import app
+    from app.controllers import profiling_controller
+
+    settings = dict(profiling_controller.settings, PROFILING_TOKEN='secreto', PROFILING_DIR=str(tmp_path))
+    monkeypatch.setattr(profiling_controller, 'settings', settings)
+
+    with app.test_request_context('/api/informes', headers={'X-Profile': 'otro'}):
+        assert not profiling_controller.profiling_requested()
+    with app.test_request_context('/api/informes'):
+        assert not profiling_controller.profiling_requested()
+
+    with app.test_request_context('/api/informes?profile=secreto'):
+        profiling_controller.start_profile()
+        response = profiling_controller.finish_profile(Response('ok'))
+    profile_id = response.headers['X-Profile-Id']
+    assert sorted(os.listdir(tmp_path)) == [f"{profile_id}.folded", f"{profile_id}.speedscope.json"]
@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from app.utils.shared_cache import SEQ, MemoryBackend, MmapBackend
+
+
+@pytest.fixture(params=["memory", "mmap"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return MmapBackend(str(tmp_path / "cache.mmap"), slots=16, slot_size=1024)
+
+
+def test_backend_interface(backend):
+    assert backend.get("clave") is None
+
+    stored_at = backend.set("clave", {"valor": [1, 2]}, ttl=60)
+    assert backend.get("clave") == ({"valor": [1, 2]}, stored_at)
+
+    # add solo gana si la clave no existe o venció
+    assert backend.add("clave", "otro", ttl=60) is False
+    assert backend.add("lease", "worker-1", ttl=60) is True
+    assert backend.add("lease", "worker-2", ttl=60) is False
+
+    backend.delete("lease")
+    assert backend.get("lease") is None
+    assert backend.add("lease", "worker-2", ttl=60) is True
+
+    # Con ttl vencido la clave deja de existir y puede volver a tomarse
+    backend.set("vencida", 1, ttl=0)
+    assert backend.get("vencida") is None
+    assert backend.add("vencida", 2, ttl=60) is True
+
+    stats = backend.get_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+
+
+def test_mmap_instances_on_the_same_file_share_entries(tmp_path):
+    path = str(tmp_path / "cache.mmap")
+    worker_a = MmapBackend(path, slots=16, slot_size=1024)
+    worker_b = MmapBackend(path, slots=16, slot_size=1024)
+
+    worker_a.set("token", {"access_token": "uno"}, ttl=60)
+    assert worker_b.get("token")[0] == {"access_token": "uno"}
+
+    # El valor decodificado en caché se descarta cuando cambia la secuencia
+    worker_a.set("token", {"access_token": "dos"}, ttl=60)
+    assert worker_b.get("token")[0] == {"access_token": "dos"}
+
+    assert worker_a.add("refresh", "a", ttl=60) is True
+    assert worker_b.add("refresh", "b", ttl=60) is False
+
+    # Otra geometría no puede leer el archivo: se empieza vacío
+    assert MmapBackend(path, slots=8, slot_size=1024).get("token") is None
+
+
+def test_mmap_rejects_values_larger_than_a_slot(tmp_path):
+    cache = MmapBackend(str(tmp_path / "cache.mmap"), slots=4, slot_size=256)
+    assert cache.set("grande", "x" * 512, ttl=60) is None
+    assert cache.add("grande", "x" * 512, ttl=60) is False
+    assert cache.get("grande") is None
+    assert cache.get_stats()["oversize"] == 2
+
+
+def test_mmap_reader_never_sees_a_torn_value(tmp_path):
+    path = str(tmp_path / "cache.mmap")
+    writer = MmapBackend(path, slots=4, slot_size=4096)
+    reader = MmapBackend(path, slots=4, slot_size=4096)
+    writer.set("lectura", {"n": 0, "copia": 0, "relleno": ""}, ttl=60)
+    stop = threading.Event()
+
+    def write():
+        n = 0
+        while not stop.is_set():
+            n += 1
+            # El largo del valor cambia en cada escritura
+            writer.set("lectura", {"n": n, "copia": n, "relleno": "x" * (n % 2000)}, ttl=60)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        for _ in range(20000):
+            entry = reader.get("lectura")
+            if entry is None:
+                continue
+            value = entry[0]
+            assert value["n"] == value["copia"]
+            assert len(value["relleno"]) == value["n"] % 2000
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_mmap_slot_left_mid_write_is_recovered(tmp_path):
+    cache = MmapBackend(str(tmp_path / "cache.mmap"), slots=4, slot_size=256)
+    cache.set("clave", "valor", ttl=60)
+
+    # Un proceso que muere a mitad de una escritura deja la secuencia impar
+    slot = cache._slot_for_write(cache._digest("clave"))
+    offset = cache._offset(slot)
+    SEQ.pack_into(cache._map, offset, SEQ.unpack_from(cache._map, offset)[0] | 1)
+    assert cache.get("clave") is None
+    assert cache.get_stats()["read_retries"] > 0
+
+    # La siguiente escritura deja la secuencia par otra vez
+    cache.set("clave", "nuevo", ttl=60)
+    assert cache.get("clave")[0] == "nuevo"
+    assert SEQ.unpack_from(cache._map, offset)[0] % 2 == 0
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.singleflight import SingleFlight
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condición no alcanzada"
+        time.sleep(0.005)
+
+
+def run_followers(flight, key, count, timeout=5):
+    """Lanza ``count`` hilos que llaman ``do`` y retorna sus resultados o excepciones"""
+    results = [None] * count
+
+    def follower(i):
+        try:
+            results[i] = flight.do(key, lambda: pytest.fail("un seguidor no debe ejecutar fn"), timeout=timeout)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=follower, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    return threads, results
+
+
+def test_concurrent_calls_share_the_leader_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flight.do('k', lambda: release.wait() and 42))
+    leader.start()
+    wait_until(lambda: flight.get_stats()['in_flight'] == 1)
+
+    threads, results = run_followers(flight, 'k', 5)
+    wait_until(lambda: flight.get_stats()['coalesced'] == 5)
+    release.set()
+    for t in threads + [leader]:
+        t.join()
+
+    assert results == [(42, True)] * 5
+    assert flight.get_stats() == {"leaders": 1, "coalesced": 5, "timeouts": 0, "in_flight": 0}
+
+
+def test_leader_error_is_raised_in_every_waiting_caller():
+    flight = SingleFlight()
+    release = threading.Event()
+    error = RuntimeError("Arduino no responde")
+
+    def failing():
+        release.wait()
+        raise error
+
+    leader_errors = []
+
+    def leader():
+        try:
+            flight.do('k', failing)
+        except RuntimeError as e:
+            leader_errors.append(e)
+
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    wait_until(lambda: flight.get_stats()['in_flight'] == 1)
+    threads, results = run_followers(flight, 'k', 3)
+    wait_until(lambda: flight.get_stats()['coalesced'] == 3)
+    release.set()
+    for t in threads + [leader_thread]:
+        t.join()
+
+    assert leader_errors == [error]
+    assert results == [error] * 3
+
+    # El error no queda guardado: la siguiente llamada vuelve a ejecutar fn
+    assert flight.do('k', lambda: 'ok') == ('ok', False)
+
+
+def test_waiting_caller_times_out_without_cancelling_the_leader():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flight.do('k', lambda: release.wait()))
+    leader.start()
+    wait_until(lambda: flight.get_stats()['in_flight'] == 1)
+
+    with pytest.raises(TimeoutError):
+        flight.do('k', lambda: None, timeout=0.01)
+
+    release.set()
+    leader.join()
+    stats = flight.get_stats()
+    assert stats['timeouts'] == 1
+    assert stats['in_flight'] == 0
+
+
+def test_start_runs_in_background_once_per_key():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait()
+
+    assert flight.start('k', work)
+    assert not flight.start('k', work)
+    release.set()
+    wait_until(lambda: flight.get_stats()['in_flight'] == 0)
+    assert calls == [1]
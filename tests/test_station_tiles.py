@@ -0,0 +1,66 @@
+from app.utils.station_tiles import NearestStationsCache, haversine_km
+
+# Estaciones repartidas alrededor de Santiago, con coordenadas por estación
+STATIONS = [
+    {"code": "centro", "lat": -33.45, "lon": -70.66, "distance": 0},
+    {"code": "norte", "lat": -33.40, "lon": -70.66, "distance": 0},
+    {"code": "lejos", "lat": -33.00, "lon": -70.66, "distance": 0},
+]
+
+
+class FakeWeathercloud:
+    def __init__(self, stations):
+        self.stations = stations
+        self.calls = []
+
+    def __call__(self, lat, lon, radius):
+        self.calls.append((lat, lon, radius))
+        return [s for s in self.stations
+                if "lat" not in s or haversine_km(lat, lon, s["lat"], s["lon"]) <= radius]
+
+
+def test_nearby_queries_are_answered_from_cached_tiles():
+    fetch = FakeWeathercloud(STATIONS)
+    cache = NearestStationsCache(fetch, tile_deg=0.25)
+
+    first = cache.query(-33.45, -70.66, 10)
+    fetches = len(fetch.calls)
+    assert [s["code"] for s in first] == ["centro", "norte"]
+    # La distancia se recalcula respecto al punto consultado
+    assert first[0]["distance"] == 0
+    assert first[1]["distance"] == round(haversine_km(-33.45, -70.66, -33.40, -70.66), 2)
+
+    # Coordenadas algo distintas y radio menor: se filtra sin ir a Weathercloud
+    second = cache.query(-33.44, -70.65, 3)
+    assert [s["code"] for s in second] == ["centro"]
+    assert len(fetch.calls) == fetches
+    assert cache.get_stats()["local_hits"] == 1
+    assert cache.get_stats()["passthrough"] == 0
+
+
+def test_stations_without_coordinates_disable_the_index():
+    fetch = FakeWeathercloud([{"code": "sin_coordenadas"}])
+    cache = NearestStationsCache(fetch, tile_deg=0.25)
+
+    assert cache.query(-33.45, -70.66, 5) == [{"code": "sin_coordenadas"}]
+    assert cache.indexable is False
+    # Las consultas siguientes van directo a Weathercloud con los parámetros originales
+    cache.query(-33.45, -70.66, 5)
+    assert fetch.calls[-1] == (-33.45, -70.66, 5)
+    assert cache.get_stats()["passthrough"] == 2
+
+
+def test_upstream_errors_are_returned_and_not_cached():
+    responses = [{"error": "Error de autenticación"}, list(STATIONS)]
+    cache = NearestStationsCache(lambda lat, lon, radius: responses.pop(0), tile_deg=1)
+
+    assert cache.query(-33.45, -70.66, 1) == {"error": "Error de autenticación"}
+    assert cache.get_stats()["tiles"] == 0
+    assert [s["code"] for s in cache.query(-33.45, -70.66, 1)] == ["centro"]
+
+
+def test_tiles_wrap_around_the_antimeridian():
+    cache = NearestStationsCache(FakeWeathercloud([]), tile_deg=1)
+    tiles = cache.tiles_for(0, 179.9, 50)
+    assert {col for _, col in tiles} == {179, 180}
+    assert cache.tiles_for(95, 0, 10) == []
@@ -0,0 +1,100 @@
+import pytest
+
+from app.utils import upstream_scheduler
+from app.utils.shared_cache import MmapBackend
+from app.utils.upstream_scheduler import UpstreamScheduler, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(upstream_scheduler.time, 'monotonic', clock)
+    return clock
+
+
+def test_token_bucket_throttles_after_the_burst(clock):
+    scheduler = UpstreamScheduler(rate=2, burst=3)
+    assert [scheduler.acquire()[0] for _ in range(3)] == [True] * 3
+
+    allowed, wait = scheduler.acquire()
+    assert not allowed and wait == pytest.approx(0.5)
+
+    # Medio segundo después hay presupuesto para una petición más
+    clock.now += 0.5
+    assert scheduler.acquire()[0] is True
+    assert scheduler.acquire()[0] is False
+    stats = scheduler.get_stats()
+    assert (stats["allowed"], stats["throttled"]) == (4, 2)
+
+
+def test_retry_after_blocks_requests_until_it_passes(clock):
+    scheduler = UpstreamScheduler(rate=10, failure_threshold=5)
+    scheduler.record(429, retry_after="7")
+
+    assert scheduler.acquire() == (False, pytest.approx(7))
+    clock.now += 6.9
+    assert scheduler.acquire()[0] is False
+    clock.now += 0.1
+    assert scheduler.acquire()[0] is True
+    assert scheduler.get_stats()["rate_limited"] == 1
+
+
+def test_breaker_opens_and_lets_a_single_probe_through(clock):
+    scheduler = UpstreamScheduler(rate=100, failure_threshold=3, reset_timeout=30, base_backoff=1, jitter=0)
+    for _ in range(3):
+        scheduler.record(None)
+    assert scheduler.get_stats()["state"] == UpstreamScheduler.OPEN
+    assert scheduler.acquire() == (False, pytest.approx(30))
+
+    clock.now += 30
+    assert scheduler.acquire()[0] is True
+    assert scheduler.get_stats()["state"] == UpstreamScheduler.HALF_OPEN
+    # Mientras la prueba está en curso no pasa ninguna otra petición
+    assert scheduler.acquire() == (False, 1.0)
+
+    # La prueba falla: el circuito se reabre
+    scheduler.record(503)
+    assert scheduler.get_stats()["state"] == UpstreamScheduler.OPEN
+    assert scheduler.get_stats()["opened"] == 2
+
+    clock.now += 30
+    assert scheduler.acquire()[0] is True
+    scheduler.record(200)
+    stats = scheduler.get_stats()
+    assert (stats["state"], stats["consecutive_failures"]) == (UpstreamScheduler.CLOSED, 0)
+    assert scheduler.acquire()[0] is True
+
+
+def test_backoff_grows_exponentially_without_retry_after(clock):
+    scheduler = UpstreamScheduler(rate=100, failure_threshold=10, base_backoff=1, max_backoff=5, jitter=0)
+    waits = []
+    for _ in range(4):
+        scheduler.record(500)
+        waits.append(scheduler.blocked_for())
+    assert waits == [1, 2, 4, 5]
+
+
+def test_rate_limit_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "cache.mmap")
+    worker_a = UpstreamScheduler(rate=10, shared_cache=MmapBackend(path, slots=16, slot_size=1024), name="arduino")
+    worker_b = UpstreamScheduler(rate=10, shared_cache=MmapBackend(path, slots=16, slot_size=1024), name="arduino")
+
+    worker_a.record(429, retry_after="60")
+    allowed, wait = worker_b.acquire()
+    assert not allowed and 59 < wait <= 60
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("12") == 12
+    assert parse_retry_after("-3") == 0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("pronto") is None
+    assert parse_retry_after(None) is None
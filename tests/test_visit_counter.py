@@ -0,0 +1,64 @@
+import json
+import threading
+
+from app.utils.visit_counter import VisitCounter
+
+
+def test_workers_sharing_a_database_add_up_exactly(tmp_path):
+    db = str(tmp_path / "visitas.sqlite3")
+    # flush_interval alto: los volcados los hace la prueba
+    workers = [VisitCounter(db, flush_interval=3600) for _ in range(2)]
+
+    def visit(counter):
+        for _ in range(500):
+            counter.increment()
+
+    threads = [threading.Thread(target=visit, args=(w,)) for w in workers for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Antes del volcado cada worker solo ve sus propias visitas
+    assert workers[0].get_stats()["pending"] == 1000
+    assert workers[0].total() == 1000
+
+    assert workers[0].flush() == 1000
+    assert workers[1].flush() == 1000
+    assert workers[1].total() == 2000
+    # Un volcado sin pendientes igual actualiza el total visto por el worker
+    assert workers[0].flush() == 0
+    assert workers[0].total() == 2000
+    assert VisitCounter(db).total() == 2000
+
+    for w in workers:
+        w.stop()
+
+
+def test_failed_flush_keeps_pending_visits(tmp_path):
+    counter = VisitCounter(str(tmp_path / "visitas.sqlite3"), flush_interval=3600)
+    counter.increment()
+    counter.increment()
+
+    good_path, counter.db_path = counter.db_path, str(tmp_path / "no_existe" / "visitas.sqlite3")
+    assert counter.flush() == 0
+    assert counter.get_stats()["pending"] == 2
+    assert counter.get_stats()["flush_errors"] == 1
+
+    counter.db_path = good_path
+    assert counter.flush() == 2
+    assert counter.get_stats() == {"total": 2, "pending": 0, "flushes": 1, "flush_errors": 1}
+    counter.stop()
+
+
+def test_legacy_json_total_is_imported_once(tmp_path):
+    legacy = tmp_path / "visitas.json"
+    legacy.write_text(json.dumps({"num_visitas": 41}))
+    db = str(tmp_path / "visitas.sqlite3")
+
+    assert VisitCounter(db, legacy_json=str(legacy)).total() == 41
+    # Un segundo worker no vuelve a sumar el total antiguo
+    legacy.write_text(json.dumps({"num_visitas": 1000}))
+    counter = VisitCounter(db, legacy_json=str(legacy), flush_interval=3600)
+    assert counter.increment() == 42
+    counter.stop()